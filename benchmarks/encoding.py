@@ -0,0 +1,127 @@
+"""Storage encoding throughput benchmark.
+
+Encodes and decodes certificate bundles and private keys with each codec
+and reports MB/s and the stored size relative to the plain object:
+
+    python -m benchmarks.encoding --iterations 2000 --output encoding.json
+
+zstd is skipped when neither `compression.zstd` nor `zstandard` is available.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import typing
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from acme_serverless_client import crypto
+from acme_serverless_client.storage import encoding
+from acme_serverless_client.storage.encoding import StorageCodec
+
+from .fakes import FakeCA
+
+CODECS = ("zlib", "zstd", "aes256gcm", "zlib+aes256gcm")
+
+
+def payloads() -> dict[str, bytes]:
+    ca = FakeCA()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    domains = [f"host{i}.example.com" for i in range(20)]
+    return {
+        "bundle": ca.sign(crypto.make_csr(key_pem, domains)).encode(),
+        "key": key_pem,
+    }
+
+
+def make_codec(name: str) -> StorageCodec | None:
+    compression = next((c for c in ("zlib", "zstd") if c in name), None)
+    if compression == "zstd":
+        try:
+            encoding._zstd()
+        except RuntimeError:
+            return None
+    keks = {"bench": os.urandom(32)} if "aes256gcm" in name else None
+    return StorageCodec(
+        compression=compression,  # type: ignore[arg-type]
+        keks=keks,
+        encrypt=keks is not None,
+    )
+
+
+def measure(
+    codec: StorageCodec, name: str, data: bytes, iterations: int
+) -> dict[str, typing.Any]:
+    compress, encrypt = codec.compression != 0, bool(codec.keks)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encoded = codec.encode(name, data, compress=compress, encrypt=encrypt)
+    encode_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(name, encoded)
+    decode_seconds = time.perf_counter() - start
+    megabytes = len(data) * iterations / 1_000_000
+    return {
+        "size": len(data),
+        "encoded_size": len(encoded),
+        "ratio": len(encoded) / len(data),
+        "encode_mb_per_sec": megabytes / encode_seconds if encode_seconds else 0.0,
+        "decode_mb_per_sec": megabytes / decode_seconds if decode_seconds else 0.0,
+    }
+
+
+def parse_args(argv: typing.Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--codecs", default=",".join(CODECS))
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+def run(argv: typing.Sequence[str] | None = None) -> dict[str, typing.Any]:
+    args = parse_args(argv)
+    results = []
+    for payload, data in payloads().items():
+        for name in args.codecs.split(","):
+            codec = make_codec(name)
+            if codec is None:
+                continue
+            result = measure(codec, f"objects/{payload}", data, args.iterations)
+            results.append({"codec": name, "payload": payload, **result})
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+
+
+def main(argv: typing.Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = run(argv)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""In-process stand-ins for the CA and the storage backend.
+
+`FakeACMEClient` implements the subset of `acme.client.ClientV2` used by
+`acme_serverless_client.client` and signs CSRs with a throwaway local CA,
+so benchmarks measure the client and storage code without network noise.
+"""
+
+from __future__ import annotations
+
+import collections
+import datetime
+import itertools
+import os
+import threading
+import typing
+
+from acme import challenges, messages
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from acme_serverless_client.storage.base import BaseStorage
+
+
+class CallCounter:
+    def __init__(self) -> None:
+        self.counts: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    def reset(self) -> dict[str, int]:
+        with self._lock:
+            counts = dict(self.counts)
+            self.counts.clear()
+        return counts
+
+
+def count_calls(obj: typing.Any, names: typing.Iterable[str], counter: CallCounter):
+    """Replace methods of `obj` with wrappers that report calls to `counter`."""
+    for name in names:
+        method = getattr(obj, name)
+
+        def wrapper(*args, _name=name, _method=method, **kwargs):
+            counter.add(_name)
+            return _method(*args, **kwargs)
+
+        setattr(obj, name, wrapper)
+    return obj
+
+
+class MemoryStorage(BaseStorage):
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.data: dict[str, bytes] = {}
+        self.modified: dict[str, datetime.datetime] = {}
+
+    def _get(self, name: str) -> bytes | None:
+        return self.data.get(name)
+
+    def _set(self, name: str, data: bytes) -> None:
+        self.data[name] = data
+        self.modified[name] = datetime.datetime.now(datetime.timezone.utc)
+
+    def _del(self, name: str) -> None:
+        self.data.pop(name, None)
+        self.modified.pop(name, None)
+
+    def list_certificates(
+        self,
+    ) -> typing.Iterator[tuple[str, datetime.datetime]]:
+        for key, modified in list(self.modified.items()):
+            if key.startswith(self.certificate_prefix):
+                yield key[len(self.certificate_prefix) :], modified
+
+    def set_validation(self, key: str, value: bytes) -> None:
+        self._set(key.lstrip("/"), value)
+
+    def del_validation(self, key: str) -> None:
+        self._del(key.lstrip("/"))
+
+
+class FakeCA:
+    def __init__(self) -> None:
+        self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Fake CA")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(self.key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=365))
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), True)
+            .sign(self.key, hashes.SHA256())
+        )
+        self.chain_pem = self.certificate.public_bytes(serialization.Encoding.PEM)
+
+    def sign(self, csr_pem: bytes) -> str:
+        csr = x509.load_pem_x509_csr(csr_pem)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(csr.subject)
+            .issuer_name(self.certificate.subject)
+            .public_key(csr.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=90))
+            .add_extension(
+                csr.extensions.get_extension_for_class(
+                    x509.SubjectAlternativeName
+                ).value,
+                critical=False,
+            )
+            .sign(self.key, hashes.SHA256())
+        )
+        leaf = certificate.public_bytes(serialization.Encoding.PEM)
+        return (leaf + b"\n" + self.chain_pem).decode()
+
+
+class FakeNetwork:
+    def __init__(self, key: typing.Any) -> None:
+        self.key = key
+
+
+class FakeACMEClient:
+    def __init__(self, ca: FakeCA, account_key: typing.Any) -> None:
+        self.ca = ca
+        self.net = FakeNetwork(account_key)
+        self._ids = itertools.count()
+
+    def _url(self, kind: str) -> str:
+        return f"https://fake-ca.invalid/{kind}/{next(self._ids)}"
+
+    def new_order(self, csr_pem: bytes) -> messages.OrderResource:
+        csr = x509.load_pem_x509_csr(csr_pem)
+        domains = csr.extensions.get_extension_for_class(
+            x509.SubjectAlternativeName
+        ).value.get_values_for_type(x509.DNSName)
+        authorizations = [
+            messages.AuthorizationResource(
+                uri=self._url("authz"),
+                body=messages.Authorization(
+                    identifier=messages.Identifier(
+                        typ=messages.IDENTIFIER_FQDN, value=domain
+                    ),
+                    status=messages.STATUS_PENDING,
+                    challenges=[
+                        messages.ChallengeBody(
+                            chall=challenges.HTTP01(token=os.urandom(32)),
+                            uri=self._url("chall"),
+                            status=messages.STATUS_PENDING,
+                        )
+                    ],
+                ),
+            )
+            for domain in domains
+        ]
+        return messages.OrderResource(
+            uri=self._url("order"),
+            body=messages.Order(
+                status=messages.STATUS_PENDING,
+                authorizations=[authz.uri for authz in authorizations],
+            ),
+            authorizations=authorizations,
+            csr_pem=csr_pem,
+        )
+
+    def answer_challenge(
+        self, challb: messages.ChallengeBody, response: typing.Any
+    ) -> None:
+        return None
+
+    def poll_and_finalize(self, orderr: messages.OrderResource):
+        return orderr.update(fullchain_pem=self.ca.sign(orderr.csr_pem))
+
+    def revoke(self, cert: x509.Certificate, rsn: int) -> None:
+        return None
@@ -0,0 +1,298 @@
+"""End-to-end throughput benchmark for issue, renew, revoke and renewal scans.
+
+Runs against in-process fakes by default:
+
+    python -m benchmarks.issuance --certificates 10,100 --sans 1,5 --concurrency 1,8
+
+or against local pebble started with `PEBBLE_VA_ALWAYS_VALID=1` and MinIO:
+
+    python -m benchmarks.issuance --directory-url https://127.0.0.1:14000/dir \\
+        --insecure --s3-endpoint http://127.0.0.1:9000
+
+Results are written as JSON to stdout or `--output`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import functools
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import typing
+import uuid
+import warnings
+from unittest import mock
+
+from acme_serverless_client import client, crypto, helpers
+from acme_serverless_client.authenticators.http import HTTP01Authenticator
+from acme_serverless_client.storage.base import BaseStorage
+
+from .fakes import CallCounter, FakeACMEClient, FakeCA, MemoryStorage, count_calls
+
+STORAGE_CALLS = ("_get", "_set", "_del", "list_certificates")
+ACME_CALLS = (
+    "new_order",
+    "answer_challenge",
+    "poll_and_finalize",
+    "revoke",
+)
+
+
+def percentile(values: typing.Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Environment:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.storage_calls = CallCounter()
+        self.acme_calls = CallCounter()
+        self.ca = FakeCA() if not args.directory_url else None
+
+    def make_storage(self) -> BaseStorage:
+        if self.args.s3_endpoint:
+            import boto3  # noqa: PLC0415
+
+            from acme_serverless_client.storage.aws import S3Storage  # noqa: PLC0415
+
+            s3 = boto3.client("s3", endpoint_url=self.args.s3_endpoint)
+            # every scenario starts from an empty bucket
+            name = f"{self.args.bucket_prefix}-{uuid.uuid4().hex[:12]}"
+            s3.create_bucket(Bucket=name)
+            storage: BaseStorage = S3Storage(bucket=S3Storage.Bucket(name, s3))
+        else:
+            storage = MemoryStorage()
+        return count_calls(storage, STORAGE_CALLS, self.storage_calls)
+
+    @contextlib.contextmanager
+    def patched_client(self) -> typing.Iterator[None]:
+        if self.ca is not None:
+            ca = self.ca
+            setup_client = self._fake_setup_client(ca)
+        else:
+            setup_client = client.setup_client
+
+        def counted_setup_client(*args: typing.Any, **kwargs: typing.Any):
+            self.acme_calls.add("setup_client")
+            return count_calls(
+                setup_client(*args, **kwargs), ACME_CALLS, self.acme_calls
+            )
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(
+                mock.patch.object(client, "setup_client", counted_setup_client)
+            )
+            if self.args.insecure:
+                net_cls = client.acme.client.ClientNetwork
+                stack.enter_context(
+                    mock.patch.object(
+                        client.acme.client,
+                        "ClientNetwork",
+                        functools.partial(net_cls, verify_ssl=False),
+                    )
+                )
+                stack.enter_context(warnings.catch_warnings())
+                warnings.simplefilter("ignore")
+            yield
+
+    @staticmethod
+    def _fake_setup_client(ca: FakeCA) -> typing.Callable[..., typing.Any]:
+        def setup_client(
+            storage: BaseStorage,
+            account_email: str,
+            directory_url: str,
+            account_name: str | None = None,
+            eab: tuple[str, str] | None = None,
+            *,
+            rate_limiter: typing.Any = None,
+        ) -> FakeACMEClient:
+            account = storage.get_account(account_name)
+            if account is None:
+                account = client.Account()
+                account.regr = client.messages.RegistrationResource(
+                    body=client.messages.Registration(), uri="https://fake-ca.invalid"
+                )
+                storage.set_account(account, account_name)
+            return FakeACMEClient(ca, account.key)
+
+        return setup_client
+
+
+def measure(
+    env: Environment,
+    operation: str,
+    func: typing.Callable[[typing.Any], None],
+    items: typing.Sequence[typing.Any],
+    concurrency: int,
+) -> dict[str, typing.Any]:
+    latencies: list[float] = []
+
+    def timed(item: typing.Any) -> None:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+
+    env.storage_calls.reset()
+    env.acme_calls.reset()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(timed, item) for item in items]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    return {
+        "operation": operation,
+        "count": len(items),
+        "seconds": elapsed,
+        "ops_per_sec": len(items) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "storage_calls": env.storage_calls.reset(),
+        "acme_calls": env.acme_calls.reset(),
+    }
+
+
+def run_scenario(
+    env: Environment,
+    certificates: int,
+    sans: int,
+    key_bits: int,
+    concurrency: int,
+) -> list[dict[str, typing.Any]]:
+    storage = env.make_storage()
+    params: typing.Any = {
+        "storage": storage,
+        "acme_account_email": env.args.account_email,
+        "acme_directory_url": env.args.directory_url or "https://fake-ca.invalid/dir",
+    }
+    authenticators = [HTTP01Authenticator(storage=storage)]  # type: ignore[arg-type]
+    run_id = uuid.uuid4().hex[:6]
+    domain_sets = [
+        [f"{n}-{i}-{run_id}.{env.args.zone}" for n in range(sans)]
+        for i in range(certificates)
+    ]
+    results = []
+    with mock.patch.object(crypto, "CERT_PKEY_BITS", key_bits), env.patched_client():
+        # register the account outside of the measured runs
+        client.setup_client(
+            storage, params["acme_account_email"], params["acme_directory_url"]
+        )
+        results.append(
+            measure(
+                env,
+                "issue",
+                lambda domains: client.issue(
+                    domains=domains, authenticators=authenticators, **params
+                ),
+                domain_sets,
+                concurrency,
+            )
+        )
+        due: list[typing.Any] = []
+        results.append(
+            measure(
+                env,
+                "find_certificates_to_renew",
+                lambda _: due.extend(
+                    helpers.find_certificates_to_renew(storage, cert_fresh_days=-1)
+                ),
+                [None],
+                1,
+            )
+        )
+        results.append(
+            measure(
+                env,
+                "renew",
+                lambda item: client.renew(
+                    certificate=item[0], authenticators=authenticators, **params
+                ),
+                due,
+                concurrency,
+            )
+        )
+        results.append(
+            measure(
+                env,
+                "revoke",
+                lambda item: client.revoke(certificate=item[0], **params),
+                due,
+                concurrency,
+            )
+        )
+    for result in results:
+        result["params"] = {
+            "certificates": certificates,
+            "sans": sans,
+            "key_bits": key_bits,
+            "concurrency": concurrency,
+        }
+    return results
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_args(argv: typing.Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--certificates", type=int_list, default=[10])
+    parser.add_argument("--sans", type=int_list, default=[1])
+    parser.add_argument("--key-bits", type=int_list, default=[2048])
+    parser.add_argument("--concurrency", type=int_list, default=[1])
+    parser.add_argument("--directory-url", help="ACME directory, fake CA if unset")
+    parser.add_argument("--s3-endpoint", help="S3 endpoint, in-memory if unset")
+    parser.add_argument("--bucket-prefix", default="acme-bench")
+    parser.add_argument(
+        "--insecure", action="store_true", help="skip CA TLS verification (pebble)"
+    )
+    parser.add_argument("--zone", default="example.com")
+    parser.add_argument("--account-email", default="bench@example.com")
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+def run(argv: typing.Sequence[str] | None = None) -> dict[str, typing.Any]:
+    args = parse_args(argv)
+    env = Environment(args)
+    results = []
+    for certificates, sans, key_bits, concurrency in itertools.product(
+        args.certificates, args.sans, args.key_bits, args.concurrency
+    ):
+        results.extend(run_scenario(env, certificates, sans, key_bits, concurrency))
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "acme": args.directory_url or "fake",
+            "storage": args.s3_endpoint or "memory",
+        },
+        "results": results,
+    }
+
+
+def main(argv: typing.Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    report = run(argv)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
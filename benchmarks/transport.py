@@ -0,0 +1,164 @@
+"""Connection reuse benchmark for the ACME transport.
+
+Creates orders against local pebble, building a client per order like
+`client.perform` does, once with a session per client and once with the
+shared pooled transport, and reports new TCP/TLS connections and latency:
+
+    python -m benchmarks.transport --directory-url https://127.0.0.1:14000/dir \\
+        --insecure --orders 50 --concurrency 1,8
+
+Orders are left pending, no challenge is answered.
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import platform
+import sys
+import time
+import typing
+import uuid
+import warnings
+from unittest import mock
+
+from urllib3 import connectionpool
+
+from acme_serverless_client import client, crypto, transport
+from acme_serverless_client.models import Certificate
+
+from .fakes import CallCounter, MemoryStorage
+from .issuance import int_list, percentile
+
+MODES = ("per-client", "shared")
+
+
+@contextlib.contextmanager
+def count_connections(counter: CallCounter) -> typing.Iterator[None]:
+    """Count connections opened by urllib3, i.e. TCP (and TLS) handshakes."""
+    with contextlib.ExitStack() as stack:
+        for pool_cls in (
+            connectionpool.HTTPConnectionPool,
+            connectionpool.HTTPSConnectionPool,
+        ):
+            new_conn = pool_cls._new_conn
+
+            def wrapper(self, _new_conn=new_conn):
+                counter.add(self.scheme)
+                return _new_conn(self)
+
+            stack.enter_context(mock.patch.object(pool_cls, "_new_conn", wrapper))
+        yield
+
+
+@contextlib.contextmanager
+def insecure() -> typing.Iterator[None]:
+    net_cls = client.acme.client.ClientNetwork
+
+    def factory(*args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        return net_cls(*args, **{**kwargs, "verify_ssl": False})
+
+    with (
+        mock.patch.object(client.acme.client, "ClientNetwork", factory),
+        warnings.catch_warnings(),
+    ):
+        warnings.simplefilter("ignore")
+        yield
+
+
+def run_mode(
+    args: argparse.Namespace, mode: str, concurrency: int
+) -> dict[str, typing.Any]:
+    transport.set_transport(transport.Transport() if mode == "shared" else None)
+    storage = MemoryStorage()
+    # register the account outside of the measured runs
+    client.setup_client(storage, args.account_email, args.directory_url)
+    key = Certificate.generate_private_key()
+    csrs = [
+        crypto.make_csr(key, [f"{uuid.uuid4().hex[:12]}.{args.zone}"])
+        for _ in range(args.orders)
+    ]
+    latencies: list[float] = []
+
+    def order(csr_pem: bytes) -> None:
+        start = time.perf_counter()
+        acme_client = client.setup_client(
+            storage, args.account_email, args.directory_url
+        )
+        acme_client.new_order(csr_pem)
+        latencies.append(time.perf_counter() - start)
+
+    connections = CallCounter()
+    start = time.perf_counter()
+    with (
+        count_connections(connections),
+        concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool,
+    ):
+        for future in [pool.submit(order, csr) for csr in csrs]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    handshakes = sum(connections.reset().values())
+    return {
+        "mode": mode,
+        "orders": args.orders,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "orders_per_sec": args.orders / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "connections": handshakes,
+        "connections_per_order": handshakes / args.orders,
+    }
+
+
+def parse_args(argv: typing.Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--directory-url", default="https://127.0.0.1:14000/dir")
+    parser.add_argument(
+        "--insecure", action="store_true", help="skip CA TLS verification (pebble)"
+    )
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--concurrency", type=int_list, default=[1])
+    parser.add_argument("--zone", default="example.com")
+    parser.add_argument("--account-email", default="bench@example.com")
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+def run(argv: typing.Sequence[str] | None = None) -> dict[str, typing.Any]:
+    args = parse_args(argv)
+    previous = transport.get_transport()
+    results = []
+    with insecure() if args.insecure else contextlib.nullcontext():
+        try:
+            for concurrency in args.concurrency:
+                for mode in MODES:
+                    results.append(run_mode(args, mode, concurrency))
+        finally:
+            transport.set_transport(previous)
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "acme": args.directory_url,
+        },
+        "results": results,
+    }
+
+
+def main(argv: typing.Sequence[str] | None = None) -> None:
+    args = parse_args(argv)
+    output = json.dumps(run(argv), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
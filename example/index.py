@@ -1,11 +1,15 @@
+import json
 import logging
 import os
 import typing
 
 import boto3
 
-from acme_serverless_client import find_certificates_to_renew, issue, renew, revoke
+from acme_serverless_client import fanout, issue, planning, revoke, revoke_many
+from acme_serverless_client.accounts import RegisteredDomainPolicy
 from acme_serverless_client.authenticators.http import HTTP01Authenticator
+from acme_serverless_client.jobs import RenewalRun
+from acme_serverless_client.ratelimit import RateLimiter
 from acme_serverless_client.storage.aws import S3Storage
 
 logger = logging.getLogger("aws-lambda-acme")
@@ -25,33 +29,99 @@ if os.environ.get("SENTRY_DSN"):
     )
 
 
+# module level so that warm invocations reuse the cached ACME accounts
+storage = S3Storage(
+    bucket=S3Storage.Bucket(os.environ["BUCKET"], boto3.client("s3")),
+    list_shard_boundaries=S3Storage.DOMAIN_SHARD_BOUNDARIES,
+)
+# ACME_ACCOUNTS=acme-0,acme-1 spreads orders over several accounts
+account_policy = (
+    RegisteredDomainPolicy(os.environ["ACME_ACCOUNTS"].split(","))
+    if os.environ.get("ACME_ACCOUNTS")
+    else None
+)
+
+
 def handler(event: typing.Any, context: typing.Any) -> typing.Mapping[str, typing.Any]:
-    client = boto3.client("s3")
-    storage = S3Storage(bucket=S3Storage.Bucket(os.environ["BUCKET"], client))
     authenticators = [HTTP01Authenticator(storage=storage)]
+    # budgets are kept in the bucket and shared by concurrent invocations
+    rate_limiter = RateLimiter(storage=storage)
     params: typing.Any = {
         "acme_account_email": os.environ["ACME_ACCOUNT_EMAIL"],
         "acme_directory_url": os.environ["ACME_DIRECTORY_URL"],
         "storage": storage,
     }
     if event["action"] == "renew":
-        certificates = [
-            certificate for certificate, _ in find_certificates_to_renew(storage)
-        ]
-        failure = []
-        for certificate in certificates:
-            try:
-                renew(certificate=certificate, authenticators=authenticators, **params)
-            except Exception as exc:
-                logger.error(str(exc))
-                failure.append(certificate.name)
-        if len(failure) == len(certificates):
-            raise RuntimeError(f"All renew operations failed: {failure}")
+        # Checkpointed run shared by all invocations of the day, an invocation
+        # that runs out of time leaves the rest of the queue to the next one.
+        # keys and CSRs of certificates due within a week are prepared ahead
+        run = RenewalRun.open(storage, prestage_days=7)
+        result = run.process(
+            acme_account_email=params["acme_account_email"],
+            acme_directory_url=params["acme_directory_url"],
+            authenticators=authenticators,
+            should_continue=lambda: context.get_remaining_time_in_millis() > 120_000,
+            rate_limiter=rate_limiter,
+            account_policy=account_policy,
+        )
+        if result["failed"] and not result["saved"]:
+            raise RuntimeError(f"All renew operations failed: {result['failed']}")
+    elif event["action"] == "renew-fanout":
+        # coordinator: one asynchronous invocation of this function per shard
+        lambda_client = boto3.client("lambda")
+        for descriptor in fanout.plan(storage, int(event.get("shards", 4))):
+            lambda_client.invoke(
+                FunctionName=context.function_name,
+                InvocationType="Event",
+                Payload=json.dumps({"action": "renew-shard", "shard": descriptor}),
+            )
+    elif event["action"] == "renew-shard":
+        result = fanout.run_shard(
+            event["shard"],
+            authenticators=authenticators,
+            should_continue=lambda: context.get_remaining_time_in_millis() > 120_000,
+            rate_limiter=rate_limiter,
+            account_policy=account_policy,
+            **params,
+        )
+        logger.info("shard %s: %s", event["shard"]["shard"], result)
     elif event["action"] == "issue":
-        issue(domains=[event["domain"]], authenticators=authenticators, **params)
+        issue(
+            domains=[event["domain"]],
+            authenticators=authenticators,
+            rate_limiter=rate_limiter,
+            account_policy=account_policy,
+            **params,
+        )
+    elif event["action"] == "issue-many":
+        # pack the hostnames into few SAN certificates, reissue only changed ones
+        existing = planning.current_bundles(storage)
+        plan = planning.pack(
+            event["domains"],
+            existing=existing,
+            affinity=planning.authenticator_affinity(authenticators),
+            covering=planning.consolidate_wildcards(
+                event["domains"], authenticators, existing
+            ),
+        )
+        planning.apply(
+            plan,
+            authenticators=authenticators,
+            rate_limiter=rate_limiter,
+            account_policy=account_policy,
+            **params,
+        )
     elif event["action"] == "revoke":
         cert = storage.get_certificate(name=event["domain"])
         assert cert
         revoke(certificate=cert, **params)
+    elif event["action"] == "revoke-many":
+        certificates = [storage.get_certificate(name=name) for name in event["domains"]]
+        outcomes = revoke_many(
+            certificates=[cert for cert in certificates if cert],
+            reason=int(event.get("reason", 0)),
+            **params,
+        )
+        logger.info("revoke-many: %s", outcomes)
 
     return {"statusCode": 200}
@@ -1,4 +1,30 @@
-from .client import issue, renew, revoke
-from .helpers import find_certificates_to_renew
+import importlib
+import typing
 
-__all__ = ["find_certificates_to_renew", "issue", "renew", "revoke"]
+if typing.TYPE_CHECKING:
+    from .client import issue, renew, revoke, revoke_many
+    from .helpers import find_certificates_to_renew
+
+__all__ = ["find_certificates_to_renew", "issue", "renew", "revoke", "revoke_many"]
+
+# Public names are resolved on first access so that `import acme_serverless_client`
+# doesn't pull acme, josepy, cryptography and requests into a cold start.
+_LAZY_ATTRIBUTES = {
+    "find_certificates_to_renew": ".helpers",
+    "issue": ".client",
+    "renew": ".client",
+    "revoke": ".client",
+    "revoke_many": ".client",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_LAZY_ATTRIBUTES])
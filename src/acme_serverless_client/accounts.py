@@ -0,0 +1,91 @@
+"""Spread orders across several named ACME accounts.
+
+Per account limits (new orders, pending authorizations) cap the issuance
+rate of a single account. A policy picks the account for each certificate:
+
+    policy = RegisteredDomainPolicy(["acme-0", "acme-1", "acme-2"])
+    issue(domains=..., account_policy=policy, ...)
+
+Accounts live in storage under `accounts/<name>.json` and are registered on
+first use. `RegisteredDomainPolicy` keeps every name of a registered domain on
+the same account so that authorizations are reused between its orders.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import threading
+import typing
+import weakref
+
+from .helpers import registered_domain
+
+if typing.TYPE_CHECKING:
+    from .models import Account
+    from .storage.base import StorageProtocol
+
+
+class AccountPolicyProtocol(typing.Protocol):
+    def select(self, domains: typing.Sequence[str]) -> str | None: ...
+
+
+class RoundRobinPolicy(AccountPolicyProtocol):
+    def __init__(self, names: typing.Sequence[str]) -> None:
+        assert names, "at least one account name is required"
+        self.names = list(names)
+        self._cycle = itertools.cycle(self.names)
+        self._lock = threading.Lock()
+
+    def select(self, domains: typing.Sequence[str]) -> str | None:
+        with self._lock:
+            return next(self._cycle)
+
+
+class RegisteredDomainPolicy(AccountPolicyProtocol):
+    def __init__(self, names: typing.Sequence[str]) -> None:
+        assert names, "at least one account name is required"
+        self.names = list(names)
+
+    def select(self, domains: typing.Sequence[str]) -> str | None:
+        digest = hashlib.blake2b(
+            registered_domain(domains[0]).encode(), digest_size=8
+        ).digest()
+        return self.names[int.from_bytes(digest, "big") % len(self.names)]
+
+
+class AccountCache:
+    """Accounts loaded or registered in this process, per storage object.
+
+    Saves a storage read and a JWK parse per order. Keep the storage object
+    alive between invocations (e.g. module level in Lambda) to benefit.
+    """
+
+    def __init__(self) -> None:
+        self._accounts: weakref.WeakKeyDictionary[
+            typing.Any, dict[tuple[str, str | None], Account]
+        ] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(
+        self, storage: StorageProtocol, directory_url: str, name: str | None
+    ) -> Account | None:
+        with self._lock:
+            return self._accounts.get(storage, {}).get((directory_url, name))
+
+    def set(
+        self,
+        storage: StorageProtocol,
+        directory_url: str,
+        name: str | None,
+        account: Account,
+    ) -> None:
+        with self._lock:
+            self._accounts.setdefault(storage, {})[directory_url, name] = account
+
+    def clear(self) -> None:
+        with self._lock:
+            self._accounts.clear()
+
+
+account_cache = AccountCache()
@@ -1,6 +1,9 @@
+from __future__ import annotations
+
 import typing
 
-import josepy.jwk
+if typing.TYPE_CHECKING:
+    import josepy.jwk
 
 
 class AuthenticatorProtocol(typing.Protocol):
@@ -8,12 +8,12 @@ import logging
 import time
 import typing
 
-import josepy.jwk
-from acme import challenges
-from botocore.exceptions import ClientError, NoCredentialsError
-
+from ..instrumentation import count, span
 from .base import AuthenticatorProtocol
 
+if typing.TYPE_CHECKING:
+    import josepy.jwk
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,6 +28,8 @@ class Route53Authenticator(AuthenticatorProtocol):
         )
 
     def is_supported(self, domain: str, challenge: typing.Any) -> bool:
+        from acme import challenges  # noqa: PLC0415
+
         return isinstance(challenge, challenges.DNS01) and bool(
             self._get_zone_id(domain)
         )
@@ -57,6 +59,8 @@ class Route53Authenticator(AuthenticatorProtocol):
         challs: typing.Iterable[tuple[typing.Any, str]],
         account_key: josepy.jwk.JWK,
     ) -> None:
+        from botocore.exceptions import ClientError, NoCredentialsError  # noqa: PLC0415
+
         batches = self._build_r53_change_batches("DELETE", challs, account_key)
         for zone_id, batch in batches:
             try:
@@ -105,9 +109,10 @@ class Route53Authenticator(AuthenticatorProtocol):
         return f"_acme-challenge.{domain}"
 
     def _change_txt_records(self, zone_id: str, batch: dict) -> str:
-        response = self.r53.change_resource_record_sets(
-            HostedZoneId=zone_id, ChangeBatch=batch
-        )
+        with span("route53.change_resource_record_sets"):
+            response = self.r53.change_resource_record_sets(
+                HostedZoneId=zone_id, ChangeBatch=batch
+            )
         change_id: str = response["ChangeInfo"]["Id"]
         return change_id
 
@@ -115,10 +120,13 @@ class Route53Authenticator(AuthenticatorProtocol):
         """Wait for a change to be propagated to all Route53 DNS servers.
         https://docs.aws.amazon.com/Route53/latest/APIReference/API_GetChange.html
         """
-        for _ in range(0, 120):
-            response = self.r53.get_change(Id=change_id)
-            if response["ChangeInfo"]["Status"] == "INSYNC":
-                return
-            time.sleep(5)
+        with span("route53.wait_for_change"):
+            for _ in range(0, 120):
+                with span("route53.get_change"):
+                    response = self.r53.get_change(Id=change_id)
+                if response["ChangeInfo"]["Status"] == "INSYNC":
+                    return
+                count("route53.change_pending")
+                time.sleep(5)
         status = response["ChangeInfo"]["Status"]
         raise RuntimeError(f"Timed out waiting for Route53 change. Status: {status}")
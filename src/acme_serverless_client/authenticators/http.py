@@ -1,17 +1,22 @@
-import typing
+from __future__ import annotations
 
-import josepy.jwk
-from acme import challenges
+import typing
 
-from ..storage.base import AuthenticatorStorageProtocol
 from .base import AuthenticatorProtocol
 
+if typing.TYPE_CHECKING:
+    import josepy.jwk
+
+    from ..storage.base import AuthenticatorStorageProtocol
+
 
 class HTTP01Authenticator(AuthenticatorProtocol):
     def __init__(self, storage: AuthenticatorStorageProtocol):
         self._storage = storage
 
     def is_supported(self, domain: str, challenge: typing.Any) -> bool:
+        from acme import challenges  # noqa: PLC0415
+
         return isinstance(challenge, challenges.HTTP01)
 
     def perform(
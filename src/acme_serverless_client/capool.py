@@ -0,0 +1,163 @@
+"""Route orders over several ACME CAs with failover.
+
+Each `CertificateAuthority` has its own directory, account (stored as
+`accounts/<name>.json`) and optional External Account Binding credentials.
+`CAPool` orders CAs by the smoothed latency of their last successful order
+placements; a CA that fails with a network error, a 5xx or a rate limit is
+skipped for `cooldown` seconds (doubling on repeated failures, up to 16x) and
+the order is placed with the next one:
+
+    pool = CAPool([
+        CertificateAuthority("letsencrypt", "https://acme-v02.api.letsencrypt.org/directory"),
+        CertificateAuthority("zerossl", "https://acme.zerossl.com/v2/DV90",
+                             eab_kid="...", eab_hmac_key="..."),
+    ])
+    renew(certificate=..., ca_pool=pool, ...)
+
+Health is tracked in process, keep the pool alive across a renewal run.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import typing
+
+from .instrumentation import count
+
+T = typing.TypeVar("T")
+
+
+class CertificateAuthority:
+    def __init__(
+        self,
+        name: str,
+        directory_url: str,
+        *,
+        account_email: str | None = None,
+        eab_kid: str | None = None,
+        eab_hmac_key: str | None = None,
+    ) -> None:
+        # "." separates the CA from the account policy name, see `client.select_account`
+        assert name and "." not in name, f"Invalid CA name: {name!r}"
+        self.name = name
+        self.directory_url = directory_url
+        self.account_email = account_email
+        self.eab = (eab_kid, eab_hmac_key) if eab_kid and eab_hmac_key else None
+
+    def __repr__(self) -> str:
+        return f"CertificateAuthority<{self.name}>"
+
+
+def is_failover_error(exc: Exception) -> bool:
+    """Errors caused by the CA rather than by the order, worth retrying elsewhere."""
+    import requests  # noqa: PLC0415
+    from acme import errors, messages  # noqa: PLC0415
+
+    from .ratelimit import RateLimitExceededError  # noqa: PLC0415
+
+    if isinstance(exc, messages.Error):
+        return exc.code in ("serverInternal", "rateLimited")
+    if isinstance(exc, errors.ConflictError):
+        return False
+    return isinstance(
+        exc, (requests.RequestException, errors.ClientError, RateLimitExceededError)
+    )
+
+
+class CAPool:
+    cooldown = 300.0
+    latency_decay = 0.3
+
+    def __init__(
+        self,
+        authorities: typing.Sequence[CertificateAuthority],
+        *,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        assert authorities, "at least one CA is required"
+        self.authorities = {ca.name: ca for ca in authorities}
+        self.clock = clock
+        self._latency: dict[str, float] = {}
+        self._failures: dict[str, int] = {}
+        self._unhealthy_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CertificateAuthority:
+        return self.authorities[name]
+
+    def for_account(self, account_name: str | None) -> CertificateAuthority | None:
+        """CA of an account created by the pool."""
+        return self.authorities.get((account_name or "").partition(".")[0])
+
+    def is_healthy(self, ca: CertificateAuthority) -> bool:
+        with self._lock:
+            return self._unhealthy_until.get(ca.name, 0) <= self.clock()
+
+    def candidates(
+        self, preferred: CertificateAuthority | None = None
+    ) -> list[CertificateAuthority]:
+        """Healthy CAs fastest first, then unhealthy ones as a last resort.
+
+        CAs without a measurement sort first so that each gets probed.
+        """
+        with self._lock:
+            now = self.clock()
+            healthy = sorted(
+                (
+                    ca
+                    for ca in self.authorities.values()
+                    if self._unhealthy_until.get(ca.name, 0) <= now
+                ),
+                key=lambda ca: self._latency.get(ca.name, 0.0),
+            )
+            unhealthy = sorted(
+                (ca for ca in self.authorities.values() if ca not in healthy),
+                key=lambda ca: self._unhealthy_until[ca.name],
+            )
+        if preferred is not None and preferred in healthy:
+            healthy.remove(preferred)
+            healthy.insert(0, preferred)
+        return healthy + unhealthy
+
+    def record_success(self, ca: CertificateAuthority, seconds: float) -> None:
+        with self._lock:
+            previous = self._latency.get(ca.name)
+            self._latency[ca.name] = (
+                seconds
+                if previous is None
+                else previous + self.latency_decay * (seconds - previous)
+            )
+            self._failures.pop(ca.name, None)
+            self._unhealthy_until.pop(ca.name, None)
+
+    def record_failure(self, ca: CertificateAuthority) -> None:
+        with self._lock:
+            failures = self._failures.get(ca.name, 0) + 1
+            self._failures[ca.name] = failures
+            self._unhealthy_until[ca.name] = self.clock() + self.cooldown * 2 ** min(
+                failures - 1, 4
+            )
+
+    def call(
+        self,
+        func: typing.Callable[[CertificateAuthority], T],
+        preferred: CertificateAuthority | None = None,
+    ) -> T:
+        """Call `func` with the best CA, failing over to the next ones."""
+        last_exc: Exception | None = None
+        for ca in self.candidates(preferred):
+            start = self.clock()
+            try:
+                result = func(ca)
+            except Exception as exc:
+                if not is_failover_error(exc):
+                    raise
+                self.record_failure(ca)
+                count("capool.failover", ca=ca.name)
+                last_exc = exc
+                continue
+            self.record_success(ca, self.clock() - start)
+            return result
+        assert last_exc is not None
+        raise last_exc
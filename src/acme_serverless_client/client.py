@@ -3,18 +3,32 @@
 Based on https://github.com/certbot/certbot/blob/859dc38cb9195de072bc46e30e3edc0dab04f84d/acme/examples/http01_example.py
 """
 
+import concurrent.futures
+import contextlib
+import logging
+import threading
 import typing
 
 import acme.client
 from acme import errors, messages
 
 from . import crypto
+from .accounts import account_cache
 from .authenticators.base import AuthenticatorProtocol
+from .instrumentation import count, span
 from .models import Account, Certificate
+from .storage.base import StorageConflictError
+from .transport import get_transport
+from .types import OrderState
 
 if typing.TYPE_CHECKING:
+    from .accounts import AccountPolicyProtocol
+    from .capool import CAPool, CertificateAuthority
+    from .ratelimit import RateLimiter
     from .storage.base import StorageProtocol
 
+logger = logging.getLogger(__name__)
+
 USER_AGENT = "acme-serverless-client"
 
 
@@ -50,59 +64,334 @@ def build_client(account: Account, directory_url: str) -> acme.client.ClientV2:
     net = acme.client.ClientNetwork(
         key=account.key, account=account.regr, user_agent=USER_AGENT
     )
+    transport = get_transport()
+    if transport is not None:
+        transport.attach(net)
     directory = acme.client.ClientV2.get_directory(directory_url, net)
     return acme.client.ClientV2(directory, net=net)
 
 
 def setup_client(
-    storage: "StorageProtocol", account_email: str, directory_url: str
+    storage: "StorageProtocol",
+    account_email: str,
+    directory_url: str,
+    account_name: str | None = None,
+    eab: tuple[str, str] | None = None,
+    *,
+    rate_limiter: "RateLimiter | None" = None,
 ) -> acme.client.ClientV2:
-    account = storage.get_account()
+    """Client for the stored account, registered with the CA on first use.
+
+    `eab` is the External Account Binding key id and HMAC key required by
+    some CAs for registration.
+    """
+    account = account_cache.get(storage, directory_url, account_name)
+    if account is None:
+        account = storage.get_account(account_name)
     if account:
         client = build_client(account, directory_url)
     else:
-        new_account = Account()
-        client = build_client(new_account, directory_url)
-        new_account.regr = client.new_account(
-            messages.NewRegistration.from_data(
-                email=account_email, terms_of_service_agreed=True
+        account = Account()
+        client = build_client(account, directory_url)
+        binding = None
+        if eab is not None:
+            binding = messages.ExternalAccountBinding.from_data(
+                account_public_key=account.key.public_key(),
+                kid=eab[0],
+                hmac_key=eab[1],
+                directory=client.directory,
             )
+        if rate_limiter is not None:
+            rate_limiter.watch(client.net.session)
+            rate_limiter.acquire("new_account")
+        watching = (
+            rate_limiter.watching()
+            if rate_limiter is not None
+            else contextlib.nullcontext()
         )
-        storage.set_account(new_account)
+        with watching:
+            try:
+                account.regr = client.new_account(
+                    messages.NewRegistration.from_data(
+                        email=account_email,
+                        terms_of_service_agreed=True,
+                        external_account_binding=binding,
+                    )
+                )
+            except (messages.Error, errors.ClientError) as exc:
+                if rate_limiter is not None:
+                    rate_limiter.penalize("new_account", exc)
+                raise
+        storage.set_account(account, account_name)
+    account_cache.set(storage, directory_url, account_name, account)
     return client
 
 
+def select_account(
+    certificate: Certificate,
+    order_state: typing.Mapping[str, typing.Any] | None,
+    account_policy: "AccountPolicyProtocol | None",
+    ca_name: str | None = None,
+) -> str | None:
+    if order_state and order_state["domains"] == certificate.domains:
+        # an order can only be finalized by the account that created it
+        account_name: str | None = order_state.get("account")
+        return account_name
+    if ca_name is not None:
+        # every CA of a pool has its own accounts, `<ca>` or `<ca>.<policy name>`
+        name = account_policy.select(certificate.domains) if account_policy else None
+        return f"{ca_name}.{name}" if name else ca_name
+    if account_policy is not None:
+        return account_policy.select(certificate.domains)
+    return certificate.account_name
+
+
+def resume_order(
+    client: acme.client.ClientV2, order_state: typing.Mapping[str, typing.Any]
+) -> messages.OrderResource | None:
+    """Fetch an order persisted by `perform`, None if it can't be continued."""
+    url = order_state["order_url"]
+    try:
+        body = messages.Order.from_json(client._post_as_get(url).json())
+        if body.status == messages.STATUS_INVALID:
+            return None
+        authorizations = [
+            client._authzr_from_response(client._post_as_get(authz_url), uri=authz_url)
+            for authz_url in body.authorizations
+        ]
+    except messages.Error:
+        # expired and deleted orders are answered with 404
+        return None
+    return messages.OrderResource(
+        body=body,
+        uri=url,
+        authorizations=authorizations,
+        csr_pem=order_state["csr"].encode(),
+    )
+
+
+def place_order(
+    client: acme.client.ClientV2,
+    certificate: Certificate,
+    storage: "StorageProtocol",
+    *,
+    directory_url: str,
+    order_state: typing.Mapping[str, typing.Any] | None,
+    rate_limiter: "RateLimiter | None",
+) -> messages.OrderResource:
+    """Continue the persisted order of the certificate or create a new one."""
+    if order_state and order_state["domains"] == certificate.domains:
+        with span("client.resume_order"):
+            orderr = resume_order(client, order_state)
+        if orderr is not None:
+            certificate.private_key = order_state["private_key"].encode()
+            return orderr
+    # only renewals can have material prepared by `helpers.prestage`
+    pending = (
+        storage.get_pending(certificate.name) if certificate.is_fullchain_set else None
+    )
+    if pending and pending["domains"] == certificate.domains:
+        certificate.private_key = pending["private_key"].encode()
+        csr_pem = pending["csr"].encode()
+    else:
+        with span("client.make_csr"):
+            csr_pem = crypto.make_csr(certificate.private_key, certificate.domains)
+    # new order limits are per account
+    endpoint = "new_order"
+    if certificate.account_name:
+        endpoint = f"new_order@{certificate.account_name}"
+    if rate_limiter is not None:
+        rate_limiter.acquire(
+            endpoint, certificate.domains, renewal=certificate.is_fullchain_set
+        )
+    watching = (
+        rate_limiter.watching()
+        if rate_limiter is not None
+        else contextlib.nullcontext()
+    )
+    with span("client.new_order"), watching:
+        try:
+            orderr = client.new_order(csr_pem)
+        except (messages.Error, errors.ClientError) as exc:
+            if rate_limiter is not None:
+                rate_limiter.penalize(endpoint, exc)
+            raise
+    storage.set_order(
+        certificate.name,
+        {
+            "domains": certificate.domains,
+            "order_url": orderr.uri,
+            "authorizations": [authzr.uri for authzr in orderr.authorizations],
+            "csr": csr_pem.decode(),
+            "private_key": certificate.private_key.decode(),
+            "account": certificate.account_name,
+            "directory_url": directory_url,
+        },
+    )
+    if pending:
+        # the key and CSR live on in the order state
+        storage.del_pending(certificate.name)
+    return orderr
+
+
+def open_order(
+    certificate: Certificate,
+    storage: "StorageProtocol",
+    acme_account_email: str,
+    acme_directory_url: str,
+    *,
+    order_state: typing.Mapping[str, typing.Any] | None,
+    account_policy: "AccountPolicyProtocol | None",
+    rate_limiter: "RateLimiter | None",
+    ca: "CertificateAuthority | None" = None,
+) -> tuple[acme.client.ClientV2, messages.OrderResource]:
+    """Set up the client and resume or place the order with the given CA."""
+    if order_state and (
+        order_state.get("directory_url", acme_directory_url) != acme_directory_url
+    ):
+        # the order belongs to another CA of the pool
+        order_state = None
+    certificate.account_name = select_account(
+        certificate, order_state, account_policy, ca_name=ca.name if ca else None
+    )
+    with span("client.setup_client"):
+        client = setup_client(
+            storage=storage,
+            directory_url=acme_directory_url,
+            account_email=acme_account_email,
+            account_name=certificate.account_name,
+            eab=ca.eab if ca else None,
+            rate_limiter=rate_limiter,
+        )
+    if rate_limiter is not None:
+        rate_limiter.watch(client.net.session)
+    orderr = place_order(
+        client,
+        certificate,
+        storage,
+        directory_url=acme_directory_url,
+        order_state=order_state,
+        rate_limiter=rate_limiter,
+    )
+    return client, orderr
+
+
+def open_pooled_order(
+    certificate: Certificate,
+    storage: "StorageProtocol",
+    acme_account_email: str,
+    ca_pool: "CAPool",
+    *,
+    order_state: typing.Mapping[str, typing.Any] | None,
+    account_policy: "AccountPolicyProtocol | None",
+    rate_limiter: "RateLimiter | None",
+) -> tuple[acme.client.ClientV2, messages.OrderResource]:
+    """`open_order` with the best CA of the pool, resumed orders stay with their CA
+    while it is healthy."""
+    preferred = None
+    if order_state and order_state["domains"] == certificate.domains:
+        preferred = ca_pool.for_account(order_state.get("account"))
+
+    def open_with(
+        ca: "CertificateAuthority",
+    ) -> tuple[acme.client.ClientV2, messages.OrderResource]:
+        return open_order(
+            certificate,
+            storage,
+            ca.account_email or acme_account_email,
+            ca.directory_url,
+            order_state=order_state,
+            account_policy=account_policy,
+            rate_limiter=rate_limiter,
+            ca=ca,
+        )
+
+    return ca_pool.call(open_with, preferred)
+
+
 def perform(
     certificate: Certificate,
     storage: "StorageProtocol",
     acme_account_email: str,
     acme_directory_url: str,
     authenticators: typing.Sequence[AuthenticatorProtocol],
+    *,
+    checkpoint: typing.Callable[[OrderState], None] | None = None,
+    rate_limiter: "RateLimiter | None" = None,
+    account_policy: "AccountPolicyProtocol | None" = None,
+    ca_pool: "CAPool | None" = None,
 ) -> None:
-    client = setup_client(
-        storage=storage,
-        directory_url=acme_directory_url,
-        account_email=acme_account_email,
-    )
+    """Order, validate and save the certificate.
 
-    orderr = client.new_order(
-        crypto.make_csr(certificate.private_key, certificate.domains)
-    )
+    With `ca_pool` the order goes to the best CA of the pool and
+    `acme_directory_url` is ignored.
+    """
+
+    def report(state: OrderState) -> None:
+        if checkpoint is not None:
+            checkpoint(state)
+
+    order_state = storage.get_order(certificate.name)
+    if ca_pool is None:
+        client, orderr = open_order(
+            certificate,
+            storage,
+            acme_account_email,
+            acme_directory_url,
+            order_state=order_state,
+            account_policy=account_policy,
+            rate_limiter=rate_limiter,
+        )
+    else:
+        client, orderr = open_pooled_order(
+            certificate,
+            storage,
+            acme_account_email,
+            ca_pool,
+            order_state=order_state,
+            account_policy=account_policy,
+            rate_limiter=rate_limiter,
+        )
+    report("ordered")
     auth_challs = select_challs(orderr, authenticators)
     account_key = client.net.key
     assert account_key is not None
     for authenticator, challs in auth_challs:
-        authenticator.perform(challs, account_key)
+        authenticator_name = type(authenticator).__name__
+        with span("authenticator.perform", authenticator=authenticator_name):
+            authenticator.perform(challs, account_key)
         for challb, _ in challs:
-            client.answer_challenge(challb, challb.response(account_key))
+            with span("client.answer_challenge", authenticator=authenticator_name):
+                client.answer_challenge(challb, challb.response(account_key))
+    report("challenges_ready")
     try:
-        finalized_orderr = client.poll_and_finalize(orderr)
+        with span("client.poll_and_finalize"):
+            try:
+                finalized_orderr = client.poll_and_finalize(orderr)
+            except errors.ValidationError as exc:
+                if rate_limiter is not None:
+                    rate_limiter.record_failed_validation(
+                        authzr.body.identifier.value for authzr in exc.failed_authzrs
+                    )
+                raise
         fullchain_pem = finalized_orderr.fullchain_pem.encode("utf8")
         certificate.set_fullchain(fullchain_pem)
-        storage.save_certificate(certificate)
+        report("finalized")
+        with span("storage.save_certificate"):
+            try:
+                storage.save_certificate(certificate)
+            except StorageConflictError:
+                # the order is superseded by the certificate stored meanwhile
+                storage.del_order(certificate.name)
+                raise
+        storage.del_order(certificate.name)
+        report("saved")
     finally:
         for authenticator, challs in auth_challs:
-            authenticator.cleanup(challs, account_key)
+            with span(
+                "authenticator.cleanup", authenticator=type(authenticator).__name__
+            ):
+                authenticator.cleanup(challs, account_key)
 
 
 def issue(
@@ -112,13 +401,30 @@ def issue(
     acme_account_email: str,
     acme_directory_url: str,
     authenticators: typing.Sequence[AuthenticatorProtocol],
+    rate_limiter: "RateLimiter | None" = None,
+    account_policy: "AccountPolicyProtocol | None" = None,
+    ca_pool: "CAPool | None" = None,
 ) -> None:
-    certificate = Certificate(
-        domains=domains, private_key=Certificate.generate_private_key()
-    )
-    perform(
-        certificate, storage, acme_account_email, acme_directory_url, authenticators
-    )
+    # a concurrent issue or renewal of the certificate raises LeaseHeldError
+    with storage.lease(domains[0]):
+        order_state = storage.get_order(domains[0])
+        if order_state and order_state["domains"] == list(domains):
+            # the key of the in-flight order is reused by `perform`
+            private_key = order_state["private_key"].encode()
+        else:
+            with span("client.generate_private_key"):
+                private_key = Certificate.generate_private_key()
+        certificate = Certificate(domains=domains, private_key=private_key)
+        perform(
+            certificate,
+            storage,
+            acme_account_email,
+            acme_directory_url,
+            authenticators,
+            rate_limiter=rate_limiter,
+            account_policy=account_policy,
+            ca_pool=ca_pool,
+        )
 
 
 def renew(
@@ -128,10 +434,43 @@ def renew(
     acme_account_email: str,
     acme_directory_url: str,
     authenticators: typing.Sequence[AuthenticatorProtocol],
+    checkpoint: typing.Callable[[OrderState], None] | None = None,
+    rate_limiter: "RateLimiter | None" = None,
+    account_policy: "AccountPolicyProtocol | None" = None,
+    ca_pool: "CAPool | None" = None,
 ) -> None:
-    perform(
-        certificate, storage, acme_account_email, acme_directory_url, authenticators
-    )
+    with storage.lease(certificate.name):
+        # another worker may have renewed it before the lease was taken
+        if (
+            certificate.version is not None
+            and storage.get_certificate_version(certificate.name) != certificate.version
+        ):
+            count("client.renew_superseded")
+            return
+        perform(
+            certificate,
+            storage,
+            acme_account_email,
+            acme_directory_url,
+            authenticators,
+            checkpoint=checkpoint,
+            rate_limiter=rate_limiter,
+            account_policy=account_policy,
+            ca_pool=ca_pool,
+        )
+
+
+def revocation_directory(
+    certificate: Certificate,
+    acme_account_email: str,
+    acme_directory_url: str,
+    ca_pool: "CAPool | None",
+) -> tuple[str, str]:
+    """Account email and directory of the CA that issued the certificate."""
+    ca = ca_pool.for_account(certificate.account_name) if ca_pool else None
+    if ca is None:
+        return acme_account_email, acme_directory_url
+    return ca.account_email or acme_account_email, ca.directory_url
 
 
 def revoke(
@@ -140,18 +479,91 @@ def revoke(
     storage: "StorageProtocol",
     acme_account_email: str,
     acme_directory_url: str,
+    ca_pool: "CAPool | None" = None,
 ) -> None:
-    fullchain_com = crypto.load_certificate(certificate.fullchain)
-    client = setup_client(
-        storage=storage,
-        directory_url=acme_directory_url,
-        account_email=acme_account_email,
+    fullchain_com = certificate.x509
+    acme_account_email, acme_directory_url = revocation_directory(
+        certificate, acme_account_email, acme_directory_url, ca_pool
     )
+    with span("client.setup_client"):
+        client = setup_client(
+            storage=storage,
+            directory_url=acme_directory_url,
+            account_email=acme_account_email,
+            account_name=certificate.account_name,
+        )
     try:
-        client.revoke(fullchain_com, rsn=0)
+        with span("client.revoke"):
+            client.revoke(fullchain_com, rsn=0)
     except errors.ConflictError as exc:
         raise RuntimeError(
             f"[REVOKE] {certificate.name} certificate already revoked."
         ) from exc
     finally:
-        storage.remove_certificate(certificate)
+        with span("storage.remove_certificate"):
+            storage.remove_certificate(certificate)
+
+
+def revoke_many(
+    *,
+    certificates: typing.Sequence[Certificate],
+    storage: "StorageProtocol",
+    acme_account_email: str,
+    acme_directory_url: str,
+    reason: int = 0,
+    concurrency: int = 8,
+    ca_pool: "CAPool | None" = None,
+) -> dict[str, str]:
+    """Revoke certificates from `concurrency` threads, e.g. on key compromise
+    (`reason=1`, RFC 5280 CRLReason).
+
+    Certificates of the same CA and account share one ACME client. Each
+    revoked or already revoked certificate is removed from storage as soon as
+    its revocation completes, failed ones are kept to retry. Returns the
+    outcome by certificate name: `revoked`, `skipped` (already revoked),
+    `failed` or `cleanup_failed` (removed, but an observer failed).
+    """
+    clients: dict[tuple[str, str | None], acme.client.ClientV2] = {}
+    lock = threading.Lock()
+
+    def get_client(certificate: Certificate) -> acme.client.ClientV2:
+        email, directory_url = revocation_directory(
+            certificate, acme_account_email, acme_directory_url, ca_pool
+        )
+        key = (directory_url, certificate.account_name)
+        with lock:
+            if key not in clients:
+                with span("client.setup_client"):
+                    clients[key] = setup_client(
+                        storage=storage,
+                        directory_url=directory_url,
+                        account_email=email,
+                        account_name=certificate.account_name,
+                    )
+            return clients[key]
+
+    def revoke_one(certificate: Certificate) -> str:
+        client = get_client(certificate)
+        try:
+            with span("client.revoke"):
+                client.revoke(certificate.x509, rsn=reason)
+        except errors.ConflictError:
+            outcome = "skipped"
+        else:
+            outcome = "revoked"
+        with span("storage.remove_certificates"):
+            failures = storage.remove_certificates([certificate], concurrency=1)
+        # removed from storage, but e.g. still imported into ACM
+        return "cleanup_failed" if failures else outcome
+
+    result: dict[str, str] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(revoke_one, c): c.name for c in certificates}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                result[name] = future.result()
+            except Exception as exc:
+                logger.error("[REVOKE] %s failed: %s", name, exc)
+                result[name] = "failed"
+    return result
@@ -1,11 +1,16 @@
+"""Key and CSR helpers.
+
+`cryptography` and `josepy` are imported inside the functions, they are only
+needed once an order is actually placed and cost a lot on a cold start.
+"""
+
+from __future__ import annotations
+
 import typing
 
-import josepy.jwk
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.x509.oid import NameOID
+if typing.TYPE_CHECKING:
+    import josepy.jwk
+    from cryptography import x509
 
 ACC_KEY_BITS = 2048
 CERT_PKEY_BITS = 2048
@@ -13,6 +18,12 @@ CERT_PKEY_BITS = 2048
 
 def make_csr(private_key_pem: bytes, domains: typing.Sequence[str]) -> bytes:
     """Generate a CSR with CN set to the first domain and all domains as SANs."""
+    from cryptography import x509  # noqa: PLC0415
+    from cryptography.hazmat.backends import default_backend  # noqa: PLC0415
+    from cryptography.hazmat.primitives import hashes, serialization  # noqa: PLC0415
+    from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: PLC0415
+    from cryptography.x509.oid import NameOID  # noqa: PLC0415
+
     private_key = serialization.load_pem_private_key(
         private_key_pem, password=None, backend=default_backend()
     )
@@ -30,10 +41,35 @@ def make_csr(private_key_pem: bytes, domains: typing.Sequence[str]) -> bytes:
 
 
 def load_certificate(pem: bytes) -> x509.Certificate:
+    from cryptography import x509  # noqa: PLC0415
+    from cryptography.hazmat.backends import default_backend  # noqa: PLC0415
+
     return x509.load_pem_x509_certificate(pem, default_backend())
 
 
+def get_dns_names(certificate: x509.Certificate) -> list[str]:
+    from cryptography import x509  # noqa: PLC0415
+
+    try:
+        san = certificate.extensions.get_extension_for_class(
+            x509.SubjectAlternativeName
+        )
+    except x509.ExtensionNotFound:
+        return []
+    return san.value.get_values_for_type(x509.DNSName)
+
+
+def get_fingerprint(certificate: x509.Certificate) -> str:
+    from cryptography.hazmat.primitives import hashes  # noqa: PLC0415
+
+    return certificate.fingerprint(hashes.SHA256()).hex()
+
+
 def generate_private_key() -> bytes:
+    from cryptography.hazmat.backends import default_backend  # noqa: PLC0415
+    from cryptography.hazmat.primitives import serialization  # noqa: PLC0415
+    from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: PLC0415
+
     key = rsa.generate_private_key(
         public_exponent=65537, key_size=CERT_PKEY_BITS, backend=default_backend()
     )
@@ -45,6 +81,10 @@ def generate_private_key() -> bytes:
 
 
 def generate_account_key() -> josepy.jwk.JWKRSA:
+    import josepy.jwk  # noqa: PLC0415
+    from cryptography.hazmat.backends import default_backend  # noqa: PLC0415
+    from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: PLC0415
+
     return josepy.jwk.JWKRSA(
         key=rsa.generate_private_key(
             public_exponent=65537, key_size=ACC_KEY_BITS, backend=default_backend()
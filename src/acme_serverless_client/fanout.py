@@ -0,0 +1,169 @@
+"""Split a renewal run into shards processed by separate workers.
+
+The coordinator opens a `RenewalRun` and partitions its certificates with a
+consistent hash ring on `Certificate.name`, so a name stays on the same shard
+when the number of workers changes by one. Each shard descriptor is a JSON
+serializable dict that a worker (another Lambda invocation, a container task
+or a local subprocess) passes to `run_shard`. Workers claim tasks of the shared
+run, a certificate is never renewed twice even if shards overlap on retries.
+
+Local simulation, `factory` is a `module:callable` returning the keyword
+arguments for `run_shard` (storage, acme_account_email, acme_directory_url,
+authenticators):
+
+    python -m acme_serverless_client.fanout --factory myapp:renew_params --shards 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import concurrent.futures
+import hashlib
+import importlib
+import json
+import subprocess
+import sys
+import typing
+
+from .jobs import RenewalRun
+
+if typing.TYPE_CHECKING:
+    from .accounts import AccountPolicyProtocol
+    from .authenticators.base import AuthenticatorProtocol
+    from .capool import CAPool
+    from .ratelimit import RateLimiter
+    from .storage.base import BaseStorage
+
+ShardDescriptor = dict[str, typing.Any]
+
+
+class HashRing:
+    def __init__(self, shards: int, replicas: int = 64) -> None:
+        assert shards > 0, "at least one shard is required"
+        self.shards = shards
+        points = sorted(
+            (self._hash(f"{shard}:{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self._keys = [key for key, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def shard_for(self, name: str) -> int:
+        index = bisect.bisect(self._keys, self._hash(name)) % len(self._keys)
+        return self._shards[index]
+
+
+def partition(names: typing.Iterable[str], shards: int) -> list[list[str]]:
+    ring = HashRing(shards)
+    result: list[list[str]] = [[] for _ in range(shards)]
+    for name in names:
+        result[ring.shard_for(name)].append(name)
+    return result
+
+
+def plan(
+    storage: BaseStorage,
+    shards: int,
+    run_id: str | None = None,
+    cert_fresh_days: int = 60,
+) -> list[ShardDescriptor]:
+    run = RenewalRun.open(storage, run_id=run_id, cert_fresh_days=cert_fresh_days)
+    return [
+        {"run_id": run.run_id, "shard": index, "shards": shards, "names": names}
+        for index, names in enumerate(partition(run.names, shards))
+    ]
+
+
+def run_shard(
+    descriptor: ShardDescriptor,
+    *,
+    storage: BaseStorage,
+    acme_account_email: str,
+    acme_directory_url: str,
+    authenticators: typing.Sequence[AuthenticatorProtocol],
+    should_continue: typing.Callable[[], bool] = lambda: True,
+    rate_limiter: RateLimiter | None = None,
+    account_policy: AccountPolicyProtocol | None = None,
+    ca_pool: CAPool | None = None,
+) -> dict[str, typing.Any]:
+    run = RenewalRun(storage, descriptor["run_id"])
+    result = run.process(
+        acme_account_email=acme_account_email,
+        acme_directory_url=acme_directory_url,
+        authenticators=authenticators,
+        should_continue=should_continue,
+        names=descriptor["names"],
+        rate_limiter=rate_limiter,
+        account_policy=account_policy,
+        ca_pool=ca_pool,
+    )
+    return {"shard": descriptor["shard"], **result}
+
+
+def aggregate(results: typing.Iterable[typing.Mapping[str, typing.Any]]) -> dict:
+    total: dict[str, typing.Any] = {
+        "shards": 0,
+        "saved": [],
+        "failed": [],
+        "skipped": [],
+    }
+    for result in results:
+        total["shards"] += 1
+        for key in ("saved", "failed", "skipped"):
+            total[key].extend(result[key])
+    return total
+
+
+def load_factory(path: str) -> typing.Callable[[], typing.Mapping[str, typing.Any]]:
+    module_name, _, attr = path.partition(":")
+    factory: typing.Callable[[], typing.Mapping[str, typing.Any]] = getattr(
+        importlib.import_module(module_name), attr
+    )
+    return factory
+
+
+def run_local(
+    descriptors: typing.Sequence[ShardDescriptor], factory: str
+) -> dict[str, typing.Any]:
+    """Run every shard in its own Python subprocess and aggregate the results."""
+
+    def spawn(descriptor: ShardDescriptor) -> dict[str, typing.Any]:
+        proc = subprocess.run(
+            [sys.executable, "-m", __name__, "worker", "--factory", factory],
+            input=json.dumps(descriptor),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result: dict[str, typing.Any] = json.loads(proc.stdout)
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(descriptors)) as pool:
+        return aggregate(pool.map(spawn, descriptors))
+
+
+def main(argv: typing.Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Fan-out certificate renewal.")
+    parser.add_argument("role", choices=["coordinator", "worker"], nargs="?")
+    parser.add_argument("--factory", required=True, help="module:callable")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--run-id")
+    args = parser.parse_args(argv)
+    params = load_factory(args.factory)()
+    if args.role == "worker":
+        result = run_shard(json.load(sys.stdin), **params)
+    else:
+        descriptors = plan(params["storage"], args.shards, run_id=args.run_id)
+        result = run_local(descriptors, args.factory)
+    json.dump(result, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 import datetime
+import time
 import typing
 
+from . import crypto
 from .models import Certificate
 from .storage.base import StorageProtocol
 
 
 def find_certificates_to_renew(
-    storage: StorageProtocol, cert_fresh_days: int = 60
+    storage: StorageProtocol,
+    cert_fresh_days: int = 60,
+    prestage_days: int | None = None,
+    rotate_keys: bool = False,
 ) -> typing.Iterator[tuple[Certificate, datetime.datetime]]:
-    """Returns iterator of `domain name` and `valid after date` of stored certs."""
+    """Returns iterator of `domain name` and `valid after date` of stored certs.
+
+    With `prestage_days` certificates due within that many days get their next
+    key and CSR prepared, see `prestage`.
+    """
     now = datetime.datetime.now(datetime.timezone.utc)
     for cert_name, valid_after in storage.list_certificates():
         fresh_before = valid_after + datetime.timedelta(days=cert_fresh_days)
@@ -16,3 +25,61 @@ def find_certificates_to_renew(
             cert = storage.get_certificate(name=cert_name)
             assert cert
             yield (cert, valid_after)
+        elif (
+            prestage_days is not None
+            and now > fresh_before - datetime.timedelta(days=prestage_days)
+            and storage.get_pending(cert_name) is None
+        ):
+            cert = storage.get_certificate(name=cert_name)
+            assert cert
+            prestage(storage, cert, rotate_key=rotate_keys)
+
+
+def prestage(
+    storage: StorageProtocol, certificate: Certificate, rotate_key: bool = False
+) -> dict[str, typing.Any]:
+    """Prepare the key and CSR of the next order off the renewal critical path.
+
+    `client.perform` picks the material up when it places a new order for the
+    same domains. The current key is reused unless `rotate_key` is set.
+    """
+    private_key = (
+        crypto.generate_private_key() if rotate_key else certificate.private_key
+    )
+    material = {
+        "domains": certificate.domains,
+        "private_key": private_key.decode(),
+        "csr": crypto.make_csr(private_key, certificate.domains).decode(),
+        "created_at": time.time(),
+    }
+    storage.set_pending(certificate.name, material)
+    return material
+
+
+# Multi-label public suffixes common enough to matter for rate limits,
+# anything else is treated as a single-label suffix.
+PUBLIC_SUFFIXES = frozenset(
+    {
+        "co.uk",
+        "org.uk",
+        "ac.uk",
+        "gov.uk",
+        "com.au",
+        "net.au",
+        "org.au",
+        "co.nz",
+        "co.jp",
+        "co.za",
+        "com.br",
+        "com.cn",
+        "com.mx",
+        "com.tr",
+    }
+)
+
+
+def registered_domain(domain: str) -> str:
+    """Approximate registrable domain, e.g. `a.b.example.co.uk` -> `example.co.uk`."""
+    labels = domain.lower().rstrip(".").removeprefix("*.").split(".")
+    size = 3 if ".".join(labels[-2:]) in PUBLIC_SUFFIXES else 2
+    return ".".join(labels[-size:])
@@ -0,0 +1,169 @@
+"""Timing and counter hooks around client phases, storage and DNS calls.
+
+Instrumentation is process wide, install an implementation once at startup:
+
+    aggregator = AggregatingInstrumentation()
+    set_instrumentation(aggregator)
+    ...
+    aggregator.print_report()
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import math
+import sys
+import threading
+import time
+import typing
+
+Attribute = str | int | float | bool
+
+
+class InstrumentationProtocol(typing.Protocol):
+    def span(
+        self, name: str, **attributes: Attribute
+    ) -> typing.ContextManager[None]: ...
+
+    def count(self, name: str, value: int = 1, **attributes: Attribute) -> None: ...
+
+
+class NoopInstrumentation(InstrumentationProtocol):
+    def span(self, name: str, **attributes: Attribute) -> typing.ContextManager[None]:
+        return contextlib.nullcontext()
+
+    def count(self, name: str, value: int = 1, **attributes: Attribute) -> None:
+        pass
+
+
+class AggregatingInstrumentation(InstrumentationProtocol):
+    """Collects span durations and counters in memory and prints histograms."""
+
+    def __init__(self) -> None:
+        self.durations: dict[str, list[float]] = collections.defaultdict(list)
+        self.counters: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Attribute) -> typing.Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.count(f"{name}.errors")
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.durations[name].append(elapsed)
+
+    def count(self, name: str, value: int = 1, **attributes: Attribute) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.durations.clear()
+            self.counters.clear()
+
+    def report(self) -> str:
+        with self._lock:
+            durations = {name: sorted(v) for name, v in self.durations.items()}
+            counters = dict(self.counters)
+        lines = []
+        for name, values in sorted(durations.items()):
+            total = sum(values)
+            lines.append(
+                f"{name}: n={len(values)} total={total * 1000:.1f}ms"
+                f" p50={_percentile(values, 50) * 1000:.2f}ms"
+                f" p99={_percentile(values, 99) * 1000:.2f}ms"
+                f" max={values[-1] * 1000:.2f}ms"
+            )
+            buckets = _histogram(values)
+            width = max(buckets.values())
+            for upper, n in buckets.items():
+                bar = "#" * max(1, round(n * 40 / width)) if n else ""
+                lines.append(f"  <{upper:>8g}ms {n:>6} {bar}")
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+    def print_report(self, file: typing.TextIO | None = None) -> None:
+        print(self.report(), file=file or sys.stdout)
+
+
+def _percentile(ordered: typing.Sequence[float], q: float) -> float:
+    index = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _histogram(values: typing.Iterable[float]) -> dict[float, int]:
+    """Power-of-two millisecond buckets from the smallest to the largest value."""
+    counts: collections.Counter[int] = collections.Counter(
+        max(0, math.ceil(math.log2(max(v * 1000, 1e-3))) + 10) for v in values
+    )
+    low, high = min(counts), max(counts)
+    return {2.0 ** (i - 10): counts.get(i, 0) for i in range(low, high + 1)}
+
+
+class OpenTelemetryInstrumentation(InstrumentationProtocol):
+    """Adapter to the OpenTelemetry API, `opentelemetry-api` must be installed."""
+
+    def __init__(self, tracer: typing.Any = None, meter: typing.Any = None) -> None:
+        if tracer is None or meter is None:
+            from opentelemetry import metrics, trace  # type: ignore  # noqa: PLC0415
+
+            tracer = tracer or trace.get_tracer("acme_serverless_client")
+            meter = meter or metrics.get_meter("acme_serverless_client")
+        self.tracer = tracer
+        self.meter = meter
+        self._counters: dict[str, typing.Any] = {}
+        self._histograms: dict[str, typing.Any] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Attribute) -> typing.Iterator[None]:
+        start = time.perf_counter()
+        with self.tracer.start_as_current_span(name, attributes=attributes):
+            try:
+                yield
+            finally:
+                self._histogram(name).record(time.perf_counter() - start, attributes)
+
+    def count(self, name: str, value: int = 1, **attributes: Attribute) -> None:
+        self._counter(name).add(value, attributes)
+
+    def _histogram(self, name: str) -> typing.Any:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = self.meter.create_histogram(
+                    f"{name}.duration", unit="s"
+                )
+            return self._histograms[name]
+
+    def _counter(self, name: str) -> typing.Any:
+        with self._lock:
+            if name not in self._counters:
+                self._counters[name] = self.meter.create_counter(name)
+            return self._counters[name]
+
+
+_instrumentation: InstrumentationProtocol = NoopInstrumentation()
+
+
+def get_instrumentation() -> InstrumentationProtocol:
+    return _instrumentation
+
+
+def set_instrumentation(instrumentation: InstrumentationProtocol | None) -> None:
+    global _instrumentation  # noqa: PLW0603
+    _instrumentation = instrumentation or NoopInstrumentation()
+
+
+def span(name: str, **attributes: Attribute) -> typing.ContextManager[None]:
+    return _instrumentation.span(name, **attributes)
+
+
+def count(name: str, value: int = 1, **attributes: Attribute) -> None:
+    _instrumentation.count(name, value, **attributes)
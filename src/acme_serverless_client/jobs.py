@@ -0,0 +1,237 @@
+"""Resumable renewal runs backed by storage.
+
+A run writes a manifest with the names of certificates due for renewal and
+one task object per certificate. Workers claim tasks with a time limited lease,
+checkpoint order progress into the task and mark it `saved` when done, so an
+invocation that times out leaves the remaining work for the next one and
+several invocations can drain the same run in parallel.
+"""
+
+from __future__ import annotations
+
+import datetime
+import logging
+import time
+import typing
+import uuid
+
+from .helpers import find_certificates_to_renew
+from .storage.base import StorageConflictError
+
+if typing.TYPE_CHECKING:
+    from .accounts import AccountPolicyProtocol
+    from .authenticators.base import AuthenticatorProtocol
+    from .capool import CAPool
+    from .ratelimit import RateLimiter
+    from .storage.base import BaseStorage
+    from .types import OrderState
+
+logger = logging.getLogger(__name__)
+
+TaskState = typing.Literal[
+    "pending", "ordered", "challenges_ready", "finalized", "saved", "failed"
+]
+
+
+class RenewalRun:
+    lease_seconds = 600
+    max_attempts = 3
+
+    def __init__(
+        self, storage: BaseStorage, run_id: str, worker_id: str | None = None
+    ) -> None:
+        self.storage = storage
+        self.run_id = run_id
+        self.worker_id = worker_id or uuid.uuid4().hex
+
+    @classmethod
+    def open(
+        cls,
+        storage: BaseStorage,
+        run_id: str | None = None,
+        cert_fresh_days: int = 60,
+        worker_id: str | None = None,
+        *,
+        prestage_days: int | None = None,
+        rotate_keys: bool = False,
+    ) -> RenewalRun:
+        """Open an existing run or create it from certificates due for renewal.
+
+        Run id defaults to the current UTC date so that every invocation
+        of a daily schedule works on the same queue. `prestage_days` and
+        `rotate_keys` are passed to `find_certificates_to_renew`.
+        """
+        run_id = run_id or datetime.datetime.now(datetime.timezone.utc).strftime(
+            "%Y-%m-%d"
+        )
+        run = cls(storage, run_id, worker_id=worker_id)
+        if storage.get_renewal_run(run_id) is None:
+            names = [
+                cert.name
+                for cert, _ in find_certificates_to_renew(
+                    storage,
+                    cert_fresh_days,
+                    prestage_days=prestage_days,
+                    rotate_keys=rotate_keys,
+                )
+            ]
+            for name in names:
+                if storage.get_renewal_task(run_id, name) is None:
+                    storage.set_renewal_task(run_id, name, run._new_task())
+            storage.set_renewal_run(
+                run_id,
+                {
+                    "run_id": run_id,
+                    "created_at": time.time(),
+                    "names": names,
+                },
+            )
+        return run
+
+    @property
+    def names(self) -> list[str]:
+        manifest = self.storage.get_renewal_run(self.run_id)
+        assert manifest, f"Renewal run {self.run_id} does not exist"
+        names: list[str] = manifest["names"]
+        return names
+
+    def _new_task(self) -> dict[str, typing.Any]:
+        return {"state": "pending", "attempts": 0, "owner": None, "expires_at": 0}
+
+    def _task(self, name: str) -> dict[str, typing.Any]:
+        return self.storage.get_renewal_task(self.run_id, name) or self._new_task()
+
+    def is_claimable(self, task: typing.Mapping[str, typing.Any]) -> bool:
+        if task["state"] == "saved" or task["attempts"] >= self.max_attempts:
+            return False
+        return (
+            task["owner"] in (None, self.worker_id) or task["expires_at"] < time.time()
+        )
+
+    def claim(self, name: str) -> bool:
+        claimed = False
+
+        def update(task: dict[str, typing.Any] | None) -> dict[str, typing.Any] | None:
+            nonlocal claimed
+            task = task or self._new_task()
+            # re-checked after a concurrent write, the other worker wins
+            claimed = self.is_claimable(task)
+            if not claimed:
+                return None
+            task.update(
+                owner=self.worker_id,
+                expires_at=time.time() + self.lease_seconds,
+                attempts=task["attempts"] + 1,
+            )
+            return task
+
+        try:
+            self.storage.update_renewal_task(self.run_id, name, update)
+        except StorageConflictError:
+            return False
+        return claimed
+
+    def checkpoint(
+        self, name: str, state: TaskState, **extra: typing.Any
+    ) -> dict[str, typing.Any]:
+        saved: dict[str, typing.Any] = {}
+
+        def update(task: dict[str, typing.Any] | None) -> dict[str, typing.Any]:
+            nonlocal saved
+            saved = task = task or self._new_task()
+            task.update(extra, state=state, updated_at=time.time())
+            # the lease may have expired and been taken by another worker
+            if task["owner"] == self.worker_id:
+                if state in ("saved", "failed"):
+                    task.update(owner=None, expires_at=0)
+                else:
+                    task["expires_at"] = time.time() + self.lease_seconds
+            return task
+
+        self.storage.update_renewal_task(self.run_id, name, update)
+        return saved
+
+    def release(self, name: str) -> None:
+        """Give the task back without spending an attempt."""
+
+        def update(task: dict[str, typing.Any] | None) -> dict[str, typing.Any] | None:
+            # the lease may have expired and been taken by another worker
+            if task is None or task["owner"] != self.worker_id:
+                return None
+            task.update(owner=None, expires_at=0, attempts=max(0, task["attempts"] - 1))
+            return task
+
+        self.storage.update_renewal_task(self.run_id, name, update)
+
+    def status(self) -> dict[str, int]:
+        result: dict[str, int] = {}
+        for name in self.names:
+            state = self._task(name)["state"]
+            result[state] = result.get(state, 0) + 1
+        return result
+
+    def process(
+        self,
+        *,
+        acme_account_email: str,
+        acme_directory_url: str,
+        authenticators: typing.Sequence[AuthenticatorProtocol],
+        should_continue: typing.Callable[[], bool] = lambda: True,
+        names: typing.Iterable[str] | None = None,
+        rate_limiter: RateLimiter | None = None,
+        account_policy: AccountPolicyProtocol | None = None,
+        ca_pool: CAPool | None = None,
+    ) -> dict[str, list[str]]:
+        """Renew claimable certificates until the queue is drained or time is up.
+
+        `names` limits processing to a subset of the run, e.g. one shard.
+        Certificates over the `rate_limiter` budget or renewed by another
+        worker at the same time are left for a later run, certificates saved
+        by another worker in the meantime are done.
+        """
+        from .client import renew  # noqa: PLC0415
+        from .ratelimit import RateLimitExceededError  # noqa: PLC0415
+        from .storage.base import LeaseHeldError, StorageConflictError  # noqa: PLC0415
+
+        result: dict[str, list[str]] = {"saved": [], "failed": [], "skipped": []}
+        for name in self.names if names is None else names:
+            if not should_continue():
+                break
+            if not self.claim(name):
+                continue
+            certificate = self.storage.get_certificate(name=name)
+            if certificate is None:
+                self.checkpoint(name, "saved", skipped="certificate removed")
+                result["skipped"].append(name)
+                continue
+
+            def checkpoint(state: OrderState, name: str = name) -> None:
+                self.checkpoint(name, state)
+
+            try:
+                renew(
+                    certificate=certificate,
+                    storage=self.storage,
+                    acme_account_email=acme_account_email,
+                    acme_directory_url=acme_directory_url,
+                    authenticators=authenticators,
+                    checkpoint=checkpoint,
+                    rate_limiter=rate_limiter,
+                    account_policy=account_policy,
+                    ca_pool=ca_pool,
+                )
+            except (RateLimitExceededError, LeaseHeldError) as exc:
+                logger.warning("[RENEW] %s postponed: %s", name, exc)
+                self.release(name)
+                result["skipped"].append(name)
+            except StorageConflictError as exc:
+                logger.warning("[RENEW] %s dropped: %s", name, exc)
+                self.checkpoint(name, "saved", skipped="superseded")
+                result["skipped"].append(name)
+            except Exception as exc:
+                logger.error("[RENEW] %s failed: %s", name, exc)
+                self.checkpoint(name, "failed", error=str(exc))
+                result["failed"].append(name)
+            else:
+                result["saved"].append(name)
+        return result
@@ -1,25 +1,47 @@
 from __future__ import annotations
 
+import datetime
 import json
 import typing
 
-import josepy.json_util
-import josepy.jwk
-from acme import messages
-
 from . import crypto
 
+if typing.TYPE_CHECKING:
+    import josepy.jwk
+    from acme import messages
+    from cryptography import x509
+
 
 class CertificateNotSetError(Exception):
     pass
 
 
 class Certificate:
-    def __init__(self, domains: typing.Sequence[str], private_key: bytes) -> None:
+    __slots__ = (
+        "_certificate",
+        "_certificate_chain",
+        "_x509",
+        "account_name",
+        "domains",
+        "private_key",
+        "version",
+    )
+
+    def __init__(
+        self,
+        domains: typing.Sequence[str],
+        private_key: bytes,
+        account_name: str | None = None,
+    ) -> None:
         self.domains = list(domains)
         self.private_key = private_key
+        # named ACME account the certificate was issued with, see `accounts`
+        self.account_name = account_name
+        # version of the stored config it was loaded from, see `save_certificate`
+        self.version: str | None = None
         self._certificate: bytes | None = None
         self._certificate_chain: bytes | None = None
+        self._x509: x509.Certificate | None = None
 
     def __repr__(self) -> str:
         return f"Certificate<{self.domains}>"
@@ -57,10 +79,50 @@ class Certificate:
         return True
 
     def set_fullchain(self, fullchain_pem: bytes) -> None:
-        sep = "-----END CERTIFICATE-----\n"
-        part1, part2, chain = fullchain_pem.decode().partition(sep)
-        self._certificate = (part1 + part2).encode()
-        self._certificate_chain = chain.lstrip().encode()
+        sep = b"-----END CERTIFICATE-----\n"
+        end = fullchain_pem.find(sep)
+        end = len(fullchain_pem) if end == -1 else end + len(sep)
+        self._certificate = fullchain_pem[:end]
+        self._certificate_chain = fullchain_pem[end:].lstrip()
+        self._x509 = None
+
+    def set_certificate(self, certificate_pem: bytes, chain_pem: bytes) -> None:
+        """Set the leaf and the chain separately, e.g. a shared chain object."""
+        self._certificate = certificate_pem
+        self._certificate_chain = chain_pem
+        self._x509 = None
+
+    @property
+    def x509(self) -> x509.Certificate:
+        """Leaf certificate, parsed on first access."""
+        if self._x509 is None:
+            self._x509 = crypto.load_certificate(self.certificate)
+        return self._x509
+
+    @property
+    def not_before(self) -> datetime.datetime:
+        return self.x509.not_valid_before_utc
+
+    @property
+    def not_after(self) -> datetime.datetime:
+        return self.x509.not_valid_after_utc
+
+    @property
+    def serial(self) -> int:
+        return self.x509.serial_number
+
+    @property
+    def sans(self) -> list[str]:
+        return crypto.get_dns_names(self.x509)
+
+    @property
+    def fingerprint(self) -> str:
+        """Hex SHA-256 of the DER encoded leaf certificate."""
+        return crypto.get_fingerprint(self.x509)
+
+    @property
+    def issuer(self) -> str:
+        return self.x509.issuer.rfc4514_string()
 
 
 class Account:
@@ -80,6 +142,9 @@ class Account:
 
     @staticmethod
     def json_loads(jstr: str) -> Account:
+        import josepy.jwk  # noqa: PLC0415
+        from acme import messages  # noqa: PLC0415
+
         data = json.loads(jstr)
         key = josepy.jwk.JWKRSA.from_json(data["key"])
         assert isinstance(key, josepy.jwk.JWK)
@@ -0,0 +1,291 @@
+"""Pack many hostnames into few SAN certificates.
+
+`pack` groups hostnames by an affinity key (registered domain by default,
+see `authenticator_affinity` to also split by validating authenticator) and
+fills certificates up to `max_names` SANs. Given the current bundles it keeps
+every hostname where it is, drops removed names and places new ones in
+bundles that change anyway before touching stable ones, so that a change of
+the hostname set reissues as few certificates as possible:
+
+    plan = pack(hostnames, existing=current_bundles(storage))
+    apply(plan, storage=storage, authenticators=..., ...)
+
+`consolidate_wildcards` replaces subdomains of zones served by a DNS-01
+authenticator with a `*.<parent>` wildcard, one name and one validation
+record instead of many. Pass its result as `pack(..., covering=...)`;
+`apply` stores every hostname's certificate, see `find_certificate` and
+`find_certificate_name`.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from .helpers import PUBLIC_SUFFIXES, registered_domain
+
+if typing.TYPE_CHECKING:
+    from .authenticators.base import AuthenticatorProtocol
+    from .models import Certificate
+    from .storage.base import StorageProtocol
+
+MAX_SAN_NAMES = 100
+
+Affinity = typing.Callable[[str], typing.Hashable]
+
+
+class PackingPlan:
+    def __init__(
+        self,
+        bundles: dict[str, list[str]],
+        changed: typing.Iterable[str],
+        removed: typing.Iterable[str],
+        covering: typing.Mapping[str, str] | None = None,
+    ) -> None:
+        # certificate name (its first domain) -> domains
+        self.bundles = bundles
+        # certificates to issue, new or with a different set of names
+        self.changed = sorted(changed)
+        # certificates that are no longer part of the plan
+        self.removed = sorted(removed)
+        # hostname -> wildcard standing for it in `bundles`
+        self.covering = dict(covering or {})
+
+    def __repr__(self) -> str:
+        return (
+            f"PackingPlan<{len(self.bundles)} bundles, {len(self.changed)} changed,"
+            f" {len(self.removed)} removed>"
+        )
+
+    @property
+    def assignments(self) -> dict[str, str]:
+        """Hostname -> name of the certificate covering it."""
+        result = {
+            hostname: name
+            for name, domains in self.bundles.items()
+            for hostname in domains
+        }
+        for hostname, wildcard in self.covering.items():
+            result[hostname] = result[wildcard]
+        return result
+
+
+def authenticator_affinity(
+    authenticators: typing.Sequence[AuthenticatorProtocol],
+) -> Affinity:
+    """Affinity by registered domain and the first authenticator able to validate
+    the name, so a certificate is validated by a single authenticator."""
+    from acme import challenges  # noqa: PLC0415
+
+    token = b"\0" * 16
+    probes = [challenges.HTTP01(token=token), challenges.DNS01(token=token)]
+
+    def affinity(hostname: str) -> typing.Hashable:
+        # wildcards can only be validated with DNS-01
+        candidates = probes[1:] if hostname.startswith("*.") else probes
+        for index, authenticator in enumerate(authenticators):
+            if any(authenticator.is_supported(hostname, c) for c in candidates):
+                return (registered_domain(hostname), index)
+        raise ValueError(f"No authenticator supports {hostname}")
+
+    return affinity
+
+
+def wildcard_parent(hostname: str) -> str | None:
+    """Parent of the `*.<parent>` wildcard that would cover `hostname`."""
+    if hostname.startswith("*."):
+        return None
+    _, _, parent = hostname.rstrip(".").partition(".")
+    if "." not in parent or parent in PUBLIC_SUFFIXES:
+        return None
+    return parent
+
+
+def consolidate_wildcards(
+    hostnames: typing.Iterable[str],
+    authenticators: typing.Sequence[AuthenticatorProtocol],
+    existing: typing.Mapping[str, typing.Sequence[str]] | None = None,
+    min_names: int = 2,
+) -> dict[str, str]:
+    """Hostname -> wildcard that should cover it.
+
+    Subdomains sharing a parent are consolidated once `min_names` of them are
+    requested and a DNS-01 authenticator supports the wildcard, or as soon as
+    the wildcard is requested or already part of an `existing` certificate.
+    """
+    from acme import challenges  # noqa: PLC0415
+
+    chall = challenges.DNS01(token=b"\0" * 16)
+    hostnames = list(hostnames)
+    present = {d for d in hostnames if d.startswith("*.")}
+    present.update(
+        d
+        for domains in (existing or {}).values()
+        for d in domains
+        if d.startswith("*.")
+    )
+    children: dict[str, list[str]] = {}
+    for hostname in hostnames:
+        parent = wildcard_parent(hostname)
+        if parent is not None:
+            children.setdefault(f"*.{parent}", []).append(hostname)
+    result = {}
+    for wildcard, names in children.items():
+        if wildcard not in present and len(names) < min_names:
+            continue
+        if any(a.is_supported(wildcard, chall) for a in authenticators):
+            result.update(dict.fromkeys(names, wildcard))
+    return result
+
+
+def _carry_over(
+    existing: typing.Mapping[str, typing.Sequence[str]],
+    wanted: set[str],
+    bundles: dict[str, list[str]],
+    changed: set[str],
+) -> set[str]:
+    """Keep the still wanted names of existing bundles, return removed bundles."""
+    removed = set()
+    placed: set[str] = set()
+    for name, domains in sorted(existing.items()):
+        kept = [d for d in domains if d in wanted and d not in placed]
+        placed.update(kept)
+        if kept and kept[0] == name:
+            bundles[name] = kept
+            if len(kept) != len(domains):
+                changed.add(name)
+        else:
+            # the certificate name is its first domain, it can't be kept
+            removed.add(name)
+            if kept:
+                bundles[kept[0]] = kept
+                changed.add(kept[0])
+    return removed
+
+
+def _place(
+    pending: list[str],
+    candidates: typing.Sequence[str],
+    bundles: dict[str, list[str]],
+    changed: set[str],
+    max_names: int,
+) -> None:
+    # bundles that are reissued anyway take new names first
+    for name in candidates:
+        room = max_names - len(bundles[name])
+        if name in changed and room > 0:
+            bundles[name].extend(pending[:room])
+            pending = pending[room:]
+    while len(pending) >= max_names:
+        bundles[pending[0]] = pending[:max_names]
+        changed.add(pending[0])
+        pending = pending[max_names:]
+    if not pending:
+        return
+    # the rest goes to the stable bundle it fits best, a single reissue
+    fits = [
+        name
+        for name in candidates
+        if name not in changed and max_names - len(bundles[name]) >= len(pending)
+    ]
+    if fits:
+        name = min(fits, key=lambda n: max_names - len(bundles[n]))
+        bundles[name].extend(pending)
+        changed.add(name)
+    else:
+        bundles[pending[0]] = pending
+        changed.add(pending[0])
+
+
+def pack(
+    hostnames: typing.Iterable[str],
+    existing: typing.Mapping[str, typing.Sequence[str]] | None = None,
+    max_names: int = MAX_SAN_NAMES,
+    affinity: Affinity = registered_domain,
+    covering: typing.Mapping[str, str] | None = None,
+) -> PackingPlan:
+    """Assign `hostnames` to certificates of at most `max_names` names.
+
+    `existing` maps certificate names to their current domains, e.g. from
+    `current_bundles`. Hostnames of different affinity never share a certificate.
+    Hostnames in `covering` are replaced by the wildcard they map to.
+    """
+    hostnames = set(hostnames)
+    covering = {h: w for h, w in (covering or {}).items() if h in hostnames}
+    wanted = {covering.get(hostname, hostname) for hostname in hostnames}
+    bundles: dict[str, list[str]] = {}
+    changed: set[str] = set()
+    removed = _carry_over(existing or {}, wanted, bundles, changed)
+
+    placed = {d for domains in bundles.values() for d in domains}
+    groups: dict[typing.Hashable, list[str]] = {}
+    for hostname in sorted(wanted - placed):
+        groups.setdefault(affinity(hostname), []).append(hostname)
+    by_affinity: dict[typing.Hashable, list[str]] = {}
+    for name in bundles:
+        by_affinity.setdefault(affinity(name), []).append(name)
+    for key, pending in groups.items():
+        _place(pending, by_affinity.get(key, []), bundles, changed, max_names)
+
+    return PackingPlan(bundles, changed, removed - set(bundles), covering)
+
+
+def current_bundles(storage: StorageProtocol) -> dict[str, list[str]]:
+    """Domains of every stored certificate."""
+    result = {}
+    for name, _ in storage.list_certificates():
+        # the config is enough, keys and certificates aren't read
+        domains = storage.get_certificate_domains(name)
+        if domains is not None:
+            result[name] = domains
+    return result
+
+
+def apply(
+    plan: PackingPlan,
+    *,
+    storage: StorageProtocol,
+    acme_account_email: str,
+    acme_directory_url: str,
+    authenticators: typing.Sequence[AuthenticatorProtocol],
+    **kwargs: typing.Any,
+) -> None:
+    """Issue changed bundles, record the certificate of every hostname, then
+    remove certificates dropped from the plan.
+
+    Removed certificates are deleted from storage, not revoked. Extra keyword
+    arguments are passed to `client.issue`.
+    """
+    from .client import issue  # noqa: PLC0415
+
+    for name in plan.changed:
+        issue(
+            domains=plan.bundles[name],
+            storage=storage,
+            acme_account_email=acme_account_email,
+            acme_directory_url=acme_directory_url,
+            authenticators=authenticators,
+            **kwargs,
+        )
+    storage.set_hostnames(plan.assignments)
+    for name in plan.removed:
+        # observers are handed the complete certificate being removed
+        certificate = storage.get_certificate(name=name)
+        if certificate is not None:
+            storage.remove_certificate(certificate)
+
+
+def find_certificate_name(storage: StorageProtocol, hostname: str) -> str | None:
+    """Name of the certificate covering `hostname`, reads only its config."""
+    name = storage.get_hostnames().get(hostname, hostname)
+    if storage.get_certificate_domains(name) is None:
+        return None
+    return name
+
+
+def find_certificate(storage: StorageProtocol, hostname: str) -> Certificate | None:
+    """Certificate covering `hostname`, recorded by `apply` or named after it.
+
+    Loads the private key, use `find_certificate_name` when the name is enough.
+    """
+    name = storage.get_hostnames().get(hostname, hostname)
+    return storage.get_certificate(name=name)
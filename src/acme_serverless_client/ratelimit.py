@@ -0,0 +1,317 @@
+"""Client side budgets for CA rate limits.
+
+Budgets are token buckets keyed by endpoint (`endpoint:new_order`), registered
+domain (`domain:example.com`) and hostname for failed validations
+(`failed:www.example.com`). The defaults follow Let's Encrypt production limits,
+https://letsencrypt.org/docs/rate-limits/. When a storage is given, bucket
+state and `Retry-After` blocks are kept in `ratelimits.json` so concurrent
+workers spend the same budget, updates are compare-and-swap writes retried
+on concurrent changes. Renewals are exempt from the registered domain budget.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import email.utils
+import random
+import threading
+import time
+import typing
+
+from .helpers import registered_domain
+from .instrumentation import count, span
+
+if typing.TYPE_CHECKING:
+    from .storage.base import BaseStorage
+
+T = typing.TypeVar("T")
+
+HOUR = 3600.0
+WEEK = 7 * 24 * HOUR
+
+# budget name -> (capacity, refill period in seconds)
+LETSENCRYPT_LIMITS: dict[str, tuple[float, float]] = {
+    "endpoint:new_order": (300, 3 * HOUR),
+    "endpoint:new_account": (10, 3 * HOUR),
+    "domain": (50, WEEK),
+    "failed": (5, HOUR),
+}
+
+
+class RateLimitExceededError(Exception):
+    def __init__(self, budget: str, wait: float) -> None:
+        super().__init__(f"Rate limit {budget} exhausted, next slot in {wait:.0f}s")
+        self.budget = budget
+        self.wait = wait
+
+
+class TokenBucket:
+    def __init__(
+        self, capacity: float, period: float, tokens: float | None = None, at: float = 0
+    ) -> None:
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity if tokens is None else tokens
+        self.at = at
+
+    def refill(self, now: float) -> None:
+        if now > self.at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.at) * self.rate)
+            self.at = now
+
+    def wait_time(self, now: float, amount: float = 1) -> float:
+        self.refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, now: float, amount: float = 1) -> None:
+        self.refill(now)
+        self.tokens -= amount
+
+
+def parse_retry_after(value: str | None, now: float | None = None) -> float | None:
+    """Seconds to wait from a `Retry-After` header, delta-seconds or HTTP date."""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        storage: BaseStorage | None = None,
+        limits: typing.Mapping[str, tuple[float, float]] | None = None,
+        max_wait: float = 60.0,
+        clock: typing.Callable[[], float] = time.time,
+        sleep: typing.Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.storage = storage
+        self.limits = {**LETSENCRYPT_LIMITS, **(limits or {})}
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets: dict[str, TokenBucket] = {}
+        self._blocked_until: dict[str, float] = {}
+        # buckets are shared by the threads of the limiter, a transaction
+        # holds the lock from restoring the state to saving it
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _limit(self, budget: str) -> tuple[float, float] | None:
+        # `endpoint:new_order@account` is limited like `endpoint:new_order`
+        budget = budget.partition("@")[0]
+        return self.limits.get(budget) or self.limits.get(budget.partition(":")[0])
+
+    def _bucket(self, budget: str) -> TokenBucket | None:
+        if budget not in self._buckets:
+            limit = self._limit(budget)
+            if limit is None:
+                return None
+            self._buckets[budget] = TokenBucket(*limit, at=self.clock())
+        return self._buckets[budget]
+
+    def _restore(self, state: typing.Mapping[str, typing.Any]) -> None:
+        self._blocked_until = dict(state.get("blocked_until", {}))
+        self._buckets = {}
+        for budget, (tokens, at) in state.get("buckets", {}).items():
+            limit = self._limit(budget)
+            if limit is not None:
+                self._buckets[budget] = TokenBucket(*limit, tokens=tokens, at=at)
+
+    def _dump(self) -> dict[str, typing.Any]:
+        now = self.clock()
+        buckets = {}
+        for budget, bucket in self._buckets.items():
+            bucket.refill(now)
+            # full buckets carry no information
+            if bucket.tokens < bucket.capacity:
+                buckets[budget] = (bucket.tokens, bucket.at)
+        return {
+            "buckets": buckets,
+            "blocked_until": {k: v for k, v in self._blocked_until.items() if v > now},
+        }
+
+    def _transaction(self, operation: typing.Callable[[], tuple[T, bool]]) -> T:
+        """Run `operation` on the stored state, saving it when it reports a
+        change. It runs again from fresh state after a concurrent update."""
+        from .storage.base import StorageConflictError  # noqa: PLC0415
+
+        if self.storage is None:
+            with self._lock:
+                return operation()[0]
+        results: list[T] = []
+
+        def update(state: dict[str, typing.Any] | None) -> dict[str, typing.Any] | None:
+            self._restore(state or {})
+            result, changed = operation()
+            results[:] = [result]
+            return self._dump() if changed else None
+
+        deadline = self.clock() + self.max_wait
+        attempt = 0
+        while True:
+            try:
+                with self._lock:
+                    self.storage.update_rate_limits(update)
+                    return results[0]
+            except StorageConflictError:
+                # heavy contention, back off with jitter before the next round
+                delay = random.uniform(0, min(5.0, 0.1 * 2**attempt))
+                if self.clock() + delay > deadline:
+                    raise
+                count("ratelimit.conflict")
+                self.sleep(delay)
+                attempt += 1
+
+    def budgets(
+        self,
+        endpoint: str,
+        domains: typing.Iterable[str] = (),
+        *,
+        renewal: bool = False,
+    ) -> list[str]:
+        result = [f"endpoint:{endpoint}"]
+        # renewals are exempt from the certificates per registered domain limit
+        if not renewal:
+            result.extend(sorted({f"domain:{registered_domain(d)}" for d in domains}))
+        return result
+
+    def _wait_time(
+        self,
+        endpoint: str,
+        domains: typing.Sequence[str],
+        now: float,
+        *,
+        renewal: bool,
+    ) -> tuple[str, float]:
+        waits = [
+            (budget, self._blocked_until.get(budget, 0) - now)
+            for budget in self.budgets(endpoint)
+        ]
+        for budget in self.budgets(endpoint, domains, renewal=renewal):
+            bucket = self._bucket(budget)
+            if bucket is not None:
+                waits.append((budget, bucket.wait_time(now)))
+        for domain in domains:
+            bucket = self._bucket(f"failed:{domain}")
+            if bucket is not None:
+                waits.append((f"failed:{domain}", bucket.wait_time(now)))
+        return max(waits, key=lambda item: item[1])
+
+    def acquire(
+        self,
+        endpoint: str,
+        domains: typing.Sequence[str] = (),
+        *,
+        renewal: bool = False,
+    ) -> None:
+        """Take one token from every budget of the request, waiting up to `max_wait`.
+
+        Renewals don't spend the registered domain budget.
+        """
+        self._local.throttled = None
+        deadline = self.clock() + self.max_wait
+
+        def take() -> tuple[tuple[str, float], bool]:
+            now = self.clock()
+            budget, wait = self._wait_time(endpoint, domains, now, renewal=renewal)
+            if wait > 0:
+                return (budget, wait), False
+            for name in self.budgets(endpoint, domains, renewal=renewal):
+                bucket = self._bucket(name)
+                if bucket is not None:
+                    bucket.take(now)
+            return (budget, wait), True
+
+        with span("ratelimit.acquire", endpoint=endpoint):
+            while True:
+                budget, wait = self._transaction(take)
+                if wait <= 0:
+                    return
+                if self.clock() + wait > deadline:
+                    count("ratelimit.exceeded", budget=budget)
+                    raise RateLimitExceededError(budget, wait)
+                count("ratelimit.wait", budget=budget)
+                self.sleep(wait)
+
+    def block(self, endpoint: str, retry_after: float | None) -> None:
+        """Stop using the endpoint after a 429/503 answer from the CA."""
+        budget = f"endpoint:{endpoint}"
+
+        def extend() -> tuple[None, bool]:
+            until = self.clock() + (retry_after if retry_after is not None else HOUR)
+            self._blocked_until[budget] = max(self._blocked_until.get(budget, 0), until)
+            return None, True
+
+        self._transaction(extend)
+
+    def response_hook(
+        self, response: typing.Any, *args: typing.Any, **kwargs: typing.Any
+    ) -> typing.Any:
+        """`requests` response hook remembering `Retry-After` of throttled calls."""
+        if response.status_code in (429, 503):
+            self._local.throttled = (
+                parse_retry_after(response.headers.get("Retry-After")),
+            )
+        return response
+
+    def watch(self, session: typing.Any) -> None:
+        """Install the response hook of `watching` limiters on the session.
+
+        Sessions are shared by clients (see `transport`), a single hook
+        dispatches to the limiter watching the current thread.
+        """
+        hooks = session.hooks.setdefault("response", [])
+        if _response_hook not in hooks:
+            hooks.append(_response_hook)
+
+    @contextlib.contextmanager
+    def watching(self) -> typing.Iterator[None]:
+        """Route throttled responses of the current thread to this limiter."""
+        previous = getattr(_watching, "limiter", None)
+        _watching.limiter = self
+        try:
+            yield
+        finally:
+            _watching.limiter = previous
+
+    def penalize(self, endpoint: str, exc: Exception) -> None:
+        """Block the endpoint if `exc` was caused by CA throttling."""
+        throttled = getattr(self._local, "throttled", None)
+        self._local.throttled = None
+        if throttled is not None:
+            self.block(endpoint, throttled[0])
+        elif getattr(exc, "code", None) == "rateLimited":
+            self.block(endpoint, None)
+
+    def record_failed_validation(self, domains: typing.Iterable[str]) -> None:
+        domains = list(domains)
+
+        def take() -> tuple[None, bool]:
+            now = self.clock()
+            for domain in domains:
+                bucket = self._bucket(f"failed:{domain}")
+                if bucket is not None:
+                    bucket.take(now)
+            return None, True
+
+        self._transaction(take)
+
+
+_watching = threading.local()
+
+
+def _response_hook(
+    response: typing.Any, *args: typing.Any, **kwargs: typing.Any
+) -> typing.Any:
+    limiter = getattr(_watching, "limiter", None)
+    if limiter is not None:
+        limiter.response_hook(response)
+    return response
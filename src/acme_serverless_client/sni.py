@@ -0,0 +1,239 @@
+"""Hostname -> certificate lookup for SNI serving.
+
+`SNIIndex` maps every stored domain to the certificate covering it. A host
+matches its exact name first, then a `*.<parent>` wildcard (one label only).
+Keys are stored with reversed labels (`com.example.www`, `com.example.*`) so
+that names of a zone sort together. `dump` writes a sorted, memory-mappable
+file that `MappedSNIIndex` searches without loading it:
+
+    header   b"SNIX", version u16, count u32
+    offsets  count x u32, offset of each record, sorted by key
+    records  key b"\\0" certificate name b"\\0"
+
+Keep the index current with the storage observer:
+
+    index = SNIIndex.build(storage)
+    observer = SNIIndexObserver(index, path="/mnt/sni.idx")
+    storage.subscribe(observer)
+    ...
+    observer.flush()
+
+or, in another process, from the storage change log:
+
+    cursor = index.sync(storage, cursor)
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+import typing
+
+from .storage.base import StorageObserverProtocol
+
+if typing.TYPE_CHECKING:
+    from .models import Certificate
+    from .storage.base import StorageProtocol
+
+MAGIC = b"SNIX"
+VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_OFFSET = struct.Struct("<I")
+
+
+def index_key(domain: str) -> str:
+    return ".".join(reversed(domain.lower().rstrip(".").split(".")))
+
+
+def lookup_keys(hostname: str) -> tuple[str, str | None]:
+    """Exact and wildcard keys matching `hostname`, in priority order."""
+    key = index_key(hostname)
+    parent, sep, _ = key.rpartition(".")
+    return key, f"{parent}.*" if sep else None
+
+
+class SNIIndex:
+    def __init__(self) -> None:
+        # key -> certificate names covering it, the last saved wins
+        self._entries: dict[str, list[str]] = {}
+        # certificate name -> its keys
+        self._keys: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @classmethod
+    def build(cls, storage: StorageProtocol) -> SNIIndex:
+        """Index of all stored certificates, from their configs."""
+        index = cls()
+        for name, _ in storage.list_certificates():
+            domains = storage.get_certificate_domains(name)
+            if domains:
+                index.add(name, domains)
+        return index
+
+    def add(self, name: str, domains: typing.Iterable[str]) -> None:
+        with self._lock:
+            self._discard(name)
+            self._keys[name] = [index_key(domain) for domain in domains]
+            for key in self._keys[name]:
+                self._entries.setdefault(key, []).append(name)
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            self._discard(name)
+
+    def _discard(self, name: str) -> None:
+        for key in self._keys.pop(name, []):
+            self._entries[key].remove(name)
+            if not self._entries[key]:
+                del self._entries[key]
+
+    def sync(self, storage: StorageProtocol, cursor: int) -> int:
+        """Apply the storage change log after `cursor`, return the new cursor."""
+        while changes := storage.changes_since(cursor):
+            for change in changes:
+                if change["event"] == "save_certificate":
+                    self.add(change["name"], change["domains"])
+                else:
+                    self.discard(change["name"])
+            cursor = changes[-1]["seq"]
+        return cursor
+
+    def lookup(self, hostname: str) -> str | None:
+        """Name of the certificate covering `hostname`."""
+        for key in lookup_keys(hostname):
+            names = self._entries.get(key) if key else None
+            if names:
+                return names[-1]
+        return None
+
+    def dumps(self) -> bytes:
+        with self._lock:
+            records = [
+                key.encode() + b"\0" + names[-1].encode() + b"\0"
+                for key, names in sorted(self._entries.items())
+            ]
+        offset = _HEADER.size + _OFFSET.size * len(records)
+        offsets = []
+        for record in records:
+            offsets.append(_OFFSET.pack(offset))
+            offset += len(record)
+        return b"".join(
+            [_HEADER.pack(MAGIC, VERSION, len(records)), *offsets, *records]
+        )
+
+    def dump(self, path: str) -> None:
+        """Write the index file atomically, open readers keep the old one."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.dumps())
+        os.replace(tmp, path)
+
+
+class MappedSNIIndex:
+    """Read only index file, looked up with a binary search over the mapping."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._map)
+        self._count: int = count
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise RuntimeError(f"Unsupported SNI index file: {path}")
+
+    def __enter__(self) -> MappedSNIIndex:
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _record(self, position: int) -> tuple[bytes, int]:
+        (offset,) = _OFFSET.unpack_from(
+            self._map, _HEADER.size + _OFFSET.size * position
+        )
+        end = self._map.find(b"\0", offset)
+        return self._map[offset:end], end + 1
+
+    def _find(self, key: bytes) -> str | None:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            current, value = self._record(middle)
+            if current == key:
+                return self._map[value : self._map.find(b"\0", value)].decode()
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def lookup(self, hostname: str) -> str | None:
+        """Name of the certificate covering `hostname`."""
+        for key in lookup_keys(hostname):
+            name = self._find(key.encode()) if key else None
+            if name is not None:
+                return name
+        return None
+
+
+class SNIIndexObserver(StorageObserverProtocol):
+    """Updates the index on storage events, rewriting `path` if given.
+
+    The file is rewritten at most once per `interval` seconds so a bulk
+    renewal doesn't rewrite it for every certificate, `flush` writes the
+    pending changes, call it when the batch is done.
+    """
+
+    def __init__(
+        self,
+        index: SNIIndex,
+        path: str | None = None,
+        *,
+        interval: float = 1.0,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.index = index
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self._dirty = False
+        self._dumped_at: float | None = None
+        self._lock = threading.Lock()
+
+    def _changed(self) -> None:
+        with self._lock:
+            self._dirty = True
+            if self._dumped_at is None or (
+                self.clock() - self._dumped_at >= self.interval
+            ):
+                self._dump()
+
+    def _dump(self) -> None:
+        if self.path and self._dirty:
+            self.index.dump(self.path)
+            self._dumped_at = self.clock()
+        self._dirty = False
+
+    def flush(self) -> None:
+        with self._lock:
+            self._dump()
+
+    def save_certificate(self, certificate: Certificate) -> None:
+        self.index.add(certificate.name, certificate.domains)
+        self._changed()
+
+    def remove_certificate(self, certificate: Certificate) -> None:
+        self.index.discard(certificate.name)
+        self._changed()
@@ -1,13 +1,26 @@
 from __future__ import annotations
 
+import concurrent.futures
 import datetime
+import functools
 import io
+import logging
+import queue
+import random
+import threading
+import time
 import typing
 
 import botocore.exceptions
 
+from ..instrumentation import count, span
 from ..models import Certificate
-from .base import BaseStorage, StorageObserverProtocol
+from ..ratelimit import TokenBucket
+from .base import BaseStorage, StorageConflictError, StorageObserverProtocol
+
+logger = logging.getLogger(__name__)
+
+T = typing.TypeVar("T")
 
 
 class S3Storage(BaseStorage):
@@ -19,6 +32,42 @@ class S3Storage(BaseStorage):
         def put(self, key: str, data: bytes) -> None:
             self.client.upload_fileobj(io.BytesIO(data), self.name, key)
 
+        def put_with_etag(self, key: str, data: bytes) -> str:
+            response = self.client.put_object(Bucket=self.name, Key=key, Body=data)
+            etag: str = response["ETag"]
+            return etag
+
+        def put_if(
+            self,
+            key: str,
+            data: bytes,
+            *,
+            if_none_match: bool = False,
+            if_match: str | None = None,
+        ) -> str | None:
+            """Conditional PUT returning the ETag, None if the precondition failed."""
+            params: dict[str, typing.Any] = {}
+            if if_none_match:
+                params["IfNoneMatch"] = "*"
+            if if_match is not None:
+                params["IfMatch"] = if_match
+            try:
+                response = self.client.put_object(
+                    Bucket=self.name, Key=key, Body=data, **params
+                )
+            except botocore.exceptions.ClientError as exc:
+                # 409 when a concurrent conditional write is in progress,
+                # 404 on If-Match of a deleted object
+                if exc.response.get("Error", {}).get("Code") in (
+                    "PreconditionFailed",
+                    "ConditionalRequestConflict",
+                    "NoSuchKey",
+                ):
+                    return None
+                raise exc
+            etag: str = response["ETag"]
+            return etag
+
         def get(self, key: str) -> bytes | None:
             obj = io.BytesIO()
             try:
@@ -30,16 +79,42 @@ class S3Storage(BaseStorage):
             obj.seek(0)
             return obj.read()
 
+        def get_with_etag(self, key: str) -> tuple[bytes | None, str | None]:
+            try:
+                response = self.client.get_object(Bucket=self.name, Key=key)
+            except botocore.exceptions.ClientError as exc:
+                if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                    return None, None
+                raise exc
+            return response["Body"].read(), response["ETag"]
+
+        def etag(self, key: str) -> str | None:
+            try:
+                response = self.client.head_object(Bucket=self.name, Key=key)
+            except botocore.exceptions.ClientError as exc:
+                if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                    return None
+                raise exc
+            etag: str = response["ETag"]
+            return etag
+
         def list(
             self, **kwargs: typing.Any
         ) -> typing.Iterator[typing.Mapping[str, typing.Any]]:
+            for page in self.pages(**kwargs):
+                yield from page
+
+        def pages(
+            self, **kwargs: typing.Any
+        ) -> typing.Iterator[typing.Sequence[typing.Mapping[str, typing.Any]]]:
             params = {
                 **kwargs,
                 "Bucket": self.name,
             }
             while True:
                 response = self.client.list_objects_v2(**params)
-                yield from response["Contents"]
+                # Contents is missing when nothing matches the prefix
+                yield response.get("Contents", [])
                 if not response["IsTruncated"]:
                     break
                 params["ContinuationToken"] = response["NextContinuationToken"]
@@ -47,8 +122,37 @@ class S3Storage(BaseStorage):
         def delete(self, key: str) -> None:
             self.client.delete_object(Bucket=self.name, Key=key)
 
-    def __init__(self, bucket: Bucket, *args: typing.Any, **kwargs: typing.Any) -> None:
+        def delete_many(self, keys: typing.Sequence[str]) -> None:
+            """DeleteObjects in batches of 1000 keys, the API limit."""
+            for start in range(0, len(keys), 1000):
+                response = self.client.delete_objects(
+                    Bucket=self.name,
+                    Delete={
+                        "Objects": [{"Key": key} for key in keys[start : start + 1000]],
+                        "Quiet": True,
+                    },
+                )
+                if response.get("Errors"):
+                    failed = ", ".join(e["Key"] for e in response["Errors"])
+                    raise RuntimeError(f"Failed to delete {failed}")
+
+    # Split points of the certificates/ key space for sharded listing,
+    # shard N lists keys after boundary N-1 up to and including boundary N.
+    DOMAIN_SHARD_BOUNDARIES = tuple("0123456789abcdefghijklmnopqrstuvwxyz")
+
+    def __init__(
+        self,
+        bucket: Bucket,
+        *args: typing.Any,
+        list_shard_boundaries: typing.Sequence[str] | None = None,
+        list_concurrency: int = 8,
+        list_page_size: int = 1000,
+        **kwargs: typing.Any,
+    ) -> None:
         self.bucket = bucket
+        self.list_shard_boundaries = list_shard_boundaries
+        self.list_concurrency = list_concurrency
+        self.list_page_size = list_page_size
         super().__init__(*args, **kwargs)
 
     def _get(self, key: str) -> bytes | None:
@@ -57,43 +161,188 @@ class S3Storage(BaseStorage):
     def _set(self, key: str, data: bytes) -> None:
         self.bucket.put(key, data)
 
+    def _set_with_version(self, name: str, data: bytes) -> str | None:
+        return self.bucket.put_with_etag(name, data)
+
     def _del(self, name: str) -> None:
         self.bucket.delete(name)
 
+    def _del_many(self, names: typing.Sequence[str]) -> None:
+        self.bucket.delete_many(names)
+
+    def _get_version(self, name: str) -> str | None:
+        return self.bucket.etag(name)
+
+    def _create(self, name: str, data: bytes) -> bool:
+        return self.bucket.put_if(name, data, if_none_match=True) is not None
+
+    def _replace(self, name: str, data: bytes, version: str | None) -> bool:
+        return self._replace_with_version(name, data, version)[0]
+
+    def _replace_with_version(
+        self, name: str, data: bytes, version: str | None
+    ) -> tuple[bool, str | None]:
+        if version is None:
+            etag = self.bucket.put_if(name, data, if_none_match=True)
+        else:
+            etag = self.bucket.put_if(name, data, if_match=version)
+        return etag is not None, etag
+
+    def _get_with_version(self, name: str) -> tuple[bytes | None, str | None]:
+        return self.bucket.get_with_etag(name)
+
     def list_certificates(
         self,
     ) -> typing.Iterator[tuple[str, datetime.datetime]]:
-        for obj in self.bucket.list(Prefix=self.certificate_prefix):
-            domain_name = obj["Key"].rsplit("/", 1)[-1]
-            valid_after = obj["LastModified"]
-            yield (domain_name, valid_after)
+        if self.list_shard_boundaries:
+            pages = self._list_sharded(self.list_shard_boundaries)
+        else:
+            pages = self.bucket.pages(
+                Prefix=self.certificate_prefix, MaxKeys=self.list_page_size
+            )
+        for page in pages:
+            for obj in page:
+                domain_name = obj["Key"].rsplit("/", 1)[-1]
+                valid_after = obj["LastModified"]
+                yield (domain_name, valid_after)
+
+    def _list_shard(
+        self, start_after: str | None, end: str | None
+    ) -> typing.Iterator[typing.Sequence[typing.Mapping[str, typing.Any]]]:
+        params: dict[str, typing.Any] = {
+            "Prefix": self.certificate_prefix,
+            "MaxKeys": self.list_page_size,
+        }
+        if start_after is not None:
+            params["StartAfter"] = start_after
+        for page in self.bucket.pages(**params):
+            if end is not None and page and page[-1]["Key"] > end:
+                yield [obj for obj in page if obj["Key"] <= end]
+                return
+            yield page
+
+    def _list_sharded(
+        self, boundaries: typing.Sequence[str]
+    ) -> typing.Iterator[typing.Sequence[typing.Mapping[str, typing.Any]]]:
+        keys = sorted({f"{self.certificate_prefix}{b}" for b in boundaries})
+        ranges = zip([None, *keys], [*keys, None], strict=True)
+        return iter(
+            _ConcurrentMerge(
+                [
+                    functools.partial(self._list_shard, start_after, end)
+                    for start_after, end in ranges
+                ],
+                self.list_concurrency,
+            )
+        )
 
     def set_validation(self, key: str, value: bytes) -> None:
         if key.startswith("/"):
             key = key.lstrip("/")
-        self._set(key, value)
+        self._write(key, value)
 
     def del_validation(self, key: str) -> None:
-        self._del(key)
+        self._delete(key)
+
+
+class _ConcurrentMerge(typing.Generic[T]):
+    """Consume `sources` in a thread pool and yield items as they arrive."""
+
+    _done = object()
+
+    def __init__(
+        self,
+        sources: typing.Sequence[typing.Callable[[], typing.Iterable[T]]],
+        concurrency: int,
+    ) -> None:
+        self.sources = sources
+        self.concurrency = concurrency
+        self._items: queue.Queue[typing.Any] = queue.Queue(maxsize=concurrency * 2)
+        self._stop = threading.Event()
+
+    def _put(self, item: typing.Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _consume(self, source: typing.Callable[[], typing.Iterable[T]]) -> None:
+        try:
+            for item in source():
+                if not self._put(item):
+                    return
+        except Exception as exc:
+            self._put(exc)
+        finally:
+            self._put(self._done)
+
+    def __iter__(self) -> typing.Iterator[T]:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            for source in self.sources:
+                executor.submit(self._consume, source)
+            pending = len(self.sources)
+            while pending:
+                item = self._items.get()
+                if item is self._done:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            # also reached when the consumer stops iterating early
+            self._stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
 
 
 class ACMStorageObserver(StorageObserverProtocol):
+    """Imports saved certificates into ACM and deletes removed ones.
+
+    Calls are paced by a token bucket (`imports_per_second`, bursts of
+    `import_burst`) shared by all threads and retried on throttling with
+    jittered exponential backoff. With `concurrency` imports run in a thread
+    pool and `save_certificate` returns at once, call `flush` before the
+    process exits. With `storage` an import that still fails is queued in
+    `queues/<queue>.json` instead of failing the save, `retry_queued` imports
+    the queued certificates again.
+    """
+
     ACM_TAG = "acme-serverless-client"
+    RETRYABLE_ERRORS = (
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "RequestLimitExceeded",
+        "ServiceUnavailable",
+        "InternalFailure",
+    )
+    # ImportCertificate has a low account wide rate quota
+    imports_per_second = 1.0
+    import_burst = 5
+    max_attempts = 5
+    retry_backoff = 1.0
 
     class ARNResolver:
         def __init__(self, client: typing.Any):
             self.client = client
             self._store: typing.MutableMapping[str, str] | None = None
+            # observers may be notified from several threads, see `remove_certificates`
+            self._lock = threading.Lock()
+
+        def _get_store(self) -> typing.MutableMapping[str, str]:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._fetch_acm_certificates()
+                return self._store
 
         def get(self, domain_name: str) -> str | None:
-            if self._store is None:
-                self._store = self._fetch_acm_certificates()
-            return self._store.get(domain_name)
+            return self._get_store().get(domain_name)
 
         def set(self, domain_name: str, acm_arn: str) -> None:
-            if self._store is None:
-                self._store = self._fetch_acm_certificates()
-            self._store[domain_name] = acm_arn
+            self._get_store()[domain_name] = acm_arn
 
         def _fetch_acm_certificates(self) -> typing.MutableMapping[str, str]:
             params: typing.MutableMapping[str, str] = {}
@@ -107,12 +356,65 @@ class ACMStorageObserver(StorageObserverProtocol):
                 params["NextToken"] = resp["NextToken"]
 
     def __init__(
-        self, acm: typing.Any, *args: typing.Any, **kwargs: typing.Any
+        self,
+        acm: typing.Any,
+        *args: typing.Any,
+        storage: BaseStorage | None = None,
+        concurrency: int = 0,
+        queue: str = "acm",
+        arn_resolver: ACMStorageObserver.ARNResolver | None = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], None] = time.sleep,
+        **kwargs: typing.Any,
     ) -> None:
         self.acm = acm
-        self._acm_arn_resolver = ACMStorageObserver.ARNResolver(client=acm)
+        self.storage = storage
+        self.queue = queue
+        self.clock = clock
+        self.sleep = sleep
+        self._acm_arn_resolver = arn_resolver or ACMStorageObserver.ARNResolver(
+            client=acm
+        )
+        self._bucket = TokenBucket(
+            self.import_burst, self.import_burst / self.imports_per_second, at=clock()
+        )
+        self._lock = threading.Lock()
+        # queue updates do storage I/O, they must not hold up `_pace`
+        self._queue_lock = threading.Lock()
+        self._executor = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+            if concurrency
+            else None
+        )
+        self._pending: set[concurrent.futures.Future[None]] = set()
 
-    def save_certificate(self, certificate: Certificate) -> None:
+    def _pace(self) -> None:
+        with self._lock:
+            now = self.clock()
+            wait = self._bucket.wait_time(now)
+            # reserve the token, later callers wait behind us
+            self._bucket.take(now)
+        if wait:
+            count("acm.paced")
+            self.sleep(wait)
+
+    def _call(self, method: typing.Callable[..., T], **kwargs: typing.Any) -> T:
+        for attempt in range(self.max_attempts):
+            self._pace()
+            try:
+                return method(**kwargs)
+            except botocore.exceptions.ClientError as exc:
+                code = exc.response.get("Error", {}).get("Code")
+                if (
+                    code not in self.RETRYABLE_ERRORS
+                    or attempt + 1 == self.max_attempts
+                ):
+                    raise
+                count("acm.throttled", code=code)
+                self.sleep(random.uniform(0, self.retry_backoff * 2**attempt))
+        raise AssertionError("unreachable")
+
+    def _import(self, certificate: Certificate) -> None:
         kwargs = {
             "Certificate": certificate.certificate,
             "PrivateKey": certificate.private_key,
@@ -123,10 +425,90 @@ class ACMStorageObserver(StorageObserverProtocol):
         if acm_arn:
             kwargs["CertificateArn"] = acm_arn
             del kwargs["Tags"]
-        response = self.acm.import_certificate(**kwargs)
+        with span("acm.import_certificate"):
+            response = self._call(self.acm.import_certificate, **kwargs)
         if not acm_arn:
             self._acm_arn_resolver.set(certificate.name, response["CertificateArn"])
 
+    def _is_transient(self, exc: Exception) -> bool:
+        if isinstance(exc, botocore.exceptions.ClientError):
+            return exc.response.get("Error", {}).get("Code") in self.RETRYABLE_ERRORS
+        return isinstance(
+            exc,
+            (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError),
+        )
+
+    def _sync(self, certificate: Certificate) -> None:
+        try:
+            self._import(certificate)
+        except Exception as exc:
+            # a rejected certificate would fail again on every retry
+            if self.storage is None or not self._is_transient(exc):
+                raise
+            logger.warning("[ACM] import of %s queued: %s", certificate.name, exc)
+            self._enqueue(certificate.name, exc)
+
+    def _enqueue(self, name: str, exc: Exception) -> None:
+        assert self.storage is not None
+        count("acm.queued")
+
+        def update(queue: dict[str, typing.Any] | None) -> dict[str, typing.Any]:
+            queue = queue or {}
+            entry = queue.get(name, {"attempts": 0})
+            queue[name] = {
+                "attempts": entry["attempts"] + 1,
+                "error": str(exc),
+                "queued_at": entry.get("queued_at", time.time()),
+            }
+            return queue
+
+        try:
+            with self._queue_lock:
+                self.storage.update_queue(self.queue, update)
+        except StorageConflictError:
+            # the save itself succeeded, don't fail it over the retry queue
+            logger.exception("[ACM] failed to queue the import of %s", name)
+
+    def save_certificate(self, certificate: Certificate) -> None:
+        if self._executor is None:
+            self._sync(certificate)
+            return
+        future = self._executor.submit(self._sync, certificate)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard_pending)
+
+    def _discard_pending(self, future: concurrent.futures.Future[None]) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def flush(self, timeout: float | None = None) -> None:
+        """Wait for imports in flight, raise the first error that wasn't queued."""
+        with self._lock:
+            pending = list(self._pending)
+        done, _ = concurrent.futures.wait(pending, timeout=timeout)
+        for future in done:
+            future.result()
+
+    def retry_queued(self) -> list[str]:
+        """Import the queued certificates again, return the imported names."""
+        assert self.storage is not None, "the retry queue needs storage"
+        queue = self.storage.get_queue(self.queue)
+        imported = []
+        for name in queue:
+            certificate = self.storage.get_certificate(name=name)
+            if certificate is not None:
+                try:
+                    self._import(certificate)
+                except Exception as exc:
+                    logger.warning("[ACM] import of %s failed: %s", name, exc)
+                    self._enqueue(name, exc)
+                    continue
+                imported.append(name)
+            with self._queue_lock:
+                self.storage.update_queue(self.queue, functools.partial(_dequeue, name))
+        return imported
+
     def remove_certificate(self, certificate: Certificate) -> None:
         """
         Remove certificate from ACM.
@@ -134,4 +516,146 @@ class ACMStorageObserver(StorageObserverProtocol):
         """
         acm_arn = self._acm_arn_resolver.get(certificate.name)
         if acm_arn:
-            self.acm.delete_certificate(CertificateArn=acm_arn)
+            self._call(self.acm.delete_certificate, CertificateArn=acm_arn)
+
+
+def _dequeue(
+    name: str, queue: dict[str, typing.Any] | None
+) -> dict[str, typing.Any] | None:
+    if not queue or name not in queue:
+        return None
+    del queue[name]
+    return queue
+
+
+class RegionARNResolver(ACMStorageObserver.ARNResolver):
+    """ARNs of one region kept in the storage's `acm/arns.json`.
+
+    The region is listed with `list_certificates` only while storage has
+    no entry for it, e.g. on the first run.
+    """
+
+    def __init__(self, client: typing.Any, storage: BaseStorage, region: str):
+        super().__init__(client)
+        self.storage = storage
+        self.region = region
+
+    def _fetch_acm_certificates(self) -> typing.MutableMapping[str, str]:
+        stored = self.storage.get_acm_arns().get(self.region)
+        if stored is not None:
+            return stored
+        result = super()._fetch_acm_certificates()
+        self.storage.update_acm_arns(self.region, result)
+        return result
+
+    def set(self, domain_name: str, acm_arn: str) -> None:
+        super().set(domain_name, acm_arn)
+        self.storage.update_acm_arns(self.region, {domain_name: acm_arn})
+
+    def discard(self, domain_name: str) -> None:
+        self._get_store().pop(domain_name, None)
+        self.storage.update_acm_arns(self.region, {domain_name: None})
+
+
+class MultiRegionACMStorageObserver(StorageObserverProtocol):
+    """Replicates certificates into ACM of several regions concurrently.
+
+        observer = MultiRegionACMStorageObserver(
+            {r: boto3.client("acm", region_name=r) for r in ("us-east-1", "eu-west-1")},
+            storage=storage,
+        )
+        storage.subscribe(observer)
+
+    Every region gets an `ACMStorageObserver` with its own pacing and retry
+    queue (`queues/acm-<region>.json`), all of them share the ARNs persisted
+    in `acm/arns.json`. `save_certificate` returns at once, call `flush`
+    before the process exits. `lag` reports how far behind each region is.
+    """
+
+    def __init__(
+        self,
+        clients: typing.Mapping[str, typing.Any],
+        *args: typing.Any,
+        storage: BaseStorage,
+        concurrency: int | None = None,
+        sleep: typing.Callable[[float], None] = time.sleep,
+        **kwargs: typing.Any,
+    ) -> None:
+        self.storage = storage
+        self.observers = {
+            region: ACMStorageObserver(
+                client,
+                storage=storage,
+                queue=f"acm-{region}",
+                arn_resolver=RegionARNResolver(client, storage, region),
+                sleep=sleep,
+            )
+            for region, client in clients.items()
+        }
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrency or len(clients)
+        )
+        self._lock = threading.Lock()
+        # region -> future -> wall time the certificate was saved
+        self._in_flight: dict[str, dict[concurrent.futures.Future[None], float]] = {
+            region: {} for region in clients
+        }
+
+    def _replicate(self, region: str, certificate: Certificate) -> None:
+        with span("acm.replicate", region=region):
+            self.observers[region]._sync(certificate)
+
+    def _done(self, region: str, future: concurrent.futures.Future[None]) -> None:
+        with self._lock:
+            self._in_flight[region].pop(future, None)
+
+    def save_certificate(self, certificate: Certificate) -> None:
+        for region in self.observers:
+            future = self._executor.submit(self._replicate, region, certificate)
+            with self._lock:
+                self._in_flight[region][future] = time.time()
+            future.add_done_callback(functools.partial(self._done, region))
+
+    def flush(self, timeout: float | None = None) -> None:
+        """Wait for imports in flight of every region."""
+        with self._lock:
+            pending = [f for futures in self._in_flight.values() for f in futures]
+        done, _ = concurrent.futures.wait(pending, timeout=timeout)
+        for future in done:
+            future.result()
+
+    def remove_certificate(self, certificate: Certificate) -> None:
+        """Remove the certificate from every region, raise the first failure."""
+
+        def remove(region: str) -> None:
+            observer = self.observers[region]
+            observer.remove_certificate(certificate)
+            resolver = observer._acm_arn_resolver
+            assert isinstance(resolver, RegionARNResolver)
+            resolver.discard(certificate.name)
+
+        futures = [self._executor.submit(remove, region) for region in self.observers]
+        for future in futures:
+            future.result()
+
+    def retry_queued(self) -> dict[str, list[str]]:
+        """Import the queued certificates again, imported names by region."""
+        futures = {
+            region: self._executor.submit(observer.retry_queued)
+            for region, observer in self.observers.items()
+        }
+        return {region: future.result() for region, future in futures.items()}
+
+    def lag(self) -> dict[str, float]:
+        """Seconds since the oldest save not yet replicated, in flight or queued."""
+        now = time.time()
+        with self._lock:
+            started = {
+                region: min(futures.values(), default=now)
+                for region, futures in self._in_flight.items()
+            }
+        result = {}
+        for region, oldest in started.items():
+            queued = self.storage.get_queue(f"acm-{region}").values()
+            result[region] = now - min([oldest, *(e["queued_at"] for e in queued)])
+        return result
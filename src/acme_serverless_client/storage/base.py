@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import concurrent.futures
+import contextlib
 import datetime
+import hashlib
 import json
+import logging
+import threading
+import time
 import typing
+import uuid
+import weakref
 from typing import Protocol
 
+from ..instrumentation import count, span
 from ..models import Account, Certificate
+from .encoding import StorageCodec, plain_codec
+
+logger = logging.getLogger(__name__)
 
 
 class ObserverEventsProtocol(Protocol):
@@ -21,9 +33,9 @@ class AuthenticatorStorageProtocol(Protocol):
 
 
 class StorageProtocol(ObserverEventsProtocol, Protocol):
-    def get_account(self) -> Account | None: ...
+    def get_account(self, name: str | None = None) -> Account | None: ...
 
-    def set_account(self, account: Account) -> None: ...
+    def set_account(self, account: Account, name: str | None = None) -> None: ...
 
     def list_certificates(
         self,
@@ -36,6 +48,56 @@ class StorageProtocol(ObserverEventsProtocol, Protocol):
         name: str | None = None,
     ) -> Certificate | None: ...
 
+    def get_certificate_domains(self, name: str) -> list[str] | None: ...
+
+    def get_certificate_version(self, name: str) -> str | None: ...
+
+    def remove_certificates(
+        self, certificates: typing.Sequence[Certificate], concurrency: int = 8
+    ) -> dict[str, Exception]: ...
+
+    def get_order(self, name: str) -> dict[str, typing.Any] | None: ...
+
+    def set_order(self, name: str, order: dict[str, typing.Any]) -> None: ...
+
+    def del_order(self, name: str) -> None: ...
+
+    def get_pending(self, name: str) -> dict[str, typing.Any] | None: ...
+
+    def set_pending(self, name: str, material: dict[str, typing.Any]) -> None: ...
+
+    def del_pending(self, name: str) -> None: ...
+
+    def get_queue(self, name: str) -> dict[str, typing.Any]: ...
+
+    def set_queue(self, name: str, entries: dict[str, typing.Any]) -> None: ...
+
+    def get_hostnames(self) -> dict[str, str]: ...
+
+    def change_cursor(self) -> int: ...
+
+    def changes_since(
+        self, cursor: int = 0, limit: int = 1000
+    ) -> list[dict[str, typing.Any]]: ...
+
+    def lease(
+        self, name: str, ttl: float | None = None
+    ) -> typing.ContextManager[None]: ...
+
+    def set_hostnames(self, hostnames: dict[str, str]) -> None: ...
+
+
+class StorageConflictError(RuntimeError):
+    def __init__(self, name: str) -> None:
+        super().__init__(f"{name} was changed by another worker")
+        self.name = name
+
+
+class LeaseHeldError(RuntimeError):
+    def __init__(self, name: str) -> None:
+        super().__init__(f"{name} is leased by another worker")
+        self.name = name
+
 
 StorageEvent = typing.Literal["save_certificate", "remove_certificate"]
 
@@ -50,10 +112,76 @@ class StorageObserverProtocol(ObserverEventsProtocol, Protocol):
             self.remove_certificate(*args, **kwargs)
 
 
+class ChainCache:
+    """Intermediate chains by SHA-256, shared by all storages of the process.
+
+    Chains are content addressed, so a cached chain never goes stale and
+    certificates loaded with the same chain share one bytes object.
+    """
+
+    def __init__(self) -> None:
+        self._chains: dict[str, bytes] = {}
+        self._stored: weakref.WeakKeyDictionary[typing.Any, set[str]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(chain: bytes) -> str:
+        return hashlib.sha256(chain).hexdigest()
+
+    def get(self, digest: str) -> bytes | None:
+        with self._lock:
+            return self._chains.get(digest)
+
+    def add(self, digest: str, chain: bytes) -> bytes:
+        with self._lock:
+            return self._chains.setdefault(digest, chain)
+
+    def is_stored(self, storage: typing.Any, digest: str) -> bool:
+        with self._lock:
+            return digest in self._stored.get(storage, ())
+
+    def mark_stored(self, storage: typing.Any, digest: str) -> None:
+        with self._lock:
+            self._stored.setdefault(storage, set()).add(digest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chains.clear()
+            self._stored.clear()
+
+
+chain_cache = ChainCache()
+
+
 class BaseStorage:
     certificate_prefix = "certificates/"
     key_prefix = "keys/"
     config_prefix = "configs/"
+    job_prefix = "jobs/"
+    order_prefix = "orders/"
+    account_prefix = "accounts/"
+    chain_prefix = "chains/"
+    pending_prefix = "pending/"
+    lease_prefix = "leases/"
+    change_prefix = "changes/"
+    # long enough for an order with DNS propagation waits
+    lease_seconds = 900.0
+    # compare-and-swap attempts of shared JSON objects, see `_update`
+    update_attempts = 10
+    # Store intermediate chains once under `chains/<sha256>` and only the leaf
+    # under `certificates/`, opt-in as external readers of `certificates/`
+    # expect the full chain. Reading handles both layouts.
+    dedupe_chains = False
+    # Compress and encrypt stored objects, see `encoding`. Objects written
+    # without a codec are read back as is.
+    codec: StorageCodec | None = None
+    # Append saves and removals to a change log under `changes/` for
+    # consumers in other processes, see `changes_since`.
+    change_log = False
+    # changes per log object, a consumer reads one object per bucket
+    change_bucket_size = 100
 
     def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         self._subscribers: set[StorageObserverProtocol] = set()
@@ -70,6 +198,39 @@ class BaseStorage:
     def _build_config_storage_key(cls, domain_name: str) -> str:
         return f"{cls.config_prefix}{domain_name}"
 
+    @classmethod
+    def _build_account_storage_key(cls, name: str | None) -> str:
+        # the unnamed account keeps its original location
+        return f"{cls.account_prefix}{name}.json" if name else "account.json"
+
+    @classmethod
+    def _build_chain_storage_key(cls, digest: str) -> str:
+        return f"{cls.chain_prefix}{digest}"
+
+    @classmethod
+    def _build_pending_storage_key(cls, domain_name: str) -> str:
+        return f"{cls.pending_prefix}{domain_name}"
+
+    @classmethod
+    def _build_change_storage_key(cls, bucket: int | None = None) -> str:
+        if bucket is None:
+            return f"{cls.change_prefix}head"
+        return f"{cls.change_prefix}{bucket:020d}"
+
+    @classmethod
+    def _build_lease_storage_key(cls, domain_name: str) -> str:
+        return f"{cls.lease_prefix}{domain_name}"
+
+    @classmethod
+    def _build_order_storage_key(cls, domain_name: str) -> str:
+        return f"{cls.order_prefix}{domain_name}"
+
+    @classmethod
+    def _build_job_storage_key(cls, run_id: str, name: str | None = None) -> str:
+        if name is None:
+            return f"{cls.job_prefix}{run_id}/manifest.json"
+        return f"{cls.job_prefix}{run_id}/tasks/{name}"
+
     def _get(self, name: str) -> bytes | None:
         raise NotImplementedError()
 
@@ -79,6 +240,137 @@ class BaseStorage:
     def _del(self, name: str) -> None:
         raise NotImplementedError()
 
+    def _get_version(self, name: str) -> str | None:
+        """Opaque version (ETag, mtime) of the stored object, None if unknown."""
+        return None
+
+    def _set_with_version(self, name: str, data: bytes) -> str | None:
+        """`_set` returning the version of the written object, None if unknown."""
+        self._set(name, data)
+        return None
+
+    def _get_with_version(self, name: str) -> tuple[bytes | None, str | None]:
+        # the version is read first, a write in between fails the next
+        # conditional write instead of passing it with stale data
+        version = self._get_version(name)
+        return self._get(name), version
+
+    def _create(self, name: str, data: bytes) -> bool:
+        """Write `name` only if it doesn't exist, False otherwise.
+
+        Backends override it with an atomic operation, the default is not.
+        """
+        if self._get(name) is not None:
+            return False
+        self._set(name, data)
+        return True
+
+    def _replace(self, name: str, data: bytes, version: str | None) -> bool:
+        """Write `name` only if its version is still `version`, False otherwise.
+
+        Backends override it with an atomic operation, the default is not.
+        """
+        if self._get_version(name) != version:
+            return False
+        self._set(name, data)
+        return True
+
+    def _replace_with_version(
+        self, name: str, data: bytes, version: str | None
+    ) -> tuple[bool, str | None]:
+        """`_replace` also returning the version written, None if unknown."""
+        return self._replace(name, data, version), None
+
+    def _update(
+        self, name: str, update: typing.Callable[[typing.Any], typing.Any]
+    ) -> None:
+        """Read-modify-write of the JSON object `name` with compare-and-swap.
+
+        `update` gets the stored value (None if missing) and returns the new
+        one, or None to leave it as is. It is called again after a concurrent
+        update, `StorageConflictError` is raised after `update_attempts`.
+        """
+        for _ in range(self.update_attempts):
+            data, version = self._read_with_version(name)
+            value = update(json.loads(data) if data else None)
+            if value is None or self._write_if(
+                name, json.dumps(value).encode(), version
+            ):
+                return
+            count("storage.update_conflict")
+        raise StorageConflictError(name)
+
+    def _read(self, name: str) -> bytes | None:
+        with span("storage._get", storage=type(self).__name__):
+            data = self._get(name)
+        if data is not None:
+            count("storage.bytes_read", len(data))
+            data = self._decode(name, data)
+        return data
+
+    def _read_with_version(self, name: str) -> tuple[bytes | None, str | None]:
+        with span("storage._get", storage=type(self).__name__):
+            data, version = self._get_with_version(name)
+        if data is not None:
+            count("storage.bytes_read", len(data))
+            data = self._decode(name, data)
+        return data, version
+
+    def _write_if(self, name: str, data: bytes, version: str | None) -> bool:
+        """`_write` if the stored version is still `version`, see `_replace`."""
+        return self._write_if_with_version(name, data, version)[0]
+
+    def _write_if_with_version(
+        self, name: str, data: bytes, version: str | None
+    ) -> tuple[bool, str | None]:
+        data = self._encode(name, data)
+        with span("storage._replace", storage=type(self).__name__):
+            written, new_version = self._replace_with_version(name, data, version)
+        if written:
+            count("storage.bytes_written", len(data))
+        return written, new_version
+
+    def _write(self, name: str, data: bytes) -> str | None:
+        """Encode and store `name`, returns the version written if known."""
+        data = self._encode(name, data)
+        with span("storage._set", storage=type(self).__name__):
+            version = self._set_with_version(name, data)
+        count("storage.bytes_written", len(data))
+        return version
+
+    def _encode(self, name: str, data: bytes) -> bytes:
+        if self.codec is None:
+            return data
+        return self.codec.encode(
+            name,
+            data,
+            compress=name.startswith((self.certificate_prefix, self.chain_prefix)),
+            encrypt=name.startswith(
+                (
+                    self.key_prefix,
+                    self.account_prefix,
+                    self.order_prefix,
+                    self.pending_prefix,
+                )
+            )
+            or name == self._build_account_storage_key(None),
+        )
+
+    def _decode(self, name: str, data: bytes) -> bytes:
+        return (self.codec or plain_codec).decode(name, data)
+
+    def _delete(self, name: str) -> None:
+        with span("storage._del", storage=type(self).__name__):
+            self._del(name)
+
+    def _del_many(self, names: typing.Sequence[str]) -> None:
+        for name in names:
+            self._del(name)
+
+    def _delete_many(self, names: typing.Sequence[str]) -> None:
+        with span("storage._del_many", storage=type(self).__name__):
+            self._del_many(names)
+
     def _notify(
         self, event: StorageEvent, *args: typing.Any, **kwargs: typing.Any
     ) -> None:
@@ -88,20 +380,187 @@ class BaseStorage:
     def subscribe(self, observer: StorageObserverProtocol) -> None:
         self._subscribers.add(observer)
 
-    def get_account(self) -> Account | None:
-        data = self._get("account.json")
+    def get_account(self, name: str | None = None) -> Account | None:
+        data = self._read(self._build_account_storage_key(name))
         if data:
             return Account.json_loads(data.decode())
         return None
 
-    def set_account(self, account: Account) -> None:
-        return self._set("account.json", account.json_dumps().encode())
+    def set_account(self, account: Account, name: str | None = None) -> None:
+        self._write(
+            self._build_account_storage_key(name), account.json_dumps().encode()
+        )
 
     def list_certificates(
         self,
     ) -> typing.Iterator[tuple[str, datetime.datetime]]:
         raise NotImplementedError()
 
+    def acquire_lease(self, name: str, owner: str, ttl: float | None = None) -> bool:
+        """Take the lease of certificate `name` for `ttl` seconds.
+
+        Succeeds if the lease is free, expired or already held by `owner`.
+        """
+        key = self._build_lease_storage_key(name)
+        data = json.dumps(
+            {"owner": owner, "expires_at": time.time() + (ttl or self.lease_seconds)}
+        ).encode()
+        if self._create(key, data):
+            return True
+        current, version = self._get_with_version(key)
+        if current is None:
+            # released in between
+            return self._create(key, data)
+        lease = json.loads(current)
+        if lease["owner"] != owner and lease["expires_at"] > time.time():
+            return False
+        return self._replace(key, data, version)
+
+    def release_lease(self, name: str, owner: str) -> None:
+        key = self._build_lease_storage_key(name)
+        current, version = self._get_with_version(key)
+        if current is None or json.loads(current)["owner"] != owner:
+            return
+        # an expired lease instead of a delete, which could not be
+        # conditional on the version and drop a lease taken meanwhile
+        self._replace(
+            key, json.dumps({"owner": None, "expires_at": 0}).encode(), version
+        )
+
+    @contextlib.contextmanager
+    def lease(self, name: str, ttl: float | None = None) -> typing.Iterator[None]:
+        """Hold the lease of certificate `name`, raise `LeaseHeldError` if taken."""
+        owner = uuid.uuid4().hex
+        if not self.acquire_lease(name, owner, ttl):
+            count("storage.lease_held")
+            raise LeaseHeldError(name)
+        try:
+            yield
+        finally:
+            self.release_lease(name, owner)
+
+    def get_rate_limits(self) -> dict[str, typing.Any] | None:
+        data = self._read("ratelimits.json")
+        return json.loads(data) if data else None
+
+    def set_rate_limits(self, state: dict[str, typing.Any]) -> None:
+        self._write("ratelimits.json", json.dumps(state).encode())
+
+    def update_rate_limits(
+        self,
+        update: typing.Callable[
+            [dict[str, typing.Any] | None], dict[str, typing.Any] | None
+        ],
+    ) -> None:
+        """Apply `update` to the stored rate limits, see `_update`."""
+        self._update("ratelimits.json", update)
+
+    def get_queue(self, name: str) -> dict[str, typing.Any]:
+        """Work queued for a later retry, e.g. ACM imports, by certificate name."""
+        data = self._read(f"queues/{name}.json")
+        return json.loads(data) if data else {}
+
+    def set_queue(self, name: str, entries: dict[str, typing.Any]) -> None:
+        self._write(f"queues/{name}.json", json.dumps(entries).encode())
+
+    def update_queue(
+        self,
+        name: str,
+        update: typing.Callable[
+            [dict[str, typing.Any] | None], dict[str, typing.Any] | None
+        ],
+    ) -> None:
+        """Apply `update` to the queue, safe with concurrent workers, see `_update`."""
+        self._update(f"queues/{name}.json", update)
+
+    def get_acm_arns(self) -> dict[str, dict[str, str]]:
+        """Region -> certificate name -> ARN of certificates imported into ACM."""
+        data = self._read("acm/arns.json")
+        return json.loads(data) if data else {}
+
+    def update_acm_arns(
+        self, region: str, arns: typing.Mapping[str, str | None]
+    ) -> None:
+        """Merge `arns` into the region, None removes a certificate.
+
+        Concurrent writers of other regions don't lose entries, see `_update`.
+        """
+
+        def update(
+            state: dict[str, dict[str, str]] | None,
+        ) -> dict[str, dict[str, str]]:
+            state = state or {}
+            current = state.setdefault(region, {})
+            for name, arn in arns.items():
+                if arn is None:
+                    current.pop(name, None)
+                else:
+                    current[name] = arn
+            return state
+
+        self._update("acm/arns.json", update)
+
+    def get_hostnames(self) -> dict[str, str]:
+        """Hostname -> name of the certificate covering it, see `planning.apply`."""
+        data = self._read("hostnames.json")
+        return json.loads(data) if data else {}
+
+    def set_hostnames(self, hostnames: dict[str, str]) -> None:
+        self._write("hostnames.json", json.dumps(hostnames, sort_keys=True).encode())
+
+    def get_order(self, name: str) -> dict[str, typing.Any] | None:
+        """In-flight ACME order of the certificate, see `client.perform`."""
+        data = self._read(self._build_order_storage_key(name))
+        return json.loads(data) if data else None
+
+    def set_order(self, name: str, order: dict[str, typing.Any]) -> None:
+        self._write(self._build_order_storage_key(name), json.dumps(order).encode())
+
+    def del_order(self, name: str) -> None:
+        self._delete(self._build_order_storage_key(name))
+
+    def get_pending(self, name: str) -> dict[str, typing.Any] | None:
+        """Key and CSR prepared for the next renewal, see `helpers.prestage`."""
+        data = self._read(self._build_pending_storage_key(name))
+        return json.loads(data) if data else None
+
+    def set_pending(self, name: str, material: dict[str, typing.Any]) -> None:
+        self._write(
+            self._build_pending_storage_key(name), json.dumps(material).encode()
+        )
+
+    def del_pending(self, name: str) -> None:
+        self._delete(self._build_pending_storage_key(name))
+
+    def get_renewal_run(self, run_id: str) -> dict[str, typing.Any] | None:
+        data = self._read(self._build_job_storage_key(run_id))
+        return json.loads(data) if data else None
+
+    def set_renewal_run(self, run_id: str, manifest: dict[str, typing.Any]) -> None:
+        self._write(self._build_job_storage_key(run_id), json.dumps(manifest).encode())
+
+    def get_renewal_task(self, run_id: str, name: str) -> dict[str, typing.Any] | None:
+        data = self._read(self._build_job_storage_key(run_id, name))
+        return json.loads(data) if data else None
+
+    def set_renewal_task(
+        self, run_id: str, name: str, task: dict[str, typing.Any]
+    ) -> None:
+        self._write(
+            self._build_job_storage_key(run_id, name), json.dumps(task).encode()
+        )
+
+    def update_renewal_task(
+        self,
+        run_id: str,
+        name: str,
+        update: typing.Callable[
+            [dict[str, typing.Any] | None], dict[str, typing.Any] | None
+        ],
+    ) -> None:
+        """Change the task with compare-and-swap, see `_update`."""
+        self._update(self._build_job_storage_key(run_id, name), update)
+
     def get_certificate(
         self,
         *,
@@ -116,37 +575,229 @@ class BaseStorage:
                 )
             name = domains[0]
         assert name  # fix typing
-        config_data = self._get(self._build_config_storage_key(name))
+        config_data, version = self._read_with_version(
+            self._build_config_storage_key(name)
+        )
         if not config_data:
             return None
         config = json.loads(config_data)
         if domains is not None and config["domains"] != domains:
             return None
-        private_key = self._get(self._build_key_storage_key(name))
+        private_key = self._read(self._build_key_storage_key(name))
         if not private_key:
             return None
-        cert = Certificate(domains=config["domains"], private_key=private_key)
-        fullchain_pem = self._get(self._build_certificate_storage_key(name))
+        cert = Certificate(
+            domains=config["domains"],
+            private_key=private_key,
+            account_name=config.get("account"),
+        )
+        cert.version = version
+        fullchain_pem = self._read(self._build_certificate_storage_key(name))
         if fullchain_pem:
-            cert.set_fullchain(fullchain_pem)
+            if "chain" in config:
+                cert.set_certificate(fullchain_pem, self._get_chain(config["chain"]))
+            else:
+                cert.set_fullchain(fullchain_pem)
         return cert
 
+    def get_certificate_version(self, name: str) -> str | None:
+        """Version of the stored config of certificate `name`."""
+        return self._get_version(self._build_config_storage_key(name))
+
+    def get_certificate_domains(self, name: str) -> list[str] | None:
+        """Domains of a stored certificate, reads only its config."""
+        config_data = self._read(self._build_config_storage_key(name))
+        if not config_data:
+            return None
+        domains: list[str] = json.loads(config_data)["domains"]
+        return domains
+
+    def _get_chain(self, digest: str) -> bytes:
+        chain = chain_cache.get(digest)
+        if chain is None:
+            chain = self._read(self._build_chain_storage_key(digest))
+            if chain is None:
+                raise RuntimeError(f"Certificate chain {digest} is missing.")
+            chain = chain_cache.add(digest, chain)
+        return chain
+
+    def _set_chain(self, chain: bytes) -> str:
+        digest = chain_cache.digest(chain)
+        if not chain_cache.is_stored(self, digest):
+            self._write(self._build_chain_storage_key(digest), chain)
+            chain_cache.mark_stored(self, digest)
+        chain_cache.add(digest, chain)
+        return digest
+
     def save_certificate(self, certificate: Certificate) -> None:
+        """Write the config of the certificate, then its chain, key and PEM.
+
+        A certificate loaded with `get_certificate` is only saved if its config
+        wasn't rewritten in between, otherwise `StorageConflictError` is raised
+        before anything is written. The config is written first for that
+        check, the other objects follow unconditionally: until they are
+        written a reader may get the new config with the previous key and
+        certificate.
+        """
         assert certificate.is_fullchain_set
-        self._set(
-            self._build_config_storage_key(certificate.name),
-            json.dumps({"domains": certificate.domains}).encode(),
-        )
-        self._set(
+        config: dict[str, typing.Any] = {"domains": certificate.domains}
+        if certificate.account_name:
+            config["account"] = certificate.account_name
+        if self.dedupe_chains:
+            config["chain"] = chain_cache.digest(certificate.certificate_chain)
+            certificate_pem = certificate.certificate
+        else:
+            certificate_pem = certificate.fullchain
+        # makes every saved certificate a new config version
+        config["sha256"] = hashlib.sha256(certificate.certificate).hexdigest()
+        config_key = self._build_config_storage_key(certificate.name)
+        config_data = json.dumps(config).encode()
+        if certificate.version is None:
+            version = self._write(config_key, config_data)
+        else:
+            written, version = self._write_if_with_version(
+                config_key, config_data, certificate.version
+            )
+            if not written:
+                # a newer certificate was saved since this one was loaded
+                count("storage.conflict")
+                raise StorageConflictError(certificate.name)
+        certificate.version = version
+        if self.dedupe_chains:
+            self._set_chain(certificate.certificate_chain)
+        self._write(
             self._build_key_storage_key(certificate.name), certificate.private_key
         )
-        self._set(
-            self._build_certificate_storage_key(certificate.name), certificate.fullchain
+        self._write(
+            self._build_certificate_storage_key(certificate.name), certificate_pem
         )
+        if self.change_log:
+            self._log_change(
+                "save_certificate",
+                certificate.name,
+                domains=certificate.domains,
+                sha256=config["sha256"],
+            )
         self._notify("save_certificate", certificate)
 
     def remove_certificate(self, certconfig: Certificate) -> None:
-        self._del(self._build_certificate_storage_key(certconfig.name))
-        self._del(self._build_key_storage_key(certconfig.name))
-        self._del(self._build_config_storage_key(certconfig.name))
+        self._delete(self._build_certificate_storage_key(certconfig.name))
+        self._delete(self._build_key_storage_key(certconfig.name))
+        self._delete(self._build_config_storage_key(certconfig.name))
+        # prepared material and an in-flight order would revive the certificate
+        self._delete(self._build_pending_storage_key(certconfig.name))
+        self._delete(self._build_order_storage_key(certconfig.name))
+        certconfig.version = None
+        if self.change_log:
+            self._log_change("remove_certificate", certconfig.name)
         self._notify("remove_certificate", certconfig)
+
+    def remove_certificates(
+        self, certificates: typing.Sequence[Certificate], concurrency: int = 8
+    ) -> dict[str, Exception]:
+        """`remove_certificate` in bulk: one batched delete of all objects, then
+        observers (e.g. ACM deletion) notified from `concurrency` threads.
+
+        Certificates are removed from storage even if an observer fails, e.g.
+        ACM refuses to delete a certificate in use, the failures are returned
+        by certificate name.
+        """
+        self._delete_many(
+            [
+                build(certificate.name)
+                for certificate in certificates
+                for build in (
+                    self._build_certificate_storage_key,
+                    self._build_key_storage_key,
+                    self._build_config_storage_key,
+                    self._build_pending_storage_key,
+                    self._build_order_storage_key,
+                )
+            ]
+        )
+        for certificate in certificates:
+            certificate.version = None
+            if self.change_log:
+                self._log_change("remove_certificate", certificate.name)
+        failures = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(self._notify, "remove_certificate", certificate)
+                for certificate in certificates
+            ]
+            for certificate, future in zip(certificates, futures, strict=True):
+                exc = future.exception()
+                if exc is not None:
+                    assert isinstance(exc, Exception)
+                    logger.error(
+                        "[STORAGE] observer of %s failed: %s", certificate.name, exc
+                    )
+                    failures[certificate.name] = exc
+        return failures
+
+    def _log_change(self, event: StorageEvent, name: str, **fields: typing.Any) -> int:
+        """Append a change to the first bucket that isn't full.
+
+        Buckets are appended with `_update`, the head object is only a hint
+        of the bucket to start from, so concurrent writers never share a
+        sequence number.
+        """
+        change = {"event": event, "name": name, "time": time.time(), **fields}
+        bucket = head = self._change_head()
+        seq = 0
+
+        def append(
+            changes: list[dict[str, typing.Any]] | None,
+        ) -> list[dict[str, typing.Any]] | None:
+            nonlocal seq
+            changes = changes or []
+            if len(changes) >= self.change_bucket_size:
+                seq = 0
+                return None
+            seq = bucket * self.change_bucket_size + len(changes) + 1
+            return [*changes, {"seq": seq, **change}]
+
+        while True:
+            self._update(self._build_change_storage_key(bucket), append)
+            if seq:
+                break
+            bucket += 1
+        if bucket != head:
+            self._write(
+                self._build_change_storage_key(),
+                json.dumps({"bucket": bucket}).encode(),
+            )
+        return seq
+
+    def _change_head(self) -> int:
+        head = self._read(self._build_change_storage_key())
+        return int(json.loads(head)["bucket"]) if head else 0
+
+    def _read_changes(self, bucket: int) -> list[dict[str, typing.Any]]:
+        data = self._read(self._build_change_storage_key(bucket))
+        return json.loads(data) if data else []
+
+    def change_cursor(self) -> int:
+        """Cursor to sync from after a snapshot (e.g. `list_certificates`) taken
+        after this call. Replaying a change must be harmless."""
+        bucket = self._change_head()
+        while len(changes := self._read_changes(bucket)) >= self.change_bucket_size:
+            bucket += 1
+        return bucket * self.change_bucket_size + len(changes)
+
+    def changes_since(
+        self, cursor: int = 0, limit: int = 1000
+    ) -> list[dict[str, typing.Any]]:
+        """Changes after sequence number `cursor`, oldest first.
+
+        Pass the `seq` of the last change as the next cursor.
+        """
+        changes: list[dict[str, typing.Any]] = []
+        bucket = cursor // self.change_bucket_size
+        while len(changes) < limit:
+            entries = self._read_changes(bucket)
+            changes.extend(change for change in entries if change["seq"] > cursor)
+            if len(entries) < self.change_bucket_size:
+                break
+            bucket += 1
+        return changes[:limit]
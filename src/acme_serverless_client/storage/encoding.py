@@ -0,0 +1,193 @@
+"""Compression and encryption at rest of stored objects.
+
+Set a codec on the storage to compress certificate bundles and chains and
+to encrypt objects holding private keys (keys, accounts, orders, pending
+material) with a key encryption key (KEK) supplied by the caller:
+
+    storage.codec = StorageCodec(compression="zstd", keks={"2026-10": kek})
+
+or only compress with `StorageCodec(compression="zstd", encrypt=False)`.
+
+Encoded objects start with a versioned header:
+
+    magic b"\\0ASC", version u8, compression u8, encryption u8,
+    KEK id length u8, KEK id
+
+Encryption is an AES-256-GCM envelope: a random data key encrypts the
+object, the KEK encrypts the data key, the header and the storage key are
+authenticated so an object can't be moved to another name. Objects without
+the header are returned as is, so existing buckets keep working and are
+encoded on their next write. Add new KEKs in front of `keks` to rotate,
+keep the old ones until every object was rewritten.
+
+zstd needs `compression.zstd` (Python 3.14) or the `zstandard` package.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import typing
+import zlib
+
+MAGIC = b"\0ASC"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBBB")
+
+COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD = 0, 1, 2
+ENCRYPTION_NONE, ENCRYPTION_AES256GCM = 0, 1
+_COMPRESSIONS = {
+    None: COMPRESSION_NONE,
+    "zlib": COMPRESSION_ZLIB,
+    "zstd": COMPRESSION_ZSTD,
+}
+_NONCE_SIZE = 12
+_WRAPPED_KEY_SIZE = 32 + 16
+
+
+def _zstd() -> tuple[
+    typing.Callable[[bytes, int], bytes], typing.Callable[[bytes], bytes]
+]:
+    try:
+        from compression import zstd  # type: ignore[import-not-found]  # noqa: PLC0415
+    except ImportError:
+        pass
+    else:
+        return zstd.compress, zstd.decompress
+    try:
+        import zstandard  # type: ignore[import-not-found]  # noqa: PLC0415
+    except ImportError:
+        raise RuntimeError(
+            "zstd requires Python 3.14 or the zstandard package"
+        ) from None
+    return (
+        lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+
+def _compress(method: int, data: bytes, level: int | None) -> bytes:
+    if method == COMPRESSION_ZLIB:
+        return zlib.compress(data, 6 if level is None else level)
+    if method == COMPRESSION_ZSTD:
+        return _zstd()[0](data, 3 if level is None else level)
+    return data
+
+
+def _decompress(method: int, data: bytes) -> bytes:
+    if method == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    if method == COMPRESSION_ZSTD:
+        return _zstd()[1](data)
+    if method != COMPRESSION_NONE:
+        raise RuntimeError(f"Unknown compression {method}")
+    return data
+
+
+def is_encoded(data: bytes) -> bool:
+    return data.startswith(MAGIC)
+
+
+class StorageCodec:
+    """Encoder of stored objects, see the module docstring.
+
+    Private keys are encrypted with the first of `keks`, a codec without
+    KEKs must opt out with `encrypt=False` and then only compresses. The
+    KEKs of such a codec still decrypt objects written before.
+    """
+
+    def __init__(
+        self,
+        *,
+        compression: typing.Literal["zlib", "zstd"] | None = "zlib",
+        level: int | None = None,
+        keks: typing.Mapping[str, bytes] | None = None,
+        encrypt: bool = True,
+    ) -> None:
+        if compression not in _COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}")
+        self.compression = _COMPRESSIONS[compression]
+        self.level = level
+        # the first KEK encrypts, all of them decrypt
+        self.keks = dict(keks or {})
+        for kek_id, kek in self.keks.items():
+            if not 0 < len(kek_id.encode()) < 256:
+                raise ValueError(f"Invalid KEK id {kek_id!r}")
+            if len(kek) != 32:
+                raise ValueError(f"KEK {kek_id!r} must be 32 bytes")
+        if encrypt and not self.keks:
+            raise ValueError(
+                "keks are required to encrypt, pass encrypt=False to store"
+                " private keys in plain text"
+            )
+        self.kek_id = next(iter(self.keks)) if encrypt else None
+
+    def encode(self, name: str, data: bytes, *, compress: bool, encrypt: bool) -> bytes:
+        compression = COMPRESSION_NONE
+        if compress and self.compression != COMPRESSION_NONE:
+            compressed = _compress(self.compression, data, self.level)
+            # small objects may not shrink
+            if len(compressed) < len(data):
+                compression, data = self.compression, compressed
+        kek_id = self.kek_id if encrypt else None
+        if compression == COMPRESSION_NONE and kek_id is None:
+            return data
+        encoded_id = kek_id.encode() if kek_id else b""
+        header = _HEADER.pack(
+            MAGIC,
+            VERSION,
+            compression,
+            ENCRYPTION_AES256GCM if kek_id else ENCRYPTION_NONE,
+            len(encoded_id),
+        )
+        header += encoded_id
+        if kek_id is None:
+            return header + data
+        return header + self._encrypt(self.keks[kek_id], data, header + name.encode())
+
+    def decode(self, name: str, data: bytes) -> bytes:
+        if not is_encoded(data):
+            return data
+        _, version, compression, encryption, id_size = _HEADER.unpack_from(data)
+        if version != VERSION:
+            raise RuntimeError(f"Unsupported encoding version {version} of {name}")
+        size = _HEADER.size + id_size
+        header, body = data[:size], data[size:]
+        if encryption == ENCRYPTION_AES256GCM:
+            kek_id = header[_HEADER.size :].decode()
+            if kek_id not in self.keks:
+                raise RuntimeError(f"Unknown key encryption key {kek_id!r} for {name}")
+            body = self._decrypt(self.keks[kek_id], body, header + name.encode(), name)
+        elif encryption != ENCRYPTION_NONE:
+            raise RuntimeError(f"Unknown encryption {encryption} of {name}")
+        return _decompress(compression, body)
+
+    @staticmethod
+    def _encrypt(kek: bytes, data: bytes, aad: bytes) -> bytes:
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # noqa: PLC0415
+
+        data_key = AESGCM.generate_key(bit_length=256)
+        key_nonce, nonce = os.urandom(_NONCE_SIZE), os.urandom(_NONCE_SIZE)
+        wrapped_key = AESGCM(kek).encrypt(key_nonce, data_key, aad)
+        return (
+            key_nonce + wrapped_key + nonce + AESGCM(data_key).encrypt(nonce, data, aad)
+        )
+
+    @staticmethod
+    def _decrypt(kek: bytes, body: bytes, aad: bytes, name: str) -> bytes:
+        from cryptography.exceptions import InvalidTag  # noqa: PLC0415
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # noqa: PLC0415
+
+        key_end = _NONCE_SIZE + _WRAPPED_KEY_SIZE
+        try:
+            data_key = AESGCM(kek).decrypt(
+                body[:_NONCE_SIZE], body[_NONCE_SIZE:key_end], aad
+            )
+            nonce = body[key_end : key_end + _NONCE_SIZE]
+            return AESGCM(data_key).decrypt(nonce, body[key_end + _NONCE_SIZE :], aad)
+        except InvalidTag:
+            raise RuntimeError(f"Failed to decrypt {name}") from None
+
+
+# decodes compressed objects of a storage without codec
+plain_codec = StorageCodec(compression=None, encrypt=False)
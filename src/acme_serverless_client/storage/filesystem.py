@@ -0,0 +1,135 @@
+"""Storage in a local (or network mounted) directory.
+
+Every write goes to a temporary file renamed over the target, so readers
+never see partial objects. `_create` links the temporary file to the
+target which fails if it exists, `_replace` checks the version under an
+exclusive `flock` on `<root>/.lock`, both safe across processes.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime
+import os
+import typing
+import uuid
+
+from .base import BaseStorage
+
+
+class FileSystemStorage(BaseStorage):
+    def __init__(self, root: str, *args: typing.Any, **kwargs: typing.Any) -> None:
+        self.root = os.path.abspath(root)
+        super().__init__(*args, **kwargs)
+
+    def _path(self, name: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, name))
+        assert path.startswith(self.root + os.sep), f"Invalid key {name!r}"
+        return path
+
+    def _write_tmp(self, path: str, data: bytes) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp
+
+    @staticmethod
+    def _version(stat: os.stat_result) -> str:
+        # every write is a new inode
+        return f"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}"
+
+    @contextlib.contextmanager
+    def _locked(self) -> typing.Iterator[None]:
+        import fcntl  # noqa: PLC0415
+
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _get(self, name: str) -> bytes | None:
+        return self._get_with_version(name)[0]
+
+    def _set(self, name: str, data: bytes) -> None:
+        path = self._path(name)
+        os.replace(self._write_tmp(path, data), path)
+
+    def _set_with_version(self, name: str, data: bytes) -> str | None:
+        path = self._path(name)
+        tmp = self._write_tmp(path, data)
+        # the renamed file keeps its inode, mtime and size
+        version = self._version(os.stat(tmp))
+        os.replace(tmp, path)
+        return version
+
+    def _del(self, name: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._path(name))
+
+    def _get_version(self, name: str) -> str | None:
+        try:
+            return self._version(os.stat(self._path(name)))
+        except FileNotFoundError:
+            return None
+
+    def _get_with_version(self, name: str) -> tuple[bytes | None, str | None]:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read(), self._version(os.fstat(f.fileno()))
+        except FileNotFoundError:
+            return None, None
+
+    def _create(self, name: str, data: bytes) -> bool:
+        return self._create_with_version(name, data) is not None
+
+    def _create_with_version(self, name: str, data: bytes) -> str | None:
+        path = self._path(name)
+        tmp = self._write_tmp(path, data)
+        try:
+            version = self._version(os.stat(tmp))
+            os.link(tmp, path)
+        except FileExistsError:
+            return None
+        finally:
+            os.unlink(tmp)
+        return version
+
+    def _replace(self, name: str, data: bytes, version: str | None) -> bool:
+        return self._replace_with_version(name, data, version)[0]
+
+    def _replace_with_version(
+        self, name: str, data: bytes, version: str | None
+    ) -> tuple[bool, str | None]:
+        with self._locked():
+            if self._get_version(name) != version:
+                return False, None
+            if version is None:
+                new_version = self._create_with_version(name, data)
+                return new_version is not None, new_version
+            return True, self._set_with_version(name, data)
+
+    def list_certificates(
+        self,
+    ) -> typing.Iterator[tuple[str, datetime.datetime]]:
+        directory = self._path(self.certificate_prefix)
+        with contextlib.suppress(FileNotFoundError), os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    yield (
+                        entry.name,
+                        datetime.datetime.fromtimestamp(
+                            entry.stat().st_mtime, tz=datetime.timezone.utc
+                        ),
+                    )
+
+    def set_validation(self, key: str, value: bytes) -> None:
+        self._set(key.lstrip("/"), value)
+
+    def del_validation(self, key: str) -> None:
+        self._del(key.lstrip("/"))
@@ -0,0 +1,314 @@
+"""Storage that keeps a fast local tier in front of a slower backend.
+
+Reads are served from the cache tier while the entry is younger than `ttl`,
+after that the entry is revalidated against the backend object version (ETag)
+and downloaded only if it changed. Writes go to the backend first and then
+to the cache (write-through) when the backend reports the written version.
+Entries are kept encoded with the backend codec, so objects it encrypts are
+never cached in plain text.
+"""
+
+from __future__ import annotations
+
+import collections
+import datetime
+import json
+import os
+import pathlib
+import threading
+import time
+import typing
+import urllib.parse
+
+from ..instrumentation import count, span
+from .base import BaseStorage, StorageEvent
+
+
+class CacheEntry(typing.NamedTuple):
+    data: bytes
+    version: str | None
+    stored_at: float
+
+
+class CacheProtocol(typing.Protocol):
+    def get(self, key: str) -> CacheEntry | None: ...
+
+    def put(self, key: str, entry: CacheEntry) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+class MemoryCache(CacheProtocol):
+    """In-process LRU cache limited by the total size of stored data."""
+
+    def __init__(self, max_size: int = 16 * 1024 * 1024) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self._entries: collections.OrderedDict[str, CacheEntry] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._pop(key)
+            if len(entry.data) > self.max_size:
+                return
+            self._entries[key] = entry
+            self.size += len(entry.data)
+            while self.size > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.data)
+
+
+class FileSystemCache(CacheProtocol):
+    """LRU cache in a local directory, e.g. `/tmp` that survives warm invocations.
+
+    Each entry is a single file: a JSON header line followed by the data.
+    Recency is tracked by file mtime, so the order survives process restarts.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str] = "/tmp/acme-serverless-client",
+        max_size: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._sizes: collections.OrderedDict[str, int] = collections.OrderedDict()
+        files = sorted(
+            (f for f in os.scandir(self.path) if f.is_file() and f.name[0] != "."),
+            key=lambda f: f.stat().st_mtime,
+        )
+        for f in files:
+            self._sizes[f.name] = f.stat().st_size
+        self.size = sum(self._sizes.values())
+
+    def _filename(self, key: str) -> str:
+        return urllib.parse.quote(key, safe="")
+
+    def get(self, key: str) -> CacheEntry | None:
+        filename = self._filename(key)
+        with self._lock:
+            if filename not in self._sizes:
+                return None
+            try:
+                raw = (self.path / filename).read_bytes()
+            except FileNotFoundError:
+                self._forget(filename)
+                return None
+            os.utime(self.path / filename)
+            self._sizes.move_to_end(filename)
+        header, _, data = raw.partition(b"\n")
+        meta = json.loads(header)
+        return CacheEntry(data, meta["version"], meta["stored_at"])
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        filename = self._filename(key)
+        header = json.dumps({"version": entry.version, "stored_at": entry.stored_at})
+        raw = header.encode() + b"\n" + entry.data
+        with self._lock:
+            self._remove(filename)
+            if len(raw) > self.max_size:
+                return
+            tmp = self.path / f".{filename}.{threading.get_ident()}"
+            tmp.write_bytes(raw)
+            os.replace(tmp, self.path / filename)
+            self._sizes[filename] = len(raw)
+            self.size += len(raw)
+            while self.size > self.max_size:
+                self._remove(next(iter(self._sizes)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(self._filename(key))
+
+    def _forget(self, filename: str) -> None:
+        self.size -= self._sizes.pop(filename, 0)
+
+    def _remove(self, filename: str) -> None:
+        if filename in self._sizes:
+            self._forget(filename)
+            (self.path / filename).unlink(missing_ok=True)
+
+
+class TieredStorage(BaseStorage):
+    def __init__(
+        self,
+        backend: BaseStorage,
+        cache: CacheProtocol | None = None,
+        ttl: float = 60.0,
+        *args: typing.Any,
+        **kwargs: typing.Any,
+    ) -> None:
+        self.backend = backend
+        self.cache = cache if cache is not None else MemoryCache()
+        self.ttl = ttl
+        super().__init__(*args, **kwargs)
+
+    # the layout of stored objects is the backend's setting
+    @property
+    def dedupe_chains(self) -> bool:
+        return self.backend.dedupe_chains
+
+    @dedupe_chains.setter
+    def dedupe_chains(self, value: bool) -> None:
+        self.backend.dedupe_chains = value
+
+    @property
+    def change_log(self) -> bool:
+        return self.backend.change_log
+
+    @change_log.setter
+    def change_log(self, value: bool) -> None:
+        self.backend.change_log = value
+
+    @property
+    def change_bucket_size(self) -> int:
+        return self.backend.change_bucket_size
+
+    @change_bucket_size.setter
+    def change_bucket_size(self, value: int) -> None:
+        self.backend.change_bucket_size = value
+
+    @property
+    def lease_seconds(self) -> float:
+        return self.backend.lease_seconds
+
+    @lease_seconds.setter
+    def lease_seconds(self, value: float) -> None:
+        self.backend.lease_seconds = value
+
+    def _is_cached(self, name: str) -> bool:
+        # leases and the change log are shared by all workers, a cached
+        # copy is stale
+        return not name.startswith((self.lease_prefix, self.change_prefix))
+
+    def _get(self, name: str) -> bytes | None:
+        return self._get_with_version(name)[0]
+
+    def _get_with_version(self, name: str) -> tuple[bytes | None, str | None]:
+        data, version = self._get_encoded(name)
+        if data is not None:
+            data = self.backend._decode(name, data)
+        return data, version
+
+    def _get_encoded(self, name: str) -> tuple[bytes | None, str | None]:
+        # the cache holds objects as encoded by the backend, private keys
+        # stay encrypted in a `FileSystemCache`
+        if not self._is_cached(name):
+            with span("storage._get", storage=type(self.backend).__name__):
+                return self.backend._get_with_version(name)
+        now = time.time()
+        entry = self.cache.get(name)
+        if entry is not None:
+            if now - entry.stored_at < self.ttl:
+                count("storage.cache_hit")
+                return entry.data, entry.version
+            if entry.version is not None:
+                with span("storage._get_version", storage=type(self.backend).__name__):
+                    version = self.backend._get_version(name)
+                if version == entry.version:
+                    count("storage.cache_revalidated")
+                    self.cache.put(name, entry._replace(stored_at=now))
+                    return entry.data, entry.version
+        count("storage.cache_miss")
+        with span("storage._get", storage=type(self.backend).__name__):
+            data, version = self.backend._get_with_version(name)
+        if data is None:
+            self.cache.delete(name)
+        else:
+            self.cache.put(name, CacheEntry(data, version, now))
+        return data, version
+
+    def _get_version(self, name: str) -> str | None:
+        return self._get_with_version(name)[1]
+
+    def _set(self, name: str, data: bytes) -> None:
+        self._set_with_version(name, data)
+
+    def _set_with_version(self, name: str, data: bytes) -> str | None:
+        data = self.backend._encode(name, data)
+        version = self.backend._set_with_version(name, data)
+        self._cache_written(name, data, version)
+        return version
+
+    def _del(self, name: str) -> None:
+        self.cache.delete(name)
+        self.backend._del(name)
+
+    def _del_many(self, names: typing.Sequence[str]) -> None:
+        for name in names:
+            self.cache.delete(name)
+        self.backend._delete_many(names)
+
+    # conditional writes are decided by the backend
+    def _create(self, name: str, data: bytes) -> bool:
+        written = self.backend._create(name, self.backend._encode(name, data))
+        self.cache.delete(name)
+        return written
+
+    def _replace(self, name: str, data: bytes, version: str | None) -> bool:
+        return self._replace_with_version(name, data, version)[0]
+
+    def _replace_with_version(
+        self, name: str, data: bytes, version: str | None
+    ) -> tuple[bool, str | None]:
+        data = self.backend._encode(name, data)
+        written, new_version = self.backend._replace_with_version(name, data, version)
+        self._cache_written(name, data, new_version if written else None)
+        return written, new_version
+
+    def get_certificate_version(self, name: str) -> str | None:
+        # the lease check of `renew` must not see a cached version
+        return self.backend.get_certificate_version(name)
+
+    def _cache_written(self, name: str, data: bytes, version: str | None) -> None:
+        # without its version a cached write would be handed out as
+        # unversioned and the next compare-and-swap would be a blind write
+        if version is None or not self._is_cached(name):
+            self.cache.delete(name)
+        else:
+            self.cache.put(name, CacheEntry(data, version, time.time()))
+
+    def _notify(
+        self, event: StorageEvent, *args: typing.Any, **kwargs: typing.Any
+    ) -> None:
+        # observers subscribed to the backend must see the event exactly once
+        for subscriber in self._subscribers | self.backend._subscribers:
+            subscriber.notify(event, *args, **kwargs)
+
+    def list_certificates(
+        self,
+    ) -> typing.Iterator[tuple[str, datetime.datetime]]:
+        return self.backend.list_certificates()
+
+    # leases must never be served from the cache
+    def acquire_lease(self, name: str, owner: str, ttl: float | None = None) -> bool:
+        return self.backend.acquire_lease(name, owner, ttl)
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self.backend.release_lease(name, owner)
+
+    def set_validation(self, key: str, value: bytes) -> None:
+        self.backend.set_validation(key, value)  # type: ignore[attr-defined]
+
+    def del_validation(self, key: str) -> None:
+        self.backend.del_validation(key)  # type: ignore[attr-defined]
@@ -0,0 +1,137 @@
+"""Shared HTTP transport for ACME clients.
+
+`acme.client.ClientNetwork` opens its own `requests` session, every
+`build_client` call would repeat TCP and TLS handshakes to the CA. Clients
+built by `acme_serverless_client.client` use one pooled session per process
+instead, tune it at startup:
+
+    set_transport(Transport(pool_maxsize=64, retries=5))
+
+or `set_transport(None)` to get a session per client back.
+"""
+
+from __future__ import annotations
+
+import threading
+import typing
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if typing.TYPE_CHECKING:
+    import acme.client
+
+
+class SharedSession(requests.Session):
+    """Session that survives `ClientNetwork.__del__` closing it."""
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        super().close()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """Adapter applying its own timeout to every request.
+
+    `ClientNetwork` passes its fixed default timeout to each request, the
+    adapter of the shared session replaces it.
+    """
+
+    def __init__(self, *args: typing.Any, timeout: float, **kwargs: typing.Any) -> None:
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(
+        self, request: requests.PreparedRequest, *args: typing.Any, **kwargs: typing.Any
+    ) -> requests.Response:
+        # `Session.send` passes everything but the request by keyword
+        kwargs["timeout"] = self.timeout
+        return super().send(request, *args, **kwargs)
+
+
+class Transport:
+    def __init__(
+        self,
+        *,
+        pool_connections: int = 4,
+        pool_maxsize: int = 32,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 45,
+    ) -> None:
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._session: SharedSession | None = None
+        self._lock = threading.Lock()
+
+    def retry(self) -> Retry:
+        # Connection errors are retried for every method, the request never
+        # reached the CA. Responses are only retried for GET/HEAD as a
+        # replayed POST would be rejected with badNonce, 429/503 are left to
+        # `ratelimit.RateLimiter`.
+        return Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=0,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(500, 502, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+
+    def create_session(self) -> SharedSession:
+        session = SharedSession()
+        adapter = TimeoutHTTPAdapter(
+            timeout=self.timeout,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=self.retry(),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    @property
+    def session(self) -> SharedSession:
+        with self._lock:
+            if self._session is None:
+                self._session = self.create_session()
+            return self._session
+
+    def attach(self, net: acme.client.ClientNetwork) -> None:
+        net.session.close()
+        net.session = self.session
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.shutdown()
+                self._session = None
+
+
+_transport: Transport | None = Transport()
+
+
+def get_transport() -> Transport | None:
+    return _transport
+
+
+def set_transport(transport: Transport | None) -> None:
+    global _transport  # noqa: PLW0603
+    if _transport is not None and _transport is not transport:
+        _transport.close()
+    _transport = transport
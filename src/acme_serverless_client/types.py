@@ -1,3 +1,6 @@
 import typing
 
 Challenge = typing.Literal["HTTP01", "DNS01"]
+
+# Progress of a single certificate order, reported through `perform(checkpoint=...)`
+OrderState = typing.Literal["ordered", "challenges_ready", "finalized", "saved"]
@@ -20,71 +20,6 @@ from urllib3.exceptions import InsecureRequestWarning
 from acme_serverless_client.storage.aws import S3Storage
 
 
-# Patch moto's CertBundle to handle certificates without CN (modern certs use SANs only)
-def _patch_moto_certbundle():
-    from cryptography.x509.oid import NameOID
-    from moto.acm import models as acm_models
-
-    def new_init(
-        self,
-        account_id,
-        certificate,
-        private_key,
-        chain=None,
-        region="us-east-1",
-        arn=None,
-        cert_type="IMPORTED",
-        cert_status="ISSUED",
-        cert_authority_arn=None,
-        cert_options=None,
-    ):
-        from moto.acm.models import AWS_ROOT_CA, TagHolder, make_arn_for_certificate
-
-        self.created_at = acm_models.utcnow()
-        self.cert = certificate
-        self.key = private_key
-        self.chain = chain + b"\n" + AWS_ROOT_CA if chain else AWS_ROOT_CA
-        self.tags = TagHolder()
-        self.type = cert_type
-        self.status = cert_status
-        self.cert_authority_arn = cert_authority_arn
-        self.in_use_by = []
-        self.cert_options = cert_options or {
-            "CertificateTransparencyLoggingPreference": "ENABLED",
-            "Export": "DISABLED",
-        }
-
-        self._key = self.validate_pk()
-        self._cert = self.validate_certificate()
-
-        # Handle certificates without CN (modern certs use SANs only)
-        cn_attrs = self._cert.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
-        if cn_attrs:
-            self.common_name = cn_attrs[0].value
-        else:
-            # Fall back to first SAN DNS name
-            try:
-                from cryptography import x509
-
-                san_ext = self._cert.extensions.get_extension_for_class(
-                    x509.SubjectAlternativeName
-                )
-                dns_names = san_ext.value.get_values_for_type(x509.DNSName)
-                self.common_name = dns_names[0] if dns_names else "unknown"
-            except Exception:
-                self.common_name = "unknown"
-
-        if chain is not None:
-            self.validate_chain()
-
-        self.arn = arn or make_arn_for_certificate(account_id, region)
-
-    acm_models.CertBundle.__init__ = new_init
-
-
-_patch_moto_certbundle()
-
-
 @pytest.fixture(scope="session")
 def minio_settings(tmpdir_factory):
     return {
@@ -98,7 +33,12 @@ def minio_settings(tmpdir_factory):
 
 @pytest.fixture(scope="session")
 def pebble_settings(tmpdir_factory):
-    return {"DIRECTORY_PORT": 14000, "HTTP_PORT": 5002, "DNS_PORT": 8053}
+    return {
+        "DIRECTORY_PORT": 14000,
+        "MANAGEMENT_PORT": 15000,
+        "HTTP_PORT": 5002,
+        "DNS_PORT": 8053,
+    }
 
 
 @pytest.fixture(scope="session")
@@ -156,9 +96,7 @@ def acme_directory_url(pebble_settings):
     return f"https://127.0.0.1:{pebble_settings['DIRECTORY_PORT']}/dir"
 
 
-@pytest.fixture(scope="session")
-def pebble_config(tmpdir_factory, pebble_settings, read_fixture):
-    d = tmpdir_factory.mktemp("pebble")
+def write_pebble_config(d, settings, read_fixture):
     config = d.join("pebble-config.json")
     cert = d.join("cert.pem")
     key = d.join("key.pem")
@@ -168,11 +106,11 @@ def pebble_config(tmpdir_factory, pebble_settings, read_fixture):
         json.dumps(
             {
                 "pebble": {
-                    "listenAddress": f"0.0.0.0:{pebble_settings['DIRECTORY_PORT']}",
-                    "managementListenAddress": "0.0.0.0:15000",
+                    "listenAddress": f"0.0.0.0:{settings['DIRECTORY_PORT']}",
+                    "managementListenAddress": f"0.0.0.0:{settings['MANAGEMENT_PORT']}",
                     "certificate": str(cert),
                     "privateKey": str(key),
-                    "httpPort": pebble_settings["HTTP_PORT"],
+                    "httpPort": settings["HTTP_PORT"],
                     "tlsPort": 5001,
                     "ocspResponderURL": "",
                     "externalAccountBindingRequired": False,
@@ -183,6 +121,26 @@ def pebble_config(tmpdir_factory, pebble_settings, read_fixture):
     return str(config)
 
 
+@pytest.fixture(scope="session")
+def pebble_config(tmpdir_factory, pebble_settings, read_fixture):
+    return write_pebble_config(
+        tmpdir_factory.mktemp("pebble"), pebble_settings, read_fixture
+    )
+
+
+@pytest.fixture(scope="session")
+def pebble2_settings(pebble_settings):
+    """Second CA for failover tests, validates through the same load balancer."""
+    return {**pebble_settings, "DIRECTORY_PORT": 14001, "MANAGEMENT_PORT": 15001}
+
+
+@pytest.fixture(scope="session")
+def pebble2_config(tmpdir_factory, pebble2_settings, read_fixture):
+    return write_pebble_config(
+        tmpdir_factory.mktemp("pebble2"), pebble2_settings, read_fixture
+    )
+
+
 @pytest.fixture
 def disable_ssl(monkeypatch: typing.Any) -> typing.Iterator[None]:
     import acme.client
@@ -312,25 +270,35 @@ def bucket(s3, minio_settings):
     return S3Storage.Bucket(name, s3)
 
 
-@pytest.fixture()
-def pebble(pebble_settings, pebble_config) -> typing.Iterator[None]:
+def run_pebble(settings, config) -> typing.Iterator[subprocess.Popen]:
     proc = subprocess.Popen(
         [
             "pebble",
             "-config",
-            pebble_config,
+            config,
             "-strict",
             "-dnsserver",
-            f"127.0.0.1:{pebble_settings['DNS_PORT']}",
+            f"127.0.0.1:{settings['DNS_PORT']}",
         ]
     )
     try:
-        await_port(pebble_settings["DIRECTORY_PORT"])
-        yield
+        await_port(settings["DIRECTORY_PORT"])
+        yield proc
     finally:
         proc.terminate()
 
 
+@pytest.fixture()
+def pebble(pebble_settings, pebble_config) -> typing.Iterator[None]:
+    for _ in run_pebble(pebble_settings, pebble_config):
+        yield
+
+
+@pytest.fixture()
+def pebble2(pebble2_settings, pebble2_config) -> typing.Iterator[subprocess.Popen]:
+    yield from run_pebble(pebble2_settings, pebble2_config)
+
+
 @pytest.fixture(scope="session")
 def challtestsrv(pebble_settings) -> typing.Iterator[None]:
     proc = subprocess.Popen(
@@ -0,0 +1,116 @@
+import collections
+from unittest import mock
+
+import acme.messages
+import pytest
+from acme import errors
+
+from acme_serverless_client import client
+from acme_serverless_client.accounts import (
+    RegisteredDomainPolicy,
+    RoundRobinPolicy,
+    account_cache,
+)
+from acme_serverless_client.models import Account, Certificate
+
+from .test_client import PARAMS
+from .test_storage import FULLCHAIN_PEM, FakeStorage
+
+
+@pytest.fixture
+def build_client(monkeypatch):
+    account_cache.clear()
+    build_client = mock.Mock()
+    build_client.return_value.new_account.return_value = (
+        acme.messages.RegistrationResource(
+            body=acme.messages.Registration(), uri="https://ca.invalid/acct/1"
+        )
+    )
+    monkeypatch.setattr(client, "build_client", build_client)
+    yield build_client
+    account_cache.clear()
+
+
+def test_named_accounts():
+    storage = FakeStorage()
+    account = Account(
+        regr=acme.messages.RegistrationResource(
+            body=acme.messages.Registration.from_json({"a": "b"}),
+            uri="https://ca.invalid/acct/1",
+        )
+    )
+    storage.set_account(account, "acme-1")
+    assert set(storage._data) == {"accounts/acme-1.json"}
+    assert storage.get_account("acme-1") == account
+    assert storage.get_account() is None
+    assert storage.get_account("acme-2") is None
+
+
+def test_round_robin_policy():
+    policy = RoundRobinPolicy(["a", "b"])
+    assert [policy.select(["my.com"]) for _ in range(3)] == ["a", "b", "a"]
+
+
+def test_registered_domain_policy():
+    policy = RegisteredDomainPolicy([f"acme-{i}" for i in range(4)])
+    assert policy.select(["www.my.com"]) == policy.select(["*.my.com", "other.org"])
+    spread = collections.Counter(policy.select([f"domain{i}.com"]) for i in range(1000))
+    assert set(spread) == set(policy.names)
+    assert min(spread.values()) > 150
+
+
+def test_setup_client_registers_and_caches_accounts(build_client):
+    storage = FakeStorage()
+    client.setup_client(storage, "fake@example.com", "https://ca.invalid/dir", "a")
+    assert build_client.return_value.new_account.call_count == 1
+    account = storage.get_account("a")
+    assert account.regr.uri == "https://ca.invalid/acct/1"
+
+    with mock.patch.object(storage, "_get", side_effect=AssertionError):
+        client.setup_client(storage, "fake@example.com", "https://ca.invalid/dir", "a")
+    assert build_client.call_args[0][0] is build_client.call_args_list[0][0][0]
+
+    client.setup_client(storage, "fake@example.com", "https://ca.invalid/dir", "b")
+    assert build_client.return_value.new_account.call_count == 2
+    assert storage.get_account("b") is not None
+
+
+def test_perform_spreads_orders_and_resumes_with_order_account(monkeypatch):
+    accounts = []
+    acme_client = mock.Mock()
+    acme_client.new_order.return_value = acme.messages.OrderResource(
+        body=acme.messages.Order(authorizations=[]),
+        uri="https://ca.invalid/order/1",
+        authorizations=[],
+    )
+    acme_client.poll_and_finalize.side_effect = errors.TimeoutError()
+
+    def setup_client(**kwargs):
+        accounts.append(kwargs["account_name"])
+        return acme_client
+
+    monkeypatch.setattr(client, "setup_client", setup_client)
+    storage = FakeStorage()
+    policy = RoundRobinPolicy(["a", "b"])
+    for domain in ("one.com", "two.com"):
+        with pytest.raises(errors.TimeoutError):
+            client.issue(
+                domains=[domain], storage=storage, account_policy=policy, **PARAMS
+            )
+    assert accounts == ["a", "b"]
+    assert storage.get_order("two.com")["account"] == "b"
+
+    acme_client._post_as_get.side_effect = acme.messages.Error()
+    with pytest.raises(errors.TimeoutError):
+        client.issue(
+            domains=["two.com"], storage=storage, account_policy=policy, **PARAMS
+        )
+    assert accounts[-1] == "b"
+
+
+def test_certificate_account_is_stored():
+    storage = FakeStorage()
+    certificate = Certificate(["my.com"], b"key", account_name="acme-1")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    assert storage.get_certificate(name="my.com").account_name == "acme-1"
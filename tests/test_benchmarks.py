@@ -0,0 +1,27 @@
+from benchmarks import encoding, issuance
+
+
+def test_issuance_benchmark_smoke():
+    report = issuance.run(["--certificates", "2", "--sans", "2", "--concurrency", "2"])
+    results = {r["operation"]: r for r in report["results"]}
+    assert set(results) == {"issue", "find_certificates_to_renew", "renew", "revoke"}
+    assert results["issue"]["count"] == 2
+    assert results["issue"]["acme_calls"]["new_order"] == 2
+    assert results["issue"]["acme_calls"]["answer_challenge"] == 4
+    assert results["renew"]["count"] == 2
+    assert results["revoke"]["storage_calls"]["_del"] == 10
+    assert (
+        results["find_certificates_to_renew"]["storage_calls"]["list_certificates"] == 1
+    )
+
+
+def test_encoding_benchmark_smoke():
+    report = encoding.run(["--iterations", "2", "--codecs", "zlib,aes256gcm"])
+    results = {(r["codec"], r["payload"]): r for r in report["results"]}
+    assert set(results) == {
+        (codec, payload)
+        for codec in ("zlib", "aes256gcm")
+        for payload in ("bundle", "key")
+    }
+    assert results["zlib", "bundle"]["ratio"] < 1
+    assert results["aes256gcm", "key"]["ratio"] > 1
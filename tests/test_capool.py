@@ -0,0 +1,110 @@
+from unittest import mock
+
+import pytest
+import requests
+from acme import errors, messages
+
+from acme_serverless_client import client
+from acme_serverless_client.capool import (
+    CAPool,
+    CertificateAuthority,
+    is_failover_error,
+)
+
+from .test_client import PARAMS
+from .test_storage import FakeStorage
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def pool():
+    return CAPool(
+        [
+            CertificateAuthority("a", "https://a.invalid/dir"),
+            CertificateAuthority("b", "https://b.invalid/dir"),
+        ],
+        clock=Clock(),
+    )
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    acme_client = mock.Mock()
+    acme_client.new_order.return_value = messages.OrderResource(
+        body=messages.Order(authorizations=[]),
+        uri="https://b.invalid/order/1",
+        authorizations=[],
+    )
+    acme_client.poll_and_finalize.side_effect = errors.TimeoutError()
+    acme_client._post_as_get.side_effect = messages.Error()
+
+    def setup_client(**kwargs):
+        calls.append((kwargs["directory_url"], kwargs["account_name"]))
+        if kwargs["directory_url"].startswith("https://a."):
+            raise requests.ConnectionError()
+        return acme_client
+
+    monkeypatch.setattr(client, "setup_client", setup_client)
+    return calls
+
+
+def test_is_failover_error():
+    assert is_failover_error(requests.ConnectionError())
+    assert is_failover_error(messages.Error.with_code("serverInternal"))
+    assert is_failover_error(messages.Error.with_code("rateLimited"))
+    assert not is_failover_error(messages.Error.with_code("rejectedIdentifier"))
+    assert not is_failover_error(errors.ConflictError("location"))
+    assert not is_failover_error(ValueError())
+
+
+def test_candidates_order(pool):
+    a, b = pool.get("a"), pool.get("b")
+    pool.record_success(a, 2.0)
+    pool.record_success(b, 1.0)
+    assert pool.candidates() == [b, a]
+    assert pool.candidates(preferred=a) == [a, b]
+    pool.record_success(b, 5.0)
+    assert pool._latency["b"] == pytest.approx(2.2)
+    assert pool.candidates() == [a, b]
+    pool.record_failure(b)
+    assert pool.candidates() == [a, b]
+    assert pool.candidates(preferred=b) == [a, b]
+    pool.clock.now = pool.cooldown
+    assert pool.is_healthy(b)
+
+
+def test_perform_fails_over(pool, calls):
+    storage = FakeStorage()
+    with pytest.raises(errors.TimeoutError):
+        client.issue(domains=["one.com"], storage=storage, ca_pool=pool, **PARAMS)
+    assert calls == [("https://a.invalid/dir", "a"), ("https://b.invalid/dir", "b")]
+    order = storage.get_order("one.com")
+    assert order["account"] == "b"
+    assert order["directory_url"] == "https://b.invalid/dir"
+
+    # the failed CA is skipped during its cooldown
+    calls.clear()
+    with pytest.raises(errors.TimeoutError):
+        client.issue(domains=["two.com"], storage=storage, ca_pool=pool, **PARAMS)
+    assert calls == [("https://b.invalid/dir", "b")]
+
+    # and probed again after it, the persisted order stays with its CA
+    pool.clock.now = pool.cooldown
+    calls.clear()
+    with pytest.raises(errors.TimeoutError):
+        client.issue(domains=["one.com"], storage=storage, ca_pool=pool, **PARAMS)
+    assert calls == [("https://b.invalid/dir", "b")]
+    with pytest.raises(errors.TimeoutError):
+        client.issue(domains=["three.com"], storage=storage, ca_pool=pool, **PARAMS)
+    assert calls[1:] == [
+        ("https://a.invalid/dir", "a"),
+        ("https://b.invalid/dir", "b"),
+    ]
+    assert pool._unhealthy_until["a"] == pool.cooldown * 3
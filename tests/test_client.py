@@ -0,0 +1,175 @@
+from unittest import mock
+
+import pytest
+import time_machine
+from acme import errors, messages
+
+from acme_serverless_client import client, crypto
+from acme_serverless_client.helpers import find_certificates_to_renew
+from acme_serverless_client.models import Certificate
+
+from .test_jobs import ListingStorage
+from .test_storage import FULLCHAIN_PEM, FakeStorage
+
+PARAMS = {
+    "acme_account_email": "fake@example.com",
+    "acme_directory_url": "https://ca.invalid/dir",
+    "authenticators": [],
+}
+
+
+@pytest.fixture
+def acme_client(monkeypatch):
+    acme_client = mock.Mock()
+
+    def new_order(csr_pem):
+        return messages.OrderResource(
+            body=messages.Order(status=messages.STATUS_PENDING, authorizations=[]),
+            uri="https://ca.invalid/order/1",
+            authorizations=[],
+            csr_pem=csr_pem,
+        )
+
+    acme_client.new_order.side_effect = new_order
+    monkeypatch.setattr(client, "setup_client", lambda **kwargs: acme_client)
+    return acme_client
+
+
+def test_perform_resumes_persisted_order(acme_client):
+    storage = FakeStorage()
+    acme_client.poll_and_finalize.side_effect = errors.TimeoutError()
+    with pytest.raises(errors.TimeoutError):
+        client.issue(domains=["my.com"], storage=storage, **PARAMS)
+    order = storage.get_order("my.com")
+    assert order["order_url"] == "https://ca.invalid/order/1"
+    assert order["domains"] == ["my.com"]
+    assert order["csr"].startswith("-----BEGIN CERTIFICATE REQUEST-----")
+
+    acme_client._post_as_get.return_value.json.return_value = {
+        "status": "ready",
+        "identifiers": [{"type": "dns", "value": "my.com"}],
+        "authorizations": [],
+        "finalize": "https://ca.invalid/order/1/finalize",
+    }
+    acme_client.poll_and_finalize.side_effect = lambda orderr: orderr.update(
+        fullchain_pem=FULLCHAIN_PEM.decode()
+    )
+    client.issue(domains=["my.com"], storage=storage, **PARAMS)
+    assert acme_client.new_order.call_count == 1
+    acme_client._post_as_get.assert_called_once_with("https://ca.invalid/order/1")
+    orderr = acme_client.poll_and_finalize.call_args[0][0]
+    assert orderr.csr_pem == order["csr"].encode()
+    certificate = storage.get_certificate(name="my.com")
+    assert certificate.private_key == order["private_key"].encode()
+    assert storage.get_order("my.com") is None
+
+
+def test_perform_replaces_invalid_order(acme_client):
+    storage = FakeStorage()
+    storage.set_order(
+        "my.com",
+        {
+            "domains": ["my.com"],
+            "order_url": "https://ca.invalid/order/0",
+            "authorizations": [],
+            "csr": "csr",
+            "private_key": Certificate.generate_private_key().decode(),
+        },
+    )
+    acme_client._post_as_get.return_value.json.return_value = {
+        "status": "invalid",
+        "authorizations": [],
+    }
+    acme_client.poll_and_finalize.side_effect = errors.TimeoutError()
+    with pytest.raises(errors.TimeoutError):
+        client.issue(domains=["my.com"], storage=storage, **PARAMS)
+    assert acme_client.new_order.call_count == 1
+    assert storage.get_order("my.com")["order_url"] == "https://ca.invalid/order/1"
+
+
+@time_machine.travel("2020-02-20")
+def test_prestaged_renewal(acme_client, monkeypatch):
+    storage = ListingStorage()
+    certificate = Certificate(
+        ["my.com"], private_key=Certificate.generate_private_key()
+    )
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    # valid after 2020-01-01, due on 2020-03-01
+    assert list(find_certificates_to_renew(storage, 60, prestage_days=5)) == []
+    assert storage.get_pending("my.com") is None
+    assert list(find_certificates_to_renew(storage, 60, prestage_days=10)) == []
+    pending = storage.get_pending("my.com")
+    assert pending["private_key"] == certificate.private_key.decode()
+
+    storage.del_pending("my.com")
+    list(find_certificates_to_renew(storage, 60, prestage_days=10, rotate_keys=True))
+    pending = storage.get_pending("my.com")
+    assert pending["private_key"] != certificate.private_key.decode()
+
+    acme_client.poll_and_finalize.side_effect = errors.TimeoutError()
+    with (
+        mock.patch.object(crypto, "make_csr", side_effect=AssertionError),
+        pytest.raises(errors.TimeoutError),
+    ):
+        client.renew(certificate=certificate, storage=storage, **PARAMS)
+    assert acme_client.new_order.call_args[0][0] == pending["csr"].encode()
+    assert storage.get_order("my.com")["private_key"] == pending["private_key"]
+    assert storage.get_pending("my.com") is None
+
+
+def test_revoke_many(read_fixture, monkeypatch):
+    storage = ListingStorage()
+    storage.change_log = True
+    leaf = read_fixture("localhost/cert.pem")
+    certificates = []
+    for name in ("a.com", "b.com", "c.com"):
+        certificate = Certificate([name], b"key", account_name="acme-0")
+        certificate.set_fullchain(leaf + b"\n" + read_fixture("moto/fullchain.pem"))
+        storage.save_certificate(certificate)
+        certificates.append(certificate)
+    removed = []
+
+    def notify(event, certificate):
+        removed.append((event, certificate.name))
+        if certificate.name == "b.com":
+            raise RuntimeError("ResourceInUseException")
+
+    storage.subscribe(mock.Mock(notify=notify))
+
+    acme_client = mock.Mock()
+    outcomes = {
+        "b.com": errors.ConflictError("already revoked"),
+        "c.com": messages.Error.with_code("serverInternal"),
+    }
+    # the certificates share a leaf, tell them apart by the parsed object
+    names = {id(c.x509): c.name for c in certificates}
+
+    def revoke(cert, rsn):
+        assert rsn == 1
+        if names[id(cert)] in outcomes:
+            raise outcomes[names[id(cert)]]
+
+    acme_client.revoke.side_effect = revoke
+    setup_client = mock.Mock(return_value=acme_client)
+    monkeypatch.setattr(client, "setup_client", setup_client)
+
+    result = client.revoke_many(
+        certificates=certificates,
+        storage=storage,
+        acme_account_email=PARAMS["acme_account_email"],
+        acme_directory_url=PARAMS["acme_directory_url"],
+        reason=1,
+    )
+    assert result == {"a.com": "revoked", "b.com": "cleanup_failed", "c.com": "failed"}
+    assert setup_client.call_count == 1
+    assert setup_client.call_args.kwargs["account_name"] == "acme-0"
+    assert sorted(removed) == [
+        ("remove_certificate", "a.com"),
+        ("remove_certificate", "b.com"),
+    ]
+    assert [name for name, _ in storage.list_certificates()] == ["c.com"]
+    assert not any(
+        key.startswith(("keys/a.com", "configs/b.com")) for key in storage._data
+    )
+    assert sorted(c["name"] for c in storage.changes_since(3)) == ["a.com", "b.com"]
@@ -7,6 +7,7 @@ from cryptography.hazmat.backends import default_backend
 from acme_serverless_client import issue, renew, revoke
 from acme_serverless_client.authenticators.dns_route_53 import Route53Authenticator
 from acme_serverless_client.authenticators.http import HTTP01Authenticator
+from acme_serverless_client.capool import CAPool, CertificateAuthority
 from acme_serverless_client.storage.aws import ACMStorageObserver, S3Storage
 
 
@@ -106,3 +107,33 @@ def test_san_mixed(
     assert [x.value for x in sans] == domains
     valid_from = cert.not_valid_before_utc
     assert datetime.now(timezone.utc) > valid_from
+
+
+def test_ca_pool_failover(
+    minio_bucket, full_infra, pebble2, acme_directory_url, pebble2_settings
+):
+    storage = S3Storage(bucket=minio_bucket)
+    pool = CAPool(
+        [
+            CertificateAuthority(
+                "pebble2",
+                f"https://127.0.0.1:{pebble2_settings['DIRECTORY_PORT']}/dir",
+            ),
+            CertificateAuthority("pebble", acme_directory_url),
+        ]
+    )
+    params = {
+        "storage": storage,
+        "acme_directory_url": acme_directory_url,
+        "acme_account_email": "fake@example.com",
+        "authenticators": [HTTP01Authenticator(storage=storage)],
+        "ca_pool": pool,
+    }
+    issue(domains=["pool1.example.com"], **params)
+    assert storage.get_certificate(name="pool1.example.com").account_name == "pebble2"
+
+    pebble2.terminate()
+    pebble2.wait()
+    issue(domains=["pool2.example.com"], **params)
+    assert storage.get_certificate(name="pool2.example.com").account_name == "pebble"
+    assert not pool.is_healthy(pool.get("pebble2"))
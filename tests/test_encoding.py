@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from acme_serverless_client.models import Certificate
+from acme_serverless_client.storage import encoding
+from acme_serverless_client.storage.encoding import StorageCodec, is_encoded
+from acme_serverless_client.storage.tiered import FileSystemCache, TieredStorage
+
+from .test_storage import FULLCHAIN_PEM, FakeStorage
+
+KEK = os.urandom(32)
+
+
+def has_zstd():
+    try:
+        encoding._zstd()
+    except RuntimeError:
+        return False
+    return True
+
+
+@pytest.fixture
+def certificate():
+    certificate = Certificate(["my.com"], b"private key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    return certificate
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [
+        "zlib",
+        pytest.param(
+            "zstd", marks=pytest.mark.skipif(not has_zstd(), reason="no zstd")
+        ),
+    ],
+)
+def test_roundtrip(compression):
+    codec = StorageCodec(compression=compression, keks={"k1": KEK})
+    data = FULLCHAIN_PEM * 2
+    for compress, encrypt in [(True, False), (False, True), (True, True)]:
+        encoded = codec.encode("name", data, compress=compress, encrypt=encrypt)
+        assert is_encoded(encoded)
+        assert codec.decode("name", encoded) == data
+    assert len(codec.encode("name", data, compress=True, encrypt=False)) < len(data)
+    # nothing to do, or nothing gained, leaves the data as is
+    assert codec.encode("name", data, compress=False, encrypt=False) == data
+    assert codec.encode("name", b"{}", compress=True, encrypt=False) == b"{}"
+
+
+def test_encryption():
+    codec = StorageCodec(keks={"k1": KEK})
+    encoded = codec.encode("keys/my.com", b"secret", compress=False, encrypt=True)
+    assert b"secret" not in encoded
+    with pytest.raises(RuntimeError, match="Failed to decrypt"):
+        codec.decode("keys/other.com", encoded)
+    with pytest.raises(RuntimeError, match="Failed to decrypt"):
+        StorageCodec(keks={"k1": os.urandom(32)}).decode("keys/my.com", encoded)
+    with pytest.raises(RuntimeError, match="Unknown key encryption key 'k1'"):
+        StorageCodec(encrypt=False).decode("keys/my.com", encoded)
+
+    # rotation: the new KEK encrypts, the old one still decrypts
+    rotated = StorageCodec(keks={"k2": os.urandom(32), "k1": KEK})
+    assert rotated.decode("keys/my.com", encoded) == b"secret"
+    assert b"k2" in rotated.encode(
+        "keys/my.com", b"secret", compress=False, encrypt=True
+    )
+
+
+def test_codec_validation():
+    with pytest.raises(ValueError, match="encrypt=False"):
+        StorageCodec()
+    with pytest.raises(ValueError, match="must be 32 bytes"):
+        StorageCodec(keks={"k1": b"short"})
+    with pytest.raises(ValueError, match="Unknown compression"):
+        StorageCodec(compression="lz4", encrypt=False)
+    codec = StorageCodec(keks={"k1": KEK}, encrypt=False)
+    assert codec.encode("keys/my.com", b"key", compress=False, encrypt=True) == b"key"
+
+
+def test_storage_codec(certificate):
+    storage = FakeStorage()
+    storage.save_certificate(certificate)
+    plain = dict(storage._data)
+
+    storage.codec = StorageCodec(keks={"k1": KEK})
+    # objects written without a codec are still readable
+    assert storage.get_certificate(name="my.com").fullchain == certificate.fullchain
+    storage.save_certificate(certificate)
+    assert is_encoded(storage._data["keys/my.com"])
+    assert is_encoded(storage._data["certificates/my.com"])
+    assert storage._data["configs/my.com"] == plain["configs/my.com"]
+    loaded = storage.get_certificate(name="my.com")
+    assert loaded.private_key == b"private key"
+    assert loaded.fullchain == certificate.fullchain
+
+    # compressed objects don't need the codec, keys do
+    storage.codec = None
+    with pytest.raises(RuntimeError, match="Unknown key encryption key"):
+        storage.get_certificate(name="my.com")
+
+
+def test_storage_codec_compare_and_swap():
+    storage = FakeStorage()
+    storage.codec = StorageCodec(keks={"k1": KEK})
+    storage._update("orders/my.com", lambda order: {"n": 1})
+    storage._update("orders/my.com", lambda order: {"n": order["n"] + 1})
+    assert is_encoded(storage._data["orders/my.com"])
+    assert storage.get_order("my.com") == {"n": 2}
+
+
+def test_tiered_storage_decodes_backend(certificate):
+    backend = FakeStorage()
+    backend.codec = StorageCodec(keks={"k1": KEK})
+    storage = TieredStorage(backend)
+    storage.save_certificate(certificate)
+    assert is_encoded(backend._data["keys/my.com"])
+    storage.cache.delete("keys/my.com")
+    assert storage.get_certificate(name="my.com").private_key == b"private key"
+
+
+def test_tiered_cache_keeps_encrypted_objects_encrypted(certificate, tmp_path):
+    backend = FakeStorage()
+    backend.codec = StorageCodec(keks={"k1": KEK})
+    storage = TieredStorage(backend, cache=FileSystemCache(str(tmp_path)))
+    storage.save_certificate(certificate)
+    assert storage.get_certificate(name="my.com").private_key == b"private key"
+    storage.cache.delete("keys/my.com")
+    assert storage.get_certificate(name="my.com").private_key == b"private key"
+    files = [path.read_bytes() for path in tmp_path.rglob("*") if path.is_file()]
+    assert files
+    assert not any(b"private key" in data for data in files)
@@ -0,0 +1,107 @@
+import datetime
+import json
+import os
+import pathlib
+import urllib.parse
+
+from acme_serverless_client import client, fanout
+from acme_serverless_client.models import Certificate
+from acme_serverless_client.storage.base import BaseStorage
+
+from .test_jobs import PARAMS, ListingStorage
+
+
+class DirectoryStorage(BaseStorage):
+    """Storage shared between the test and worker subprocesses."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = pathlib.Path(path)
+
+    def _file(self, key):
+        return self.path / urllib.parse.quote(key, safe="")
+
+    def _get(self, key):
+        try:
+            return self._file(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _set(self, key, data):
+        self._file(key).write_bytes(data)
+
+    def list_certificates(self):
+        prefix = urllib.parse.quote(self.certificate_prefix, safe="")
+        for file in self.path.iterdir():
+            if file.name.startswith(prefix):
+                yield (
+                    urllib.parse.unquote(file.name)[len(self.certificate_prefix) :],
+                    datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+                )
+
+
+def worker_factory():
+    """Used by worker subprocesses, renews without talking to a CA."""
+
+    def renew(*, certificate, storage, checkpoint, **kwargs):
+        certificate.set_fullchain(b"renewed-----END CERTIFICATE-----\nchain")
+        storage.save_certificate(certificate)
+        checkpoint("saved")
+
+    client.renew = renew
+    return {"storage": DirectoryStorage(os.environ["FANOUT_STORAGE"]), **PARAMS}
+
+
+def save(storage, names):
+    for name in names:
+        certificate = Certificate([name], private_key=b"key")
+        certificate.set_fullchain(b"cert-----END CERTIFICATE-----\nchain")
+        storage.save_certificate(certificate)
+
+
+def test_partition_is_consistent():
+    names = [f"host{i}.example.com" for i in range(1000)]
+    shards = fanout.partition(names, 8)
+    assert sorted(name for shard in shards for name in shard) == sorted(names)
+    assert all(60 < len(shard) < 200 for shard in shards)
+    before = {name: i for i, shard in enumerate(shards) for name in shard}
+    after = {
+        name: i for i, shard in enumerate(fanout.partition(names, 9)) for name in shard
+    }
+    moved = sum(before[name] != after[name] for name in names)
+    assert moved < len(names) / 4
+
+
+def test_plan_and_run_shards(monkeypatch):
+    storage = ListingStorage()
+    save(storage, [f"host{i}.com" for i in range(10)])
+    renewed = []
+
+    def renew(*, certificate, checkpoint, **kwargs):
+        renewed.append(certificate.name)
+        checkpoint("saved")
+
+    monkeypatch.setattr(client, "renew", renew)
+    descriptors = fanout.plan(storage, 3, run_id="run1")
+    assert [d["shard"] for d in descriptors] == [0, 1, 2]
+    assert json.loads(json.dumps(descriptors)) == descriptors
+    results = [
+        fanout.run_shard(d, storage=storage, **PARAMS)
+        for d in descriptors + descriptors
+    ]
+    total = fanout.aggregate(results)
+    assert total["shards"] == 6
+    assert sorted(total["saved"]) == sorted(renewed)
+    assert len(renewed) == 10
+
+
+def test_run_local_subprocesses(tmp_path, monkeypatch):
+    monkeypatch.setenv("FANOUT_STORAGE", str(tmp_path))
+    storage = DirectoryStorage(tmp_path)
+    names = [f"host{i}.com" for i in range(6)]
+    save(storage, names)
+    descriptors = fanout.plan(storage, 2, run_id="run1")
+    total = fanout.run_local(descriptors, "tests.test_fanout:worker_factory")
+    assert total["shards"] == 2
+    assert sorted(total["saved"]) == sorted(names)
+    assert storage.get_certificate(name="host0.com").certificate.startswith(b"renewed")
@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+# cumulative microseconds reported by `python -X importtime`
+IMPORT_TIME_BUDGET_US = 50_000
+HEAVY_MODULES = ("acme", "josepy", "cryptography", "requests", "botocore")
+
+
+def run_python(code):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def package_import_time(stderr, module):
+    for line in stderr.splitlines():
+        _, _, cumulative, name = (
+            part.strip() for part in line.replace("|", ":").split(":")
+        )
+        if name == module:
+            return int(cumulative)
+    raise AssertionError(f"{module} not found in importtime output")
+
+
+def test_import_is_lazy():
+    result = run_python(
+        "import sys, acme_serverless_client, acme_serverless_client.helpers, "
+        "acme_serverless_client.storage.tiered, acme_serverless_client.authenticators.http, "
+        "acme_serverless_client.sni;"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_lazy_attributes_resolve():
+    result = run_python(
+        "import acme_serverless_client as a; print(a.issue.__module__, "
+        "a.find_certificates_to_renew.__module__)"
+    )
+    assert result.stdout.split() == [
+        "acme_serverless_client.client",
+        "acme_serverless_client.helpers",
+    ]
+
+
+def test_import_time_budget():
+    timings = [
+        package_import_time(
+            run_python("import acme_serverless_client").stderr, "acme_serverless_client"
+        )
+        for _ in range(3)
+    ]
+    assert min(timings) < IMPORT_TIME_BUDGET_US
@@ -0,0 +1,109 @@
+from unittest import mock
+
+import pytest
+
+from acme_serverless_client import instrumentation
+from acme_serverless_client.authenticators.dns_route_53 import Route53Authenticator
+from acme_serverless_client.instrumentation import (
+    AggregatingInstrumentation,
+    OpenTelemetryInstrumentation,
+)
+from acme_serverless_client.models import Certificate
+from acme_serverless_client.storage.tiered import TieredStorage
+
+from .test_storage import FakeStorage
+
+
+@pytest.fixture
+def aggregator():
+    aggregator = AggregatingInstrumentation()
+    instrumentation.set_instrumentation(aggregator)
+    yield aggregator
+    instrumentation.set_instrumentation(None)
+
+
+def test_noop_by_default():
+    assert isinstance(
+        instrumentation.get_instrumentation(), instrumentation.NoopInstrumentation
+    )
+    with instrumentation.span("anything", key="value"):
+        instrumentation.count("anything")
+
+
+def test_aggregator_report(aggregator):
+    for _ in range(3):
+        with instrumentation.span("client.new_order"):
+            pass
+    with pytest.raises(ValueError), instrumentation.span("client.poll_and_finalize"):
+        raise ValueError()
+    instrumentation.count("storage.bytes_read", 10)
+    assert len(aggregator.durations["client.new_order"]) == 3
+    assert aggregator.counters == {
+        "client.poll_and_finalize.errors": 1,
+        "storage.bytes_read": 10,
+    }
+    report = aggregator.report()
+    assert "client.new_order: n=3" in report
+    assert "client.poll_and_finalize: n=1" in report
+    assert "storage.bytes_read: 10" in report
+
+
+def test_storage_spans(aggregator):
+    storage = FakeStorage()
+    storage._del = mock.Mock()
+    certificate = Certificate(["my.com"], private_key=b"key")
+    certificate.set_fullchain(b"randomcert-----END CERTIFICATE-----\nchain")
+    storage.save_certificate(certificate)
+    storage.get_certificate(name="my.com")
+    storage.remove_certificate(certificate)
+    assert len(aggregator.durations["storage._set"]) == 3
+    assert len(aggregator.durations["storage._get"]) == 3
+    assert len(aggregator.durations["storage._del"]) == 5
+    assert (
+        aggregator.counters["storage.bytes_written"]
+        == (aggregator.counters["storage.bytes_read"])
+    )
+
+
+def test_tiered_storage_spans(aggregator):
+    backend = FakeStorage()
+    backend._del = mock.Mock()
+    storage = TieredStorage(backend)
+    storage._write("key", b"data")
+    storage._read("key")
+    storage._delete("key")
+    assert len(aggregator.durations["storage._set"]) == 1
+    # the backend doesn't report the version of the write, which is then
+    # read from the backend
+    assert len(aggregator.durations["storage._get"]) == 2
+    assert len(aggregator.durations["storage._del"]) == 1
+    assert aggregator.counters["storage.bytes_written"] == 4
+
+
+def test_route53_spans(aggregator):
+    r53 = mock.Mock()
+    r53.change_resource_record_sets.return_value = {"ChangeInfo": {"Id": "1"}}
+    r53.get_change.return_value = {"ChangeInfo": {"Status": "INSYNC"}}
+    auth = Route53Authenticator(r53, {"example.com": "ZONEID"})
+    challb = mock.Mock()
+    challb.validation.return_value = "validation"
+    auth.perform([(challb, "example.com")], mock.Mock())
+    assert len(aggregator.durations["route53.change_resource_record_sets"]) == 1
+    assert len(aggregator.durations["route53.get_change"]) == 1
+
+
+def test_opentelemetry_adapter():
+    tracer, meter = mock.MagicMock(), mock.Mock()
+    otel = OpenTelemetryInstrumentation(tracer=tracer, meter=meter)
+    with otel.span("client.new_order", authenticator="HTTP01Authenticator"):
+        pass
+    otel.count("storage.bytes_read", 5)
+    otel.count("storage.bytes_read", 5)
+    tracer.start_as_current_span.assert_called_once_with(
+        "client.new_order", attributes={"authenticator": "HTTP01Authenticator"}
+    )
+    meter.create_histogram.assert_called_once_with(
+        "client.new_order.duration", unit="s"
+    )
+    meter.create_counter.assert_called_once_with("storage.bytes_read")
+    assert meter.create_counter.return_value.add.call_count == 2
@@ -0,0 +1,191 @@
+import datetime
+import hashlib
+
+import pytest
+
+from acme_serverless_client import client
+from acme_serverless_client.jobs import RenewalRun
+from acme_serverless_client.models import Certificate
+from acme_serverless_client.storage.base import StorageConflictError
+
+from .test_storage import FakeStorage
+
+
+class ListingStorage(FakeStorage):
+    def _get_version(self, key):
+        data = self._data.get(key)
+        return hashlib.sha256(data).hexdigest() if data is not None else None
+
+    def list_certificates(self):
+        valid_after = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        for key in list(self._data):
+            if key.startswith(self.certificate_prefix):
+                yield key[len(self.certificate_prefix) :], valid_after
+
+
+@pytest.fixture
+def storage():
+    storage = ListingStorage()
+    for name in ["a.com", "b.com", "c.com"]:
+        certificate = Certificate([name], private_key=b"key")
+        certificate.set_fullchain(b"cert-----END CERTIFICATE-----\nchain")
+        storage.save_certificate(certificate)
+    return storage
+
+
+@pytest.fixture
+def renewals(monkeypatch):
+    calls = []
+
+    def renew(*, certificate, checkpoint, **kwargs):
+        calls.append(certificate.name)
+        if certificate.name == "b.com":
+            checkpoint("ordered")
+            raise RuntimeError("CA unavailable")
+        for state in ("ordered", "challenges_ready", "finalized", "saved"):
+            checkpoint(state)
+
+    monkeypatch.setattr(client, "renew", renew)
+    return calls
+
+
+PARAMS = {
+    "acme_account_email": "fake@example.com",
+    "acme_directory_url": "https://ca.invalid/dir",
+    "authenticators": [],
+}
+
+
+def test_run_resumes_after_timeout(storage, renewals):
+    run = RenewalRun.open(storage, run_id="run1")
+    assert run.names == ["a.com", "b.com", "c.com"]
+    assert run.status() == {"pending": 3}
+
+    budget = iter([True, False])
+    result = run.process(should_continue=lambda: next(budget), **PARAMS)
+    assert result == {"saved": ["a.com"], "failed": [], "skipped": []}
+
+    # the next invocation continues the same run and skips finished work
+    run = RenewalRun.open(storage, run_id="run1")
+    result = run.process(**PARAMS)
+    assert result == {"saved": ["c.com"], "failed": ["b.com"], "skipped": []}
+    assert renewals == ["a.com", "b.com", "c.com"]
+    assert run.status() == {"saved": 2, "failed": 1}
+    task = storage.get_renewal_task("run1", "b.com")
+    assert task["error"] == "CA unavailable"
+    assert task["attempts"] == 1
+
+
+def test_failed_tasks_retry_up_to_max_attempts(storage, renewals):
+    run = RenewalRun.open(storage, run_id="run1")
+    for _ in range(RenewalRun.max_attempts + 1):
+        run.process(**PARAMS)
+    assert renewals.count("b.com") == RenewalRun.max_attempts
+
+
+def test_claim_respects_leases(storage):
+    RenewalRun.open(storage, run_id="run1")
+    worker1 = RenewalRun(storage, "run1", worker_id="w1")
+    worker2 = RenewalRun(storage, "run1", worker_id="w2")
+    assert worker1.claim("a.com")
+    assert not worker2.claim("a.com")
+    worker1.checkpoint("a.com", "ordered")
+    assert not worker2.claim("a.com")
+    task = storage.get_renewal_task("run1", "a.com")
+    task["expires_at"] = 0
+    storage.set_renewal_task("run1", "a.com", task)
+    assert worker2.claim("a.com")
+    worker2.checkpoint("a.com", "saved")
+    assert not worker1.claim("a.com")
+
+
+def test_claim_loses_conflicting_swap(storage, monkeypatch):
+    RenewalRun.open(storage, run_id="run1")
+    worker1 = RenewalRun(storage, "run1", worker_id="w1")
+    worker2 = RenewalRun(storage, "run1", worker_id="w2")
+    replace = storage._replace
+
+    def racing_replace(name, data, version):
+        # worker2 claims right after worker1 read the task
+        monkeypatch.setattr(storage, "_replace", replace)
+        assert worker2.claim("a.com")
+        return replace(name, data, version)
+
+    monkeypatch.setattr(storage, "_replace", racing_replace)
+    assert not worker1.claim("a.com")
+    assert storage.get_renewal_task("run1", "a.com")["owner"] == "w2"
+
+    monkeypatch.setattr(storage, "_replace", lambda name, data, version: False)
+    assert not worker1.claim("b.com")
+    assert storage.get_renewal_task("run1", "b.com")["owner"] is None
+
+
+def test_checkpoint_keeps_lease_taken_over(storage):
+    RenewalRun.open(storage, run_id="run1")
+    worker1 = RenewalRun(storage, "run1", worker_id="w1")
+    worker2 = RenewalRun(storage, "run1", worker_id="w2")
+    assert worker1.claim("a.com")
+    task = storage.get_renewal_task("run1", "a.com")
+    task["expires_at"] = 0
+    storage.set_renewal_task("run1", "a.com", task)
+    assert worker2.claim("a.com")
+    worker1.checkpoint("a.com", "failed", error="timeout")
+    task = storage.get_renewal_task("run1", "a.com")
+    assert task["owner"] == "w2"
+    assert task["expires_at"] > 0
+
+
+def test_leased_certificates_are_skipped(storage, monkeypatch):
+    performed = []
+    monkeypatch.setattr(
+        client,
+        "perform",
+        lambda certificate, *a, **kw: performed.append(certificate.name),
+    )
+    assert storage.acquire_lease("b.com", "other-worker")
+    run = RenewalRun.open(storage, run_id="run1")
+    result = run.process(**PARAMS)
+    assert result == {"saved": ["a.com", "c.com"], "failed": [], "skipped": ["b.com"]}
+    assert performed == ["a.com", "c.com"]
+    assert storage.acquire_lease("a.com", "other-worker")
+    assert run._task("b.com")["owner"] is None
+
+
+def test_release_keeps_task_taken_over(storage):
+    worker1 = RenewalRun.open(storage, run_id="run1", worker_id="w1")
+    worker2 = RenewalRun.open(storage, run_id="run1", worker_id="w2")
+    assert worker1.claim("a.com")
+    task = storage.get_renewal_task("run1", "a.com")
+    task["expires_at"] = 0
+    storage.set_renewal_task("run1", "a.com", task)
+    assert worker2.claim("a.com")
+    worker1.release("a.com")
+    task = storage.get_renewal_task("run1", "a.com")
+    assert task["owner"] == "w2"
+    assert task["attempts"] == 2
+
+
+def test_renewal_by_another_worker_is_not_repeated(storage, monkeypatch):
+    performed = []
+    monkeypatch.setattr(
+        client,
+        "perform",
+        lambda certificate, *a, **kw: performed.append(certificate.name),
+    )
+    certificate = storage.get_certificate(name="a.com")
+    renewed = Certificate(["a.com"], private_key=b"key")
+    renewed.set_fullchain(b"new-----END CERTIFICATE-----\nchain")
+    storage.save_certificate(renewed)
+    client.renew(certificate=certificate, storage=storage, **PARAMS)
+    assert performed == []
+
+
+def test_superseded_certificates_are_dropped(storage, monkeypatch):
+    def perform(certificate, *args, **kwargs):
+        raise StorageConflictError(certificate.name)
+
+    monkeypatch.setattr(client, "perform", perform)
+    run = RenewalRun.open(storage, run_id="run1")
+    result = run.process(names=["a.com"], **PARAMS)
+    assert result == {"saved": [], "failed": [], "skipped": ["a.com"]}
+    assert run._task("a.com")["state"] == "saved"
@@ -0,0 +1,160 @@
+from unittest import mock
+
+import pytest
+from acme import challenges
+
+from acme_serverless_client import client
+from acme_serverless_client.authenticators.dns_route_53 import Route53Authenticator
+from acme_serverless_client.models import Certificate
+from acme_serverless_client.planning import (
+    apply,
+    authenticator_affinity,
+    consolidate_wildcards,
+    current_bundles,
+    find_certificate,
+    find_certificate_name,
+    pack,
+)
+
+from .test_client import PARAMS
+from .test_jobs import ListingStorage
+from .test_storage import FULLCHAIN_PEM, FakeStorage
+
+
+def test_pack_groups_by_registered_domain():
+    hostnames = [f"h{i}.a.com" for i in range(150)] + ["b.org", "www.b.org"]
+    plan = pack(hostnames)
+    assert sorted(len(d) for d in plan.bundles.values()) == [2, 50, 100]
+    assert plan.bundles["b.org"] == ["b.org", "www.b.org"]
+    assert plan.changed == sorted(plan.bundles)
+    assert plan.removed == []
+    assert set(plan.assignments) == set(hostnames)
+
+
+def test_pack_minimizes_churn():
+    existing = {
+        "a.com": ["a.com", "x.a.com"],
+        "b.a.com": ["b.a.com", "c.a.com", "d.a.com"],
+        "old.com": ["old.com", "y.old.com"],
+    }
+    # nothing changed, nothing reissued
+    plan = pack(
+        ["a.com", "x.a.com", "b.a.com", "c.a.com", "d.a.com", "old.com", "y.old.com"],
+        existing,
+        max_names=4,
+    )
+    assert plan.changed == [] and plan.removed == []
+    assert plan.bundles == existing
+
+    # new names fill the best fitting stable bundle
+    plan = pack(
+        ["a.com", "x.a.com", "b.a.com", "c.a.com", "d.a.com", "new.a.com"],
+        existing,
+        max_names=4,
+    )
+    assert plan.bundles["b.a.com"] == ["b.a.com", "c.a.com", "d.a.com", "new.a.com"]
+    assert plan.changed == ["b.a.com"]
+    assert plan.removed == ["old.com"]
+
+    # a bundle losing a name takes the new ones before stable bundles
+    plan = pack(
+        ["a.com", "x.a.com", "b.a.com", "d.a.com", "new.a.com"],
+        existing,
+        max_names=4,
+    )
+    assert plan.bundles["b.a.com"] == ["b.a.com", "d.a.com", "new.a.com"]
+    assert plan.changed == ["b.a.com"]
+
+    # the certificate name changes with its first domain
+    plan = pack(["x.a.com", "b.a.com", "c.a.com", "d.a.com"], existing, max_names=4)
+    assert plan.bundles["x.a.com"] == ["x.a.com"]
+    assert plan.changed == ["x.a.com"]
+    assert plan.removed == ["a.com", "old.com"]
+
+
+class OnlyDNS:
+    def is_supported(self, domain, challenge):
+        return isinstance(challenge, challenges.DNS01) and domain.endswith("a.com")
+
+
+class OnlyHTTP:
+    def is_supported(self, domain, challenge):
+        return isinstance(challenge, challenges.HTTP01)
+
+
+def test_authenticator_affinity():
+    affinity = authenticator_affinity([OnlyDNS(), OnlyHTTP()])
+    plan = pack(["*.a.com", "www.a.com", "www.b.com"], affinity=affinity)
+    assert plan.bundles == {
+        "*.a.com": ["*.a.com", "www.a.com"],
+        "www.b.com": ["www.b.com"],
+    }
+    with pytest.raises(ValueError, match="No authenticator"):
+        authenticator_affinity([OnlyHTTP()])("*.b.com")
+
+
+def test_current_bundles_reads_configs():
+    storage = ListingStorage()
+    for domains in (["a.com", "www.a.com"], ["b.org"]):
+        certificate = Certificate(domains, private_key=b"key")
+        certificate.set_fullchain(FULLCHAIN_PEM)
+        storage.save_certificate(certificate)
+    with mock.patch.object(storage, "_get", wraps=storage._get) as get:
+        bundles = current_bundles(storage)
+    assert bundles == {"a.com": ["a.com", "www.a.com"], "b.org": ["b.org"]}
+    assert {c.args[0] for c in get.call_args_list} == {
+        "configs/a.com",
+        "configs/b.org",
+    }
+
+
+def test_consolidate_wildcards(monkeypatch):
+    authenticator = Route53Authenticator(mock.Mock(), {"zone.com": "Z1"})
+    hostnames = [
+        "zone.com",
+        "a.zone.com",
+        "b.zone.com",
+        "x.sub.zone.com",
+        "a.other.com",
+    ]
+    hostnames += ["c.other.com"]
+    covering = consolidate_wildcards(hostnames, [authenticator])
+    assert covering == {"a.zone.com": "*.zone.com", "b.zone.com": "*.zone.com"}
+    # a single subdomain is covered by an existing wildcard only
+    assert consolidate_wildcards(["x.sub.zone.com"], [authenticator]) == {}
+    assert consolidate_wildcards(
+        ["x.sub.zone.com"],
+        [authenticator],
+        existing={"*.sub.zone.com": ["*.sub.zone.com"]},
+    ) == {"x.sub.zone.com": "*.sub.zone.com"}
+
+    existing = {"a.zone.com": ["a.zone.com"], "zone.com": ["zone.com"]}
+    plan = pack(hostnames, existing, covering=covering)
+    assert plan.bundles["zone.com"] == ["zone.com", "*.zone.com", "x.sub.zone.com"]
+    assert plan.changed == ["a.other.com", "zone.com"]
+    assert plan.removed == ["a.zone.com"]
+    assert plan.assignments["b.zone.com"] == "zone.com"
+
+    storage = FakeStorage()
+    issued = []
+
+    def issue(*, domains, storage, **kwargs):
+        issued.append(domains)
+        certificate = Certificate(domains, b"key")
+        certificate.set_fullchain(FULLCHAIN_PEM)
+        storage.save_certificate(certificate)
+
+    monkeypatch.setattr(client, "issue", issue)
+    for domains in existing.values():
+        issue(domains=domains, storage=storage)
+    issued.clear()
+    apply(plan, storage=storage, **PARAMS)
+    assert issued == [["a.other.com", "c.other.com"], plan.bundles["zone.com"]]
+    assert storage.get_certificate(name="a.zone.com") is None
+    assert find_certificate(storage, "a.zone.com").domains == plan.bundles["zone.com"]
+    assert find_certificate(storage, "c.other.com").name == "a.other.com"
+    assert find_certificate(storage, "unknown.com") is None
+    with mock.patch.object(storage, "_get", wraps=storage._get) as get:
+        assert find_certificate_name(storage, "b.zone.com") == "zone.com"
+        assert find_certificate_name(storage, "unknown.com") is None
+    assert not any(c.args[0].startswith("keys/") for c in get.call_args_list)
@@ -0,0 +1,230 @@
+import hashlib
+import threading
+from unittest import mock
+
+import pytest
+from acme import messages
+
+from acme_serverless_client import client
+from acme_serverless_client.accounts import account_cache
+from acme_serverless_client.helpers import registered_domain
+from acme_serverless_client.ratelimit import (
+    RateLimiter,
+    RateLimitExceededError,
+    TokenBucket,
+    parse_retry_after,
+)
+from acme_serverless_client.storage.base import StorageConflictError
+
+from .test_client import PARAMS
+from .test_storage import FakeStorage
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_limiter(clock, storage=None, **kwargs):
+    return RateLimiter(storage=storage, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_registered_domain():
+    assert registered_domain("a.b.example.com") == "example.com"
+    assert registered_domain("*.example.com") == "example.com"
+    assert registered_domain("www.example.co.uk") == "example.co.uk"
+    assert registered_domain("example.com") == "example.com"
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(2, 10, at=0)
+    bucket.take(0)
+    bucket.take(0)
+    assert bucket.wait_time(0) == 5
+    assert bucket.wait_time(5) == 0
+    assert bucket.wait_time(100) == 0
+    assert bucket.tokens == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("Thu, 01 Jan 1970 00:02:00 GMT", now=60) == 60
+    assert parse_retry_after("garbage") is None
+
+
+def test_acquire_waits_for_domain_budget(clock):
+    limiter = make_limiter(clock, limits={"domain": (2, 100)}, max_wait=60)
+    limiter.acquire("new_order", ["a.example.com"])
+    limiter.acquire("new_order", ["b.example.com", "www.example.com"])
+    limiter.acquire("new_order", ["other.org"])
+    assert clock.now == 1000
+    limiter.acquire("new_order", ["c.example.com"])
+    assert clock.now == 1050
+    limiter.acquire("new_order", ["d.example.com"])
+    assert clock.now == 1100
+    limiter.max_wait = 10
+    with pytest.raises(RateLimitExceededError) as exc_info:
+        limiter.acquire("new_order", ["d.example.com"])
+    assert exc_info.value.budget == "domain:example.com"
+    assert clock.now == 1100
+
+
+def test_state_is_shared_through_storage(clock):
+    storage = FakeStorage()
+    make_limiter(clock, storage, limits={"domain": (1, 100)}).acquire(
+        "new_order", ["example.com"]
+    )
+    assert "domain:example.com" in storage.get_rate_limits()["buckets"]
+    other = make_limiter(clock, storage, limits={"domain": (1, 100)}, max_wait=0)
+    with pytest.raises(RateLimitExceededError):
+        other.acquire("new_order", ["www.example.com"])
+    other.acquire("new_order", ["example.org"])
+
+
+def test_renewals_skip_domain_budget(clock):
+    limiter = make_limiter(clock, limits={"domain": (1, 100)}, max_wait=0)
+    limiter.acquire("new_order", ["a.example.com"])
+    for _ in range(3):
+        limiter.acquire("new_order", ["a.example.com"], renewal=True)
+    with pytest.raises(RateLimitExceededError):
+        limiter.acquire("new_order", ["b.example.com"])
+
+
+def test_concurrent_updates_are_not_lost(clock):
+    storage = FakeStorage()
+    limits = {"endpoint:new_order": (10, 100)}
+    first = make_limiter(clock, storage, limits=limits)
+    second = make_limiter(clock, storage, limits=limits)
+    replace = storage._replace
+
+    def racing_replace(name, data, version):
+        # the second worker spends a token between our read and write
+        storage._replace = replace
+        second.acquire("new_order")
+        return replace(name, data, version)
+
+    storage._get_version = lambda name: hashlib.sha256(
+        storage._data.get(name, b"")
+    ).hexdigest()
+    storage._replace = racing_replace
+    first.acquire("new_order")
+    tokens, _ = storage.get_rate_limits()["buckets"]["endpoint:new_order"]
+    assert tokens == 8
+
+    # a conflict isn't an exhausted budget, it is retried up to max_wait
+    storage._replace = lambda name, data, version: False
+    first.max_wait = 10
+    with pytest.raises(StorageConflictError):
+        first.acquire("new_order")
+    assert 1000 < clock.now <= 1010
+
+
+def test_threads_share_buckets():
+    limiter = RateLimiter(limits={"endpoint:new_order": (100, 10**6)}, max_wait=0)
+    threads = [
+        threading.Thread(
+            target=lambda: [limiter.acquire("new_order") for _ in range(20)]
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with pytest.raises(RateLimitExceededError):
+        limiter.acquire("new_order")
+
+
+def test_failed_validations_budget(clock):
+    limiter = make_limiter(clock, limits={"failed": (2, 100)}, max_wait=0)
+    limiter.record_failed_validation(["a.example.com", "a.example.com"])
+    with pytest.raises(RateLimitExceededError) as exc_info:
+        limiter.acquire("new_order", ["a.example.com"])
+    assert exc_info.value.budget == "failed:a.example.com"
+    limiter.acquire("new_order", ["b.example.com"])
+
+
+def test_new_account_budget(clock, monkeypatch):
+    acme_client = mock.Mock()
+    acme_client.net.session.hooks = {}
+    monkeypatch.setattr(client, "build_client", lambda *args: acme_client)
+    storage = FakeStorage()
+    monkeypatch.setattr(storage, "set_account", mock.Mock())
+    limiter = make_limiter(clock, limits={"endpoint:new_account": (1, 100)}, max_wait=0)
+    params = {"account_email": "fake@example.com", "directory_url": "https://ca"}
+    client.setup_client(storage, rate_limiter=limiter, **params)
+    # nothing was stored, the next worker registers again
+    account_cache.clear()
+    with pytest.raises(RateLimitExceededError) as exc_info:
+        client.setup_client(storage, rate_limiter=limiter, **params)
+    assert exc_info.value.budget == "endpoint:new_account"
+    assert acme_client.new_account.call_count == 1
+
+
+def test_watch_shares_one_hook_per_session(clock):
+    session = mock.Mock(hooks={})
+    limiters = [make_limiter(clock) for _ in range(3)]
+    for limiter in limiters:
+        limiter.watch(session)
+        limiter.watch(session)
+    [hook] = session.hooks["response"]
+    throttled = mock.Mock(status_code=429, headers={"Retry-After": "30"})
+    with limiters[1].watching():
+        hook(throttled)
+    hook(throttled)
+    assert [getattr(lim._local, "throttled", None) for lim in limiters] == [
+        None,
+        (30.0,),
+        None,
+    ]
+
+
+@pytest.fixture
+def acme_client(monkeypatch):
+    acme_client = mock.Mock()
+    acme_client.net.session.hooks = {}
+    monkeypatch.setattr(client, "setup_client", lambda **kwargs: acme_client)
+    return acme_client
+
+
+def test_issue_honours_retry_after(acme_client, clock):
+    storage = FakeStorage()
+    limiter = make_limiter(clock, storage, max_wait=10)
+
+    def new_order(csr_pem):
+        [hook] = acme_client.net.session.hooks["response"]
+        hook(mock.Mock(status_code=429, headers={"Retry-After": "30"}))
+        raise messages.Error.with_code("rateLimited")
+
+    acme_client.new_order.side_effect = new_order
+    with pytest.raises(messages.Error):
+        client.issue(
+            domains=["my.com"], storage=storage, rate_limiter=limiter, **PARAMS
+        )
+    assert storage.get_rate_limits()["blocked_until"] == {"endpoint:new_order": 1030}
+    with pytest.raises(RateLimitExceededError) as exc_info:
+        client.issue(
+            domains=["my.com"], storage=storage, rate_limiter=limiter, **PARAMS
+        )
+    assert exc_info.value.wait == 30
+    assert acme_client.new_order.call_count == 1
+
+    clock.now += 30
+    acme_client.new_order.side_effect = messages.Error.with_code("malformed")
+    with pytest.raises(messages.Error):
+        client.issue(
+            domains=["my.com"], storage=storage, rate_limiter=limiter, **PARAMS
+        )
+    assert storage.get_rate_limits()["blocked_until"] == {}
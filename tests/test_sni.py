@@ -0,0 +1,87 @@
+import pytest
+
+from acme_serverless_client.models import Certificate
+from acme_serverless_client.sni import MappedSNIIndex, SNIIndex, SNIIndexObserver
+
+from .test_jobs import ListingStorage
+from .test_storage import FULLCHAIN_PEM
+
+
+def save(storage, domains):
+    certificate = Certificate(domains, b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    return certificate
+
+
+def test_lookup(tmp_path):
+    index = SNIIndex()
+    index.add("example.com", ["example.com", "*.example.com"])
+    index.add("www.example.com", ["www.example.com"])
+    index.add("other.org", ["other.org", "*.api.other.org"])
+    path = str(tmp_path / "sni.idx")
+    index.dump(path)
+    with MappedSNIIndex(path) as mapped:
+        assert len(mapped) == len(index) == 5
+        for lookup in (index.lookup, mapped.lookup):
+            assert lookup("example.com") == "example.com"
+            assert lookup("WWW.example.com.") == "www.example.com"
+            assert lookup("api.example.com") == "example.com"
+            assert lookup("a.b.example.com") is None
+            assert lookup("v1.api.other.org") == "other.org"
+            assert lookup("api.other.org") is None
+            assert lookup("localhost") is None
+
+
+def test_invalid_file(tmp_path):
+    path = tmp_path / "sni.idx"
+    path.write_bytes(b"\0" * 16)
+    with pytest.raises(RuntimeError, match="Unsupported"):
+        MappedSNIIndex(str(path))
+
+
+def test_observer(tmp_path):
+    storage = ListingStorage()
+    save(storage, ["example.com", "*.example.com"])
+    index = SNIIndex.build(storage)
+    path = tmp_path / "sni.idx"
+    now = [0.0]
+    observer = SNIIndexObserver(index, path=str(path), clock=lambda: now[0])
+    storage.subscribe(observer)
+
+    www = save(storage, ["www.example.com", "shop.example.com"])
+    with MappedSNIIndex(str(path)) as mapped:
+        assert mapped.lookup("www.example.com") == "www.example.com"
+        assert mapped.lookup("api.example.com") == "example.com"
+
+    # a renewal with fewer names drops the old ones, the file is rewritten
+    # at most once per interval
+    written = path.stat().st_mtime_ns
+    save(storage, ["www.example.com"])
+    assert index.lookup("shop.example.com") == "example.com"
+    assert path.stat().st_mtime_ns == written
+    observer.flush()
+    with MappedSNIIndex(str(path)) as mapped:
+        assert mapped.lookup("shop.example.com") == "example.com"
+
+    now[0] = 1.0
+    storage.remove_certificate(www)
+    with MappedSNIIndex(str(path)) as mapped:
+        assert mapped.lookup("www.example.com") == "example.com"
+
+
+def test_sync_from_change_log():
+    storage = ListingStorage()
+    storage.change_log = True
+    save(storage, ["example.com", "*.example.com"])
+    cursor = storage.change_cursor()
+    index = SNIIndex.build(storage)
+
+    www = save(storage, ["www.example.com"])
+    storage.remove_certificate(www)
+    save(storage, ["other.org"])
+    cursor = index.sync(storage, cursor)
+    assert cursor == 4
+    assert index.lookup("www.example.com") == "example.com"
+    assert index.lookup("other.org") == "other.org"
+    assert index.sync(storage, cursor) == cursor
@@ -1,15 +1,36 @@
 import datetime
+import functools
+import hashlib
+import json
+import time
 from unittest import mock
 
 import acme.messages
+import boto3
+import botocore.exceptions
 import pytest
 import time_machine
 from dateutil.tz import tzutc
 
 from acme_serverless_client.helpers import find_certificates_to_renew
 from acme_serverless_client.models import Account, Certificate
-from acme_serverless_client.storage.aws import ACMStorageObserver, S3Storage
-from acme_serverless_client.storage.base import BaseStorage
+from acme_serverless_client.storage.aws import (
+    ACMStorageObserver,
+    MultiRegionACMStorageObserver,
+    S3Storage,
+)
+from acme_serverless_client.storage.base import (
+    BaseStorage,
+    LeaseHeldError,
+    StorageConflictError,
+    chain_cache,
+)
+from acme_serverless_client.storage.filesystem import FileSystemStorage
+from acme_serverless_client.storage.tiered import (
+    FileSystemCache,
+    MemoryCache,
+    TieredStorage,
+)
 
 
 class FakeStorage(BaseStorage):
@@ -23,6 +44,9 @@ class FakeStorage(BaseStorage):
     def _set(self, key, data, **kwargs):
         self._data[key] = data
 
+    def _del(self, key):
+        self._data.pop(key, None)
+
 
 @pytest.fixture(scope="module")
 def moto_certs(read_fixture):
@@ -71,11 +95,56 @@ def test_set_certificate():
     assert cert
     assert storage._data == {
         "keys/my.com": certificate.private_key,
-        "configs/my.com": b'{"domains": ["my.com"]}',
+        "configs/my.com": b'{"domains": ["my.com"], "sha256": "%s"}'
+        % hashlib.sha256(b"randomcert-----END CERTIFICATE-----\n").hexdigest().encode(),
         "certificates/my.com": b"randomcert-----END CERTIFICATE-----\nchain",
     }
 
 
+def test_dedupe_chains(monkeypatch):
+    chain_cache.clear()
+    storage = FakeStorage()
+    monkeypatch.setattr(storage, "dedupe_chains", True)
+    for name in ("one.com", "two.com"):
+        certificate = Certificate([name], private_key=b"key")
+        certificate.set_fullchain(FULLCHAIN_PEM)
+        storage.save_certificate(certificate)
+    digest = hashlib.sha256(certificate.certificate_chain).hexdigest()
+    assert storage._data["configs/one.com"] == (
+        b'{"domains": ["one.com"], "chain": "%s", "sha256": "%s"}'
+        % (
+            digest.encode(),
+            hashlib.sha256(certificate.certificate).hexdigest().encode(),
+        )
+    )
+    assert storage._data["certificates/one.com"] == certificate.certificate
+    assert [key for key in storage._data if key.startswith("chains/")] == [
+        f"chains/{digest}"
+    ]
+
+    chain_cache.clear()
+    with mock.patch.object(storage, "_get", wraps=storage._get) as get:
+        one = storage.get_certificate(name="one.com")
+        two = storage.get_certificate(name="two.com")
+    assert one.fullchain == two.fullchain == certificate.fullchain
+    assert one.certificate_chain is two.certificate_chain
+    assert [c.args[0] for c in get.call_args_list].count(f"chains/{digest}") == 1
+
+
+def test_tiered_dedupe_chains():
+    backend = FakeStorage()
+    backend.dedupe_chains = True
+    storage = TieredStorage(backend)
+    assert storage.dedupe_chains
+    certificate = Certificate(["one.com"], private_key=b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    assert backend._data["certificates/one.com"] == certificate.certificate
+    assert any(key.startswith("chains/") for key in backend._data)
+    storage.dedupe_chains = False
+    assert not backend.dedupe_chains
+
+
 def test_s3_bucket_ops(bucket):
     key = ".well-known/acme-challenge/object.txt"
     bucket.put(key, b"testx")
@@ -123,6 +192,30 @@ morebytes
     assert certificate.certificate_chain == chain
 
 
+def test_parsed_certificate(read_fixture):
+    leaf = read_fixture("localhost/cert.pem")
+    certificate = Certificate(["localhost"], private_key=b"key")
+    certificate.set_fullchain(leaf + b"\n" + read_fixture("moto/fullchain.pem"))
+    assert certificate.certificate == leaf
+    assert certificate.certificate_chain.startswith(b"-----BEGIN CERTIFICATE-----")
+    assert certificate.serial == 0x2C3B7C7367CCC362
+    assert certificate.not_before == datetime.datetime(
+        2025, 9, 3, 23, 40, 5, tzinfo=datetime.timezone.utc
+    )
+    assert certificate.not_after == datetime.datetime(
+        2027, 10, 3, 23, 40, 5, tzinfo=datetime.timezone.utc
+    )
+    assert certificate.sans == ["localhost", "pebble"]
+    assert certificate.issuer == "CN=minica root ca 5345e6"
+    assert len(certificate.fingerprint) == 64
+    assert certificate.x509 is certificate.x509
+
+    certificate.set_fullchain(read_fixture("moto/fullchain.pem"))
+    assert certificate.serial == 0xDF5D91CC8A8FBAA0
+    assert certificate.sans == []
+    assert certificate.fingerprint.startswith("091c984f")
+
+
 def test_acm_set_certificate(acm, read_fixture, moto_certs, monkeypatch):
     _key_pem, fullchain_pem = moto_certs
     storage = FakeStorage()
@@ -157,6 +250,209 @@ def test_acm_set_certificate(acm, read_fixture, moto_certs, monkeypatch):
     )
 
 
+def _throttled(method, failures):
+    calls = []
+
+    @functools.wraps(method)
+    def wrapper(**kwargs):
+        calls.append(kwargs)
+        if len(calls) <= failures:
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "slow down"}},
+                "ImportCertificate",
+            )
+        return method(**kwargs)
+
+    return wrapper, calls
+
+
+def test_acm_import_retries_throttling(acm, moto_certs, monkeypatch):
+    key_pem, fullchain_pem = moto_certs
+    sleeps = []
+    observer = ACMStorageObserver(acm=acm, sleep=sleeps.append)
+    wrapper, calls = _throttled(acm.import_certificate, 2)
+    monkeypatch.setattr(acm, "import_certificate", wrapper)
+    certificate = Certificate(["*.moto.com"], private_key=key_pem)
+    certificate.set_fullchain(fullchain_pem)
+    observer.save_certificate(certificate)
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2
+    assert len(acm.list_certificates()["CertificateSummaryList"]) == 1
+
+    wrapper, calls = _throttled(acm.import_certificate, 10)
+    monkeypatch.setattr(acm, "import_certificate", wrapper)
+    with pytest.raises(botocore.exceptions.ClientError):
+        observer.save_certificate(certificate)
+    assert len(calls) == ACMStorageObserver.max_attempts
+
+
+def test_acm_import_pacing(acm):
+    now = [0.0]
+    sleeps = []
+    observer = ACMStorageObserver(acm=acm, clock=lambda: now[0], sleep=sleeps.append)
+    for _ in range(observer.import_burst + 2):
+        observer._pace()
+    assert sleeps == [1.0, 2.0]
+    now[0] = 10.0
+    observer._pace()
+    assert sleeps == [1.0, 2.0]
+
+
+def test_acm_concurrent_import_queue(acm, moto_certs, monkeypatch):
+    key_pem, fullchain_pem = moto_certs
+    storage = FakeStorage()
+    observer = ACMStorageObserver(
+        acm=acm, storage=storage, concurrency=4, sleep=lambda _: None
+    )
+    storage.subscribe(observer)
+    wrapper, calls = _throttled(acm.import_certificate, 100)
+    monkeypatch.setattr(acm, "import_certificate", wrapper)
+    certificates = []
+    for i in range(3):
+        certificate = Certificate([f"{i}.moto.com"], private_key=key_pem)
+        certificate.set_fullchain(fullchain_pem)
+        storage.save_certificate(certificate)
+        certificates.append(certificate)
+    observer.flush()
+    assert len(calls) == 3 * observer.max_attempts
+    queue = storage.get_queue("acm")
+    assert sorted(queue) == ["0.moto.com", "1.moto.com", "2.moto.com"]
+    assert queue["0.moto.com"]["attempts"] == 1
+    assert "ThrottlingException" in queue["0.moto.com"]["error"]
+    assert not acm.list_certificates()["CertificateSummaryList"]
+
+    monkeypatch.undo()
+    storage.remove_certificate(certificates[2])
+    assert observer.retry_queued() == ["0.moto.com", "1.moto.com"]
+    assert storage.get_queue("acm") == {}
+    assert len(acm.list_certificates()["CertificateSummaryList"]) == 2
+    assert observer._acm_arn_resolver.get("0.moto.com")
+    assert observer._acm_arn_resolver.get("1.moto.com")
+
+
+def test_acm_import_queues_only_transient_errors(acm, moto_certs, monkeypatch):
+    key_pem, fullchain_pem = moto_certs
+    storage = FakeStorage()
+    observer = ACMStorageObserver(
+        acm=acm, storage=storage, concurrency=2, sleep=lambda _: None
+    )
+    certificate = Certificate(["*.moto.com"], private_key=key_pem)
+    certificate.set_fullchain(fullchain_pem)
+    import_certificate = mock.Mock(
+        side_effect=botocore.exceptions.EndpointConnectionError(endpoint_url="acm")
+    )
+    monkeypatch.setattr(acm, "import_certificate", import_certificate)
+    observer.save_certificate(certificate)
+    observer.flush()
+    assert list(storage.get_queue("acm")) == ["*.moto.com"]
+
+    import_certificate.side_effect = botocore.exceptions.ClientError(
+        {"Error": {"Code": "ValidationException", "Message": "bad key"}},
+        "ImportCertificate",
+    )
+    observer.save_certificate(certificate)
+    with pytest.raises(botocore.exceptions.ClientError, match="ValidationException"):
+        observer.flush()
+    assert storage.get_queue("acm")["*.moto.com"]["attempts"] == 1
+    assert import_certificate.call_count == 2
+
+
+def test_acm_queue_concurrent_workers(acm):
+    storage = VersionedStorage()
+    first = ACMStorageObserver(acm=acm, storage=storage)
+    second = ACMStorageObserver(acm=acm, storage=storage)
+    replace = storage._replace
+
+    def racing_replace(name, data, version):
+        # another worker queues its import between our read and write
+        storage._replace = replace
+        second._enqueue("b.com", RuntimeError("throttled"))
+        return replace(name, data, version)
+
+    storage._replace = racing_replace
+    first._enqueue("a.com", RuntimeError("throttled"))
+    assert sorted(storage.get_queue("acm")) == ["a.com", "b.com"]
+
+    storage._replace = lambda name, data, version: False
+    first._enqueue("c.com", RuntimeError("throttled"))
+    assert sorted(storage.get_queue("acm")) == ["a.com", "b.com"]
+
+
+def test_update_acm_arns():
+    storage = VersionedStorage()
+    storage.update_acm_arns("us-east-1", {"a.com": "arn:a", "b.com": "arn:b"})
+    storage.update_acm_arns("eu-west-1", {"a.com": "arn:eu"})
+    storage.update_acm_arns("us-east-1", {"a.com": None})
+    assert storage.get_acm_arns() == {
+        "us-east-1": {"b.com": "arn:b"},
+        "eu-west-1": {"a.com": "arn:eu"},
+    }
+    storage._replace = mock.Mock(return_value=False)
+    with pytest.raises(StorageConflictError, match=r"acm/arns\.json"):
+        storage.update_acm_arns("us-east-1", {"c.com": "arn:c"})
+    assert storage._replace.call_count == storage.update_attempts
+
+
+def test_acm_multi_region(acm, moto_certs, monkeypatch):
+    key_pem, fullchain_pem = moto_certs
+    us_east = boto3.client("acm", region_name="us-east-1")
+    existing = us_east.import_certificate(
+        Certificate=fullchain_pem.split(b"\n\n")[0] + b"\n",
+        PrivateKey=key_pem,
+    )["CertificateArn"]
+    clients = {"us-east-1": us_east, "ap-southeast-2": acm}
+    storage = FakeStorage()
+    observer = MultiRegionACMStorageObserver(clients, storage=storage)
+    storage.subscribe(observer)
+    certificate = Certificate(["*.moto.com"], private_key=key_pem)
+    certificate.set_fullchain(fullchain_pem)
+    storage.save_certificate(certificate)
+    observer.flush()
+    arns = storage.get_acm_arns()
+    assert arns["us-east-1"] == {"*.moto.com": existing}
+    assert arns["ap-southeast-2"]["*.moto.com"].startswith(
+        "arn:aws:acm:ap-southeast-2:"
+    )
+    for client in clients.values():
+        assert len(client.list_certificates()["CertificateSummaryList"]) == 1
+    assert observer.lag() == {"us-east-1": 0.0, "ap-southeast-2": 0.0}
+
+    # a new process reuses the persisted ARNs instead of listing every region
+    for client in clients.values():
+        monkeypatch.setattr(client, "list_certificates", mock.Mock())
+    observer = MultiRegionACMStorageObserver(
+        clients, storage=storage, sleep=lambda _: None
+    )
+    wrapper, calls = _throttled(acm.import_certificate, 100)
+    monkeypatch.setattr(acm, "import_certificate", wrapper)
+    observer.save_certificate(certificate)
+    observer.flush()
+    for client in clients.values():
+        client.list_certificates.assert_not_called()
+    assert len(calls) == ACMStorageObserver.max_attempts
+    assert calls[0]["CertificateArn"] == arns["ap-southeast-2"]["*.moto.com"]
+    assert list(storage.get_queue("acm-ap-southeast-2")) == ["*.moto.com"]
+    assert storage.get_queue("acm-us-east-1") == {}
+    with time_machine.travel(time.time() + 60):
+        lag = observer.lag()
+    assert lag["us-east-1"] == 0
+    assert lag["ap-southeast-2"] >= 60
+
+    monkeypatch.setattr(acm, "import_certificate", wrapper.__wrapped__)
+    assert observer.retry_queued() == {
+        "us-east-1": [],
+        "ap-southeast-2": ["*.moto.com"],
+    }
+    assert observer.lag() == {"us-east-1": 0.0, "ap-southeast-2": 0.0}
+
+    observer.remove_certificate(certificate)
+    assert storage.get_acm_arns() == {"us-east-1": {}, "ap-southeast-2": {}}
+    monkeypatch.undo()
+    for client in clients.values():
+        assert not client.list_certificates()["CertificateSummaryList"]
+
+
 def test_s3_find_expired(bucket, acm, moto_certs):
     key_pem, fullchain_pem = moto_certs
     storage = S3Storage(bucket=bucket)
@@ -187,3 +483,406 @@ def test_s3_find_expired(bucket, acm, moto_certs):
     with time_machine.travel(now + datetime.timedelta(days=180)):
         certs = list(find_certificates_to_renew(storage))
         assert len(certs) == 2
+
+
+class CountingStorage(FakeStorage):
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.calls = []
+
+    def _get_with_version(self, key):
+        self.calls.append(("get", key))
+        data = self._data.get(key)
+        return data, str(hash(data)) if data is not None else None
+
+    def _get_version(self, key):
+        self.calls.append(("version", key))
+        data = self._data.get(key)
+        return str(hash(data)) if data is not None else None
+
+    def _set_with_version(self, key, data):
+        self._set(key, data)
+        return str(hash(data))
+
+
+@pytest.mark.parametrize("cache_type", ["memory", "filesystem"])
+def test_tiered_storage_read_through(cache_type, tmp_path):
+    backend = CountingStorage({"account.json": b"account"})
+    cache = MemoryCache() if cache_type == "memory" else FileSystemCache(tmp_path)
+    storage = TieredStorage(backend, cache=cache, ttl=60)
+    assert storage._get("account.json") == b"account"
+    assert storage._get("account.json") == b"account"
+    assert backend.calls == [("get", "account.json")]
+
+    with time_machine.travel(datetime.datetime.now() + datetime.timedelta(minutes=2)):
+        assert storage._get("account.json") == b"account"
+        assert backend.calls[1:] == [("version", "account.json")]
+        backend._data["account.json"] = b"changed"
+        with time_machine.travel(
+            datetime.datetime.now() + datetime.timedelta(minutes=2)
+        ):
+            assert storage._get("account.json") == b"changed"
+    assert storage._get("missing") is None
+
+
+def test_tiered_storage_write_through(tmp_path):
+    backend = CountingStorage()
+    storage = TieredStorage(backend, cache=FileSystemCache(tmp_path))
+    storage._set("configs/my.com", b"data")
+    assert backend._data == {"configs/my.com": b"data"}
+    assert storage._get("configs/my.com") == b"data"
+    assert backend.calls == []
+    # a warm invocation reuses the same directory
+    storage = TieredStorage(backend, cache=FileSystemCache(tmp_path))
+    assert storage._get("configs/my.com") == b"data"
+    assert backend.calls == []
+    storage._del("configs/my.com")
+    assert storage._get("configs/my.com") is None
+    assert backend._data == {}
+
+
+@pytest.mark.parametrize("cache_type", ["memory", "filesystem"])
+def test_tiered_storage_lru_eviction(cache_type, tmp_path):
+    if cache_type == "memory":
+        cache = MemoryCache(max_size=10)
+    else:
+        cache = FileSystemCache(tmp_path, max_size=300)
+    storage = TieredStorage(CountingStorage(), cache=cache)
+    storage._set("a", b"a" * 4)
+    storage._set("b", b"b" * 4)
+    assert cache.get("a")
+    storage._set("c", b"c" * 4 if cache_type == "memory" else b"c" * 150)
+    assert cache.get("a")
+    assert cache.get("b") is None
+    assert cache.get("c")
+    assert cache.size <= cache.max_size
+
+
+def test_tiered_storage_notifies_once():
+    backend = CountingStorage()
+    storage = TieredStorage(backend)
+    observer = mock.Mock()
+    backend.subscribe(observer)
+    storage.subscribe(observer)
+    certificate = Certificate(["my.com"], private_key=b"key")
+    certificate.set_fullchain(b"randomcert-----END CERTIFICATE-----\nchain")
+    storage.save_certificate(certificate)
+    observer.notify.assert_called_once_with("save_certificate", certificate)
+
+
+def test_s3_remove_certificate(bucket):
+    storage = S3Storage(bucket=bucket)
+    certificate = Certificate(["my.com"], private_key=b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    storage.set_pending("my.com", {"domains": ["my.com"]})
+    storage.set_order("my.com", {"domains": ["my.com"]})
+    storage.remove_certificate(certificate)
+    assert list(bucket.list()) == []
+
+
+def test_s3_list_certificates_empty(bucket):
+    storage = S3Storage(bucket=bucket)
+    assert list(storage.list_certificates()) == []
+    storage = S3Storage(
+        bucket=bucket, list_shard_boundaries=S3Storage.DOMAIN_SHARD_BOUNDARIES
+    )
+    assert list(storage.list_certificates()) == []
+
+
+def test_s3_list_certificates_sharded(bucket):
+    names = [
+        "*.example.com",
+        "0.example.com",
+        "a",
+        "a.example.com",
+        "b.example.com",
+        "m",
+        "m.example.com",
+        "xn--80ak6aa92e.com",
+        "z.example.com",
+        "~tilde",
+    ] + [f"host-{i}.example.com" for i in range(7)]
+    for name in names:
+        bucket.put(S3Storage._build_certificate_storage_key(name), b"cert")
+    bucket.put(S3Storage._build_config_storage_key("a.example.com"), b"{}")
+    serial = S3Storage(bucket=bucket, list_page_size=2)
+    assert sorted(name for name, _ in serial.list_certificates()) == sorted(names)
+    sharded = S3Storage(
+        bucket=bucket,
+        list_shard_boundaries=["a", "h", "m"],
+        list_concurrency=2,
+        list_page_size=2,
+    )
+    listed = [name for name, _ in sharded.list_certificates()]
+    assert sorted(listed) == sorted(names)
+    sharded.list_shard_boundaries = S3Storage.DOMAIN_SHARD_BOUNDARIES
+    assert sorted(name for name, _ in sharded.list_certificates()) == sorted(names)
+    # consumers may stop early without waiting for the remaining shards
+    first = next(iter(sharded.list_certificates()))
+    assert first[0] in names
+
+
+class VersionedStorage(FakeStorage):
+    """Backend overriding only `_get_version`."""
+
+    def _get_version(self, key):
+        data = self._data.get(key)
+        return hashlib.sha256(data).hexdigest() if data is not None else None
+
+
+@pytest.fixture(params=["base", "versioned", "s3", "filesystem"])
+def lease_storage(request, tmp_path):
+    if request.param == "s3":
+        return S3Storage(bucket=request.getfixturevalue("bucket"))
+    if request.param == "filesystem":
+        return FileSystemStorage(str(tmp_path))
+    if request.param == "versioned":
+        return VersionedStorage()
+    return FakeStorage()
+
+
+def test_leases(lease_storage):
+    storage = lease_storage
+    assert storage._create("leases/x", b"1")
+    assert not storage._create("leases/x", b"2")
+    assert storage._get("leases/x") == b"1"
+
+    assert storage.acquire_lease("my.com", "a", ttl=60)
+    assert storage.acquire_lease("my.com", "a", ttl=60)
+    assert not storage.acquire_lease("my.com", "b", ttl=60)
+    storage.release_lease("my.com", "b")
+    assert not storage.acquire_lease("my.com", "b", ttl=60)
+    with time_machine.travel(datetime.datetime.now() + datetime.timedelta(seconds=61)):
+        assert storage.acquire_lease("my.com", "b", ttl=60)
+    assert not storage.acquire_lease("my.com", "a", ttl=60)
+    storage.release_lease("my.com", "b")
+    assert storage.acquire_lease("my.com", "a", ttl=60)
+    storage.release_lease("my.com", "a")
+
+    with (
+        storage.lease("my.com"),
+        pytest.raises(LeaseHeldError, match=r"my\.com"),
+        storage.lease("my.com"),
+    ):
+        pass
+    with storage.lease("my.com"):
+        pass
+
+
+def test_release_keeps_lease_taken_meanwhile(lease_storage, monkeypatch):
+    storage = lease_storage
+    if type(storage) is FakeStorage:
+        pytest.skip("no versions, last write wins")
+    assert storage.acquire_lease("my.com", "a", ttl=60)
+    get_with_version = storage._get_with_version
+
+    def expire_and_take_over(key):
+        result = get_with_version(key)
+        monkeypatch.undo()
+        with time_machine.travel(
+            datetime.datetime.now() + datetime.timedelta(seconds=61)
+        ):
+            assert storage.acquire_lease("my.com", "b", ttl=60)
+        return result
+
+    monkeypatch.setattr(storage, "_get_with_version", expire_and_take_over)
+    storage.release_lease("my.com", "a")
+    assert not storage.acquire_lease("my.com", "a", ttl=60)
+
+
+def test_tiered_leases_bypass_cache():
+    backend = FakeStorage()
+    storage = TieredStorage(backend)
+    storage.lease_seconds = 60
+    assert backend.lease_seconds == 60
+    with storage.lease("my.com"):
+        assert storage._get("leases/my.com") == backend._get("leases/my.com")
+    assert json.loads(storage._get("leases/my.com"))["owner"] is None
+    assert storage.cache.get("leases/my.com") is None
+
+
+@pytest.mark.parametrize("backend", ["s3", "filesystem"])
+def test_replace_checks_version(backend, request, tmp_path):
+    if backend == "s3":
+        storage = S3Storage(bucket=request.getfixturevalue("bucket"))
+    else:
+        storage = FileSystemStorage(str(tmp_path))
+    assert storage._replace("key", b"1", None)
+    assert not storage._replace("key", b"2", None)
+    data, version = storage._get_with_version("key")
+    assert data == b"1"
+    storage._set("key", b"3")
+    assert not storage._replace("key", b"2", version)
+    assert storage._replace("key", b"4", storage._get_version("key"))
+    assert storage._get("key") == b"4"
+    version = storage._get_version("key")
+    storage._del("key")
+    assert not storage._replace("key", b"5", version)
+    version = storage._set_with_version("key", b"6")
+    assert version == storage._get_version("key")
+    assert storage._replace("key", b"7", version)
+
+
+def test_filesystem_storage(tmp_path):
+    storage = FileSystemStorage(str(tmp_path))
+    certificate = Certificate(["*.my.com"], b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    assert [name for name, _ in storage.list_certificates()] == ["*.my.com"]
+    assert storage.get_certificate(name="*.my.com").fullchain == certificate.fullchain
+    storage.remove_certificate(certificate)
+    assert list(storage.list_certificates()) == []
+    assert storage.get_certificate(name="*.my.com") is None
+    with pytest.raises(AssertionError, match="Invalid key"):
+        storage._get("../outside")
+
+
+@pytest.mark.parametrize(
+    "backend", ["base", "s3", "filesystem", "tiered", "tiered-versioned"]
+)
+def test_save_certificate_conflict(backend, request, tmp_path):
+    if backend == "s3":
+        storage = S3Storage(bucket=request.getfixturevalue("bucket"))
+    elif backend == "filesystem":
+        storage = FileSystemStorage(str(tmp_path))
+    elif backend == "tiered":
+        storage = TieredStorage(FileSystemStorage(str(tmp_path)))
+    elif backend == "tiered-versioned":
+        # writes don't report their version
+        storage = TieredStorage(VersionedStorage())
+    else:
+        storage = FakeStorage()
+    certificate = Certificate(["my.com"], b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+
+    slow = storage.get_certificate(name="my.com")
+    fast = storage.get_certificate(name="my.com")
+    assert slow.version is not None or backend == "base"
+    fast.set_fullchain(FULLCHAIN_PEM.replace(b"bytes", b"fast"))
+    storage.save_certificate(fast)
+    # a second save of the same object is not a conflict
+    storage.save_certificate(fast)
+
+    slow.private_key = b"slow key"
+    slow.set_fullchain(FULLCHAIN_PEM.replace(b"bytes", b"slow"))
+    if backend == "base":
+        # no versions, last write wins
+        storage.save_certificate(slow)
+        return
+    with pytest.raises(StorageConflictError, match=r"my\.com"):
+        storage.save_certificate(slow)
+    stored = storage.get_certificate(name="my.com")
+    assert stored.private_key == b"key"
+    assert stored.certificate == fast.certificate
+
+
+@pytest.mark.parametrize("backend", ["s3", "filesystem", "tiered"])
+def test_save_certificate_keeps_written_version(backend, request, tmp_path):
+    if backend == "s3":
+        storage = S3Storage(bucket=request.getfixturevalue("bucket"))
+    elif backend == "filesystem":
+        storage = FileSystemStorage(str(tmp_path))
+    else:
+        storage = TieredStorage(FileSystemStorage(str(tmp_path)))
+    storage.dedupe_chains = True
+    certificate = Certificate(["my.com"], b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    assert certificate.version == storage.get_certificate_version("my.com")
+    stale = storage.get_certificate(name="my.com")
+    certificate.set_fullchain(FULLCHAIN_PEM.replace(b"bytes", b"new"))
+    storage.save_certificate(certificate)
+    assert certificate.version == storage.get_certificate_version("my.com")
+    assert certificate.version != stale.version
+
+    # nothing is written for a conflicting save, not even its chain
+    chain_cache.clear()
+    stale.set_certificate(stale.certificate, b"other chain")
+    with pytest.raises(StorageConflictError):
+        storage.save_certificate(stale)
+    assert storage._get(f"chains/{chain_cache.digest(b'other chain')}") is None
+
+
+@pytest.mark.parametrize("backend", ["base", "s3", "filesystem"])
+def test_change_log(backend, request, tmp_path):
+    if backend == "s3":
+        storage = S3Storage(bucket=request.getfixturevalue("bucket"))
+    elif backend == "filesystem":
+        storage = FileSystemStorage(str(tmp_path))
+    else:
+        storage = FakeStorage()
+    storage.change_log = True
+    assert storage.change_cursor() == 0
+    assert storage.changes_since(0) == []
+    certificate = Certificate(["my.com", "www.my.com"], b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    storage.remove_certificate(certificate)
+
+    changes = storage.changes_since(0)
+    assert [(c["seq"], c["event"], c["name"]) for c in changes] == [
+        (1, "save_certificate", "my.com"),
+        (2, "remove_certificate", "my.com"),
+    ]
+    assert changes[0]["domains"] == ["my.com", "www.my.com"]
+    assert storage.changes_since(1) == changes[1:]
+    assert storage.changes_since(0, limit=1) == changes[:1]
+
+    # a lagging head is only a hint, sequence numbers stay unique
+    storage.change_bucket_size = 2
+    storage._set("changes/head", b'{"bucket": 0}')
+    storage.save_certificate(certificate)
+    storage.save_certificate(certificate)
+    assert [c["seq"] for c in storage.changes_since(0)] == [1, 2, 3, 4]
+    storage._set("changes/head", b'{"bucket": 0}')
+    storage.save_certificate(certificate)
+    assert [c["seq"] for c in storage.changes_since(0)] == [1, 2, 3, 4, 5]
+    assert storage.change_cursor() == 5
+    assert [c["seq"] for c in storage.changes_since(2, limit=2)] == [3, 4]
+    assert storage._get("changes/head") == b'{"bucket": 2}'
+
+
+def test_change_log_reads_buckets():
+    storage = FakeStorage()
+    for _ in range(250):
+        storage._log_change("save_certificate", "my.com")
+    with mock.patch.object(storage, "_get", wraps=storage._get) as get:
+        assert len(storage.changes_since(0)) == 250
+    assert [c.args[0] for c in get.call_args_list] == [
+        f"changes/{bucket:020d}" for bucket in range(3)
+    ]
+    assert [c["seq"] for c in storage.changes_since(199)] == list(range(200, 251))
+    assert storage.change_cursor() == 250
+
+
+def test_tiered_change_log(tmp_path):
+    backend = FileSystemStorage(str(tmp_path))
+    storage = TieredStorage(backend, ttl=3600)
+    storage.change_log = True
+    assert backend.change_log
+    certificate = Certificate(["my.com"], b"key")
+    certificate.set_fullchain(FULLCHAIN_PEM)
+    storage.save_certificate(certificate)
+    assert storage.changes_since(0)[0]["seq"] == 1
+    # another process appends to the log
+    FileSystemStorage(str(tmp_path))._log_change("remove_certificate", "my.com")
+    assert [c["seq"] for c in storage.changes_since(0)] == [1, 2]
+
+
+def test_s3_remove_certificates(bucket):
+    storage = S3Storage(bucket=bucket)
+    certificates = []
+    for name in ("a.com", "b.com"):
+        certificate = Certificate([name], b"key")
+        certificate.set_fullchain(FULLCHAIN_PEM)
+        storage.save_certificate(certificate)
+        certificates.append(certificate)
+    with mock.patch.object(
+        bucket.client, "delete_objects", wraps=bucket.client.delete_objects
+    ) as delete_objects:
+        storage.remove_certificates(certificates)
+    assert delete_objects.call_count == 1
+    assert len(delete_objects.call_args.kwargs["Delete"]["Objects"]) == 10
+    assert list(bucket.list()) == []
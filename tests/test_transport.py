@@ -0,0 +1,99 @@
+import gc
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from benchmarks.fakes import CallCounter
+from benchmarks.transport import count_connections
+from requests.adapters import HTTPAdapter
+
+from acme_serverless_client import client, transport
+from acme_serverless_client.models import Account
+
+
+class DirectoryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = 0
+
+    def do_GET(self):
+        if DirectoryHandler.failures:
+            DirectoryHandler.failures -= 1
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        url = f"http://{self.headers['Host']}"
+        body = json.dumps(
+            {"newNonce": f"{url}/nonce", "newOrder": f"{url}/order"}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def directory_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DirectoryHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/dir"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def shared_transport():
+    previous = transport.get_transport()
+    shared = transport.Transport(backoff_factor=0)
+    transport.set_transport(shared)
+    yield shared
+    transport.set_transport(previous)
+
+
+def build_clients(directory_url, n):
+    account = Account()
+    for _ in range(n):
+        client.build_client(account, directory_url)
+        # ClientNetwork.__del__ closes its session
+        gc.collect()
+
+
+def test_shared_transport_reuses_connections(directory_url, shared_transport):
+    connections = CallCounter()
+    with count_connections(connections):
+        build_clients(directory_url, 3)
+    assert connections.reset()["http"] == 1
+
+
+def test_per_client_sessions(directory_url, shared_transport):
+    transport.set_transport(None)
+    connections = CallCounter()
+    with count_connections(connections):
+        build_clients(directory_url, 3)
+    assert connections.reset()["http"] == 3
+
+
+def test_shared_transport_retries_get(directory_url, shared_transport):
+    DirectoryHandler.failures = 2
+    build_clients(directory_url, 1)
+    assert DirectoryHandler.failures == 0
+
+
+def test_shared_transport_timeout(directory_url, shared_transport, monkeypatch):
+    timeouts = []
+    send = HTTPAdapter.send
+
+    def recording_send(self, request, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return send(self, request, **kwargs)
+
+    monkeypatch.setattr(HTTPAdapter, "send", recording_send)
+    transport.set_transport(transport.Transport(timeout=3))
+    build_clients(directory_url, 1)
+    assert timeouts == [3]